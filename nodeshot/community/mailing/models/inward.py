@@ -2,13 +2,13 @@ from django.db import models
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import generic
-from django.contrib.sites.models import Site
 from django.core.validators import MaxLengthValidator, MinLengthValidator
 from django.core.exceptions import ValidationError
 from django.core.mail import EmailMessage
 from django.conf import settings
 
 from nodeshot.core.base.models import BaseDate
+from nodeshot.core.base.reference import get_current_site
 
 from .choices import INWARD_STATUS_CHOICES
 
@@ -76,7 +76,7 @@ class Inward(BaseDate):
 
         email = EmailMessage(
             # subject
-            _('Contact request from %(sender)s - %(site)s') % {'sender': self.from_name, 'site': Site.objects.get(pk=settings.SITE_ID)},
+            _('Contact request from %(sender)s - %(site)s') % {'sender': self.from_name, 'site': get_current_site()},
             # message
             self.message,
             # from
@@ -5,10 +5,10 @@ from django.core.mail import send_mail
 from django.core.urlresolvers import reverse
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import generic
-from django.contrib.sites.models import Site
 from django.conf import settings
 
 from nodeshot.core.base.models import BaseDate
+from nodeshot.core.base.reference import get_current_site
 
 NOTIFICATION_TYPE_CHOICES = [(key, _(key)) for key,value in settings.NODESHOT['NOTIFICATIONS']['TEXTS'].iteritems()]
 
@@ -126,7 +126,7 @@ class Notification(BaseDate):
     @property
     def email_message(self):
         """ compose complete email message text """
-        site = Site.objects.get(pk=settings.SITE_ID)
+        site = get_current_site()
         action_url = self.get_action()
         if action_url != '' and not action_url.startswith('http'):
             action_url = "%s://%s%s" % (getattr(settings, 'PROTOCOL', 'http'), site.domain, action_url)
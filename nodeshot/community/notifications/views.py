@@ -4,11 +4,13 @@ from django.conf import settings
 from rest_framework import generics, permissions, authentication
 from rest_framework.response import Response
 
+from nodeshot.core.base.mixins import StreamingListMixin, CursorPaginationMixin
+
 from .models import *
 from .serializers import *
 
 
-class NotificationList(generics.ListAPIView):
+class NotificationList(StreamingListMixin, CursorPaginationMixin, generics.ListAPIView):
     """
     Retrieve a list of notifications of the current user.
     
@@ -19,7 +21,8 @@ class NotificationList(generics.ListAPIView):
      * `action=count`: retrieve count of unread notifications without marking them as read
      * `action=all`: retrieve all notifications with pagination
         * `limit=<n>`: specify number of items per page (defaults to 30)
-        * `limit=0`: turns off pagination
+        * `limit=0`: turns off pagination (the list is streamed)
+        * `cursor`: turns on cursor pagination (see the `next` link), empty for the first page
     """
     authentication_classes = (authentication.SessionAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
@@ -28,6 +31,7 @@ class NotificationList(generics.ListAPIView):
     serializer_class = NotificationSerializer
     pagination_serializer_class = PaginatedNotificationSerializer
     queryset = Notification.objects.select_related('from_user')
+    cursor_ordering = ('-id',)
     
     def get_queryset(self):
         """ filter only notifications of current user """
@@ -117,6 +117,7 @@ ExtensibleNodeSerializer.add_relationship(**{
 from django.dispatch import receiver
 from django.db.models.signals import post_save
 from nodeshot.core.nodes.models import Node
+from nodeshot.core.nodes.signals import nodes_bulk_saved
 
 from ..tasks import create_related_object
 
@@ -134,6 +135,14 @@ def create_node_rating_counts_settings(sender, **kwargs):
         create_related_object.delay(NodeParticipationSettings, { 'node': node })
 
 
+@receiver(nodes_bulk_saved)
+def bulk_create_node_rating_counts_settings(sender, **kwargs):
+    """ create node rating counts and settings of nodes created in bulk """
+    created = kwargs['created']
+    NodeRatingCount.objects.bulk_create([NodeRatingCount(node=node) for node in created])
+    NodeParticipationSettings.objects.bulk_create([NodeParticipationSettings(node=node) for node in created])
+
+
 @receiver(post_save, sender=Layer)
 def create_layer_rating_settings(sender, **kwargs):
     """ create layer rating settings """
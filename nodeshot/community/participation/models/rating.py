@@ -49,7 +49,7 @@ class Rating(UpdateCountsMixin, BaseDate):
         
             node = self.node
             
-            layer= Layer.objects.get(pk=node.layer_id)
+            layer= Layer.reference_cache.get(pk=node.layer_id)
             if  layer.participation_settings.rating_allowed != True:
                 raise ValidationError  ("Rating not allowed for this layer")
             if  node.participation_settings.rating_allowed != True:
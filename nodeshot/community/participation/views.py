@@ -8,7 +8,7 @@ from rest_framework import permissions, authentication, generics
 from .models import NodeRatingCount, Rating, Vote, Comment
 from .serializers import *
 
-from nodeshot.core.base.mixins import CustomDataMixin
+from nodeshot.core.base.mixins import CustomDataMixin, CursorPaginationMixin
 from nodeshot.core.nodes.models import Node
 from nodeshot.core.layers.models import Layer
 
@@ -25,10 +25,30 @@ def get_queryset_or_404(queryset, kwargs):
     
     return obj
 
+
+def get_published_layer_or_404(slug):
+    """
+    returns the published layer with the specified slug (from the reference data cache)
+    """
+    try:
+        layer = Layer.reference_cache.get(slug=slug)
+    except Layer.DoesNotExist:
+        raise Http404(_('Not found'))
     
-class AllNodesParticipationList(generics.ListAPIView):
+    if not layer.is_published:
+        raise Http404(_('Not found'))
+    
+    return layer
+
+    
+class AllNodesParticipationList(CursorPaginationMixin, generics.ListAPIView):
     """
     Retrieve participation details for all nodes
+    
+    Parameters:
+    
+     * `limit=<n>`: specify number of items per page (defaults to 10)
+     * `cursor`: turns on cursor pagination (see the `next` link), empty for the first page, no count is returned
     """
     authentication_classes = (authentication.SessionAuthentication,)
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
@@ -37,6 +57,7 @@ class AllNodesParticipationList(generics.ListAPIView):
     pagination_serializer_class = PaginationSerializer
     paginate_by_param = 'limit'
     paginate_by = 10
+    cursor_ordering = ('id',)
 
 all_nodes_participation= AllNodesParticipationList.as_view()
 
@@ -71,7 +92,7 @@ class LayerNodesCommentList(generics.ListAPIView):
         or otherwise return 404
         """
         # ensure layer exists
-        layer = get_queryset_or_404(Layer.objects.published(), { 'slug': self.kwargs.get('slug', None) })
+        layer = get_published_layer_or_404(self.kwargs.get('slug', None))
         
         # Get queryset of nodes related to layer
         self.queryset = Node.objects.published().filter(layer_id=layer.id)
@@ -96,7 +117,7 @@ class LayerNodesParticipationList(generics.ListAPIView):
         or otherwise return 404
         """
         # ensure layer exists
-        layer = get_queryset_or_404(Layer.objects.published(), { 'slug': self.kwargs.get('slug', None) })
+        layer = get_published_layer_or_404(self.kwargs.get('slug', None))
         
         # Get queryset of nodes related to layer
         self.queryset = Node.objects.published().filter(layer_id=layer.id)
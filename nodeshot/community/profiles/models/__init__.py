@@ -28,6 +28,14 @@ ExtensibleNodeSerializer.add_relationship(**{
 })
 
 
+# ------ Conditional GET ------ #
+
+from nodeshot.core.base.conditional import track_changes
+
+# usernames are serialized with nodes, logins don't change them
+track_changes(Profile, fields=['username'])
+
+
 # ------ SIGNALS ------ #
 
 # perform certain actions when some other parts of the application changes
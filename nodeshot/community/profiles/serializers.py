@@ -5,9 +5,9 @@ from django.contrib.auth import authenticate
 from django.conf import settings
 
 from rest_framework import serializers
-from rest_framework.reverse import reverse
+from nodeshot.core.base.reverse import reverse
 
-from nodeshot.core.base.serializers import ExtensibleModelSerializer, HyperlinkedField
+from nodeshot.core.base.serializers import ExtensibleModelSerializer, HyperlinkedField, HyperlinkedIdentityField
 from .models import Profile as User
 from .models import PasswordReset, SocialLink
 
@@ -103,14 +103,14 @@ class SocialLinkAddSerializer(serializers.ModelSerializer):
 class ProfileSerializer(serializers.ModelSerializer):
     """ Profile Serializer for visualization """
     
-    details = serializers.HyperlinkedIdentityField(lookup_field='username', view_name='api_profile_detail')
+    details = HyperlinkedIdentityField(lookup_field='username', view_name='api_profile_detail')
     avatar = serializers.SerializerMethodField('get_avatar')
     full_name = serializers.SerializerMethodField('get_full_name')
-    social_links_url = serializers.HyperlinkedIdentityField(lookup_field='username', view_name='api_user_social_links_list')
+    social_links_url = HyperlinkedIdentityField(lookup_field='username', view_name='api_user_social_links_list')
     social_links = SocialLinkSerializer(source='sociallink_set', many=True, read_only=True)
     
     if 'nodeshot.core.nodes' in settings.INSTALLED_APPS:
-        nodes = serializers.HyperlinkedIdentityField(view_name='api_user_nodes', slug_field='username')
+        nodes = HyperlinkedIdentityField(view_name='api_user_nodes', slug_field='username')
     
     def get_avatar(self, obj):
         """ avatar from gravatar.com """
@@ -169,9 +169,9 @@ class ProfileCreateSerializer(ExtensibleModelSerializer):
 class AccountSerializer(serializers.ModelSerializer):
     """ Account serializer """
     
-    profile = serializers.HyperlinkedIdentityField(lookup_field='username',
+    profile = HyperlinkedIdentityField(lookup_field='username',
                                                 view_name='api_profile_detail')
-    social_links = serializers.HyperlinkedIdentityField(lookup_field='username',
+    social_links = HyperlinkedIdentityField(lookup_field='username',
                                                 view_name='api_user_social_links_list')
     change_password = HyperlinkedField(view_name='api_account_password_change')
     logout = HyperlinkedField(view_name='api_account_logout')
@@ -304,7 +304,7 @@ class ResetPasswordKeySerializer(serializers.Serializer):
 if PROFILE_EMAIL_CONFIRMATION:
     
     class EmailSerializer(serializers.ModelSerializer):
-        details = serializers.HyperlinkedIdentityField(lookup_field='pk', view_name='api_account_email_detail')
+        details = HyperlinkedIdentityField(lookup_field='pk', view_name='api_account_email_detail')
         resend_confirmation = serializers.SerializerMethodField('get_resend_confirmation')
     
         def get_resend_confirmation(self, obj):
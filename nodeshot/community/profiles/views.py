@@ -119,9 +119,11 @@ if 'nodeshot.core.nodes' in settings.INSTALLED_APPS:
         
         Parameters:
         
-         * `search=<word>`: search <word> in name of nodes of specified layer
+         * `search=<words>`: search <words> in name, slug, description and address of nodes (ordered by relevance)
          * `limit=<n>`: specify number of items per page (defaults to 40)
          * `limit=0`: turns off pagination
+         * `cursor`: turns on cursor pagination (see the `next` link), empty for the first page, no count is returned
+         * `fields=<field,field,...>`: output only the specified fields (eg: slug,name,geometry)
         """
         
         def get_queryset(self):
@@ -0,0 +1,102 @@
+"""
+resolution of the access level of users
+
+The access level of an user depends on the group with the highest id the user belongs to,
+resolving it requires a query with a join on the groups table.
+The resolved level is stored on the user instance (which lives as long as the request)
+and in the cache (shared between requests and processes),
+the cache is invalidated when the groups of an user change.
+"""
+
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+from django.conf import settings
+
+from .choices import ACCESS_LEVELS
+
+
+__all__ = [
+    'get_access_level',
+    'invalidate_access_level',
+]
+
+
+ACL_CACHE_TIMEOUT = settings.NODESHOT['SETTINGS'].get('ACL_CACHE_TIMEOUT', 86400)
+
+CACHE_KEY = 'user_access_level:%s'
+
+
+def get_access_level(user):
+    """
+    returns the numeric access level of the specified user,
+    superusers get the highest access level
+    """
+    # computed once per request
+    try:
+        return user._access_level
+    except AttributeError:
+        pass
+
+    if user.is_superuser:
+        access_level = max(ACCESS_LEVELS.values())
+    elif user.is_authenticated():
+        key = CACHE_KEY % user.pk
+        access_level = cache.get(key)
+
+        if access_level is None:
+            group_names = user.groups.order_by('-id').values_list('name', flat=True)[0:1]
+            # users without group get the lowest access level
+            access_level = ACCESS_LEVELS.get(group_names[0] if group_names else 'public')
+            cache.set(key, access_level, ACL_CACHE_TIMEOUT)
+    else:
+        access_level = ACCESS_LEVELS.get('public')
+
+    user._access_level = access_level
+    return access_level
+
+
+def invalidate_access_level(*user_ids):
+    """ invalidates the cached access level of the specified users """
+    cache.delete_many([CACHE_KEY % user_id for user_id in user_ids])
+
+
+# ------ Signals ------ #
+
+
+@receiver(m2m_changed)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """ invalidates cached access levels when the groups of users change """
+    if sender is not get_user_model().groups.through:
+        return
+
+    # the users of a group are not known after a clear
+    if reverse and action == 'pre_clear':
+        user_ids = list(instance.user_set.values_list('id', flat=True))
+        instance._cleared_user_ids = user_ids
+    elif action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    # user.groups changed
+    elif not reverse:
+        user_ids = [instance.pk]
+    # group.user_set changed
+    elif action == 'post_clear':
+        user_ids = getattr(instance, '_cleared_user_ids', [])
+    else:
+        user_ids = pk_set or []
+
+    invalidate_access_level(*user_ids)
+    # the user instance might be reused in the same request
+    if not reverse:
+        instance.__dict__.pop('_access_level', None)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    """ renaming or deleting a group changes the access level of its users """
+    if instance.pk is None:
+        return
+    invalidate_access_level(*instance.user_set.values_list('id', flat=True))
@@ -0,0 +1,99 @@
+"""
+validators of conditional GET requests
+
+The time of the last change of each tracked model (see track_changes) is stored
+in the cache each time an instance is saved or deleted, views use it to build their ETag
+and Last-Modified headers: deletions don't change the updated field of the remaining objects
+and related objects (eg: the status of nodes) are not queried.
+
+The models of conditional views and their conditional_models must be tracked in the models
+module of their app, which is always imported (also by celery workers and management commands).
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db.models.signals import post_init, post_save, post_delete
+from django.conf import settings
+
+
+__all__ = [
+    'CONDITIONAL_GET_ENABLED',
+    'get_last_change',
+    'model_changed',
+    'track_changes',
+]
+
+
+CONDITIONAL_GET_ENABLED = settings.NODESHOT['SETTINGS'].get('CONDITIONAL_GET', True)
+
+CHANGE_KEY = 'model_last_change:%s.%s'
+# must outlive any client cache
+CHANGE_TIMEOUT = 86400 * 30
+
+
+def _get_key(model):
+    # deferred and proxy classes share the changes of their model
+    model = model._meta.concrete_model
+    return CHANGE_KEY % (model._meta.app_label, model._meta.object_name.lower())
+
+
+def get_last_change(model):
+    """
+    returns the timestamp of the last change of the instances of model;
+    if it's unknown (eg: evicted from the cache) the current time is stored and returned
+    """
+    key = _get_key(model)
+    timestamp = cache.get(key)
+    if timestamp is None:
+        timestamp = time.time()
+        cache.add(key, timestamp, CHANGE_TIMEOUT)
+    return timestamp
+
+
+def model_changed(model):
+    """ records a change of the instances of model (eg: after a bulk update) """
+    cache.set(_get_key(model), time.time(), CHANGE_TIMEOUT)
+
+
+def record_model_change(sender, **kwargs):
+    model_changed(sender)
+
+
+class FieldChangeRecorder(object):
+    """ records a change of the model only when the value of one of fields changes """
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def get_values(self, instance):
+        # deferred fields are not loaded
+        return [instance.__dict__.get(field) for field in self.fields]
+
+    def post_init(self, sender, instance, **kwargs):
+        instance._conditional_values = self.get_values(instance)
+
+    def post_save(self, sender, instance, created=False, **kwargs):
+        values = self.get_values(instance)
+        if created or values != getattr(instance, '_conditional_values', None):
+            model_changed(sender)
+        instance._conditional_values = values
+
+
+def track_changes(*models, **kwargs):
+    """
+    records the changes of the instances of models
+
+    :param fields: optional list of field names, saves which don't change them are ignored
+                   (eg: the username of users is serialized with nodes, logins are ignored)
+    """
+    fields = kwargs.get('fields')
+    for model in models:
+        uid = 'conditional_%s' % _get_key(model)
+        if fields:
+            recorder = FieldChangeRecorder(fields)
+            post_init.connect(recorder.post_init, sender=model, weak=False, dispatch_uid=uid)
+            post_save.connect(recorder.post_save, sender=model, weak=False, dispatch_uid=uid)
+        else:
+            post_save.connect(record_model_change, sender=model, dispatch_uid=uid)
+        post_delete.connect(record_model_change, sender=model, dispatch_uid=uid)
@@ -7,6 +7,7 @@ from django.contrib.gis.db.models.query import GeoQuerySet
 from django.conf import settings
 
 from nodeshot.core.base.choices import ACCESS_LEVELS
+from nodeshot.core.base.acl import get_access_level
 
 HSTORE_ENABLED = settings.NODESHOT['SETTINGS'].get('HSTORE', True)
 
@@ -75,12 +76,9 @@ class ACLMixin(BaseUtilityMixin):
                 queryset = self.get_query_set()
             except AttributeError:
                 queryset = self
-        elif user.is_authenticated():
-            # get user group (higher id)
-            group = user.groups.all().order_by('-id')[0]
-            queryset = self.filter(access_level__lte=ACCESS_LEVELS.get(group.name))
         else:
-            queryset = self.filter(access_level__lte=ACCESS_LEVELS.get('public'))
+            # resolved once per request and cached
+            queryset = self.filter(access_level__lte=get_access_level(user))
         return queryset
 
 
@@ -2,8 +2,30 @@
 reusable restframework mixins for API views
 """
 
-import reversion
+import base64
+import hashlib
+import calendar
+import simplejson as json
+
+from django.http import StreamingHttpResponse, HttpResponseNotModified
+from django.db.models import Q, Count, Max
+from django.core.exceptions import ValidationError
+from django.db.models import ForeignKey
+from django.db.models.fields import FieldDoesNotExist
+from django.utils.translation import ugettext_lazy as _
+from django.utils.http import http_date, parse_http_date_safe, parse_etags, quote_etag
+from django.utils.cache import patch_vary_headers
+from rest_framework import mixins
 from rest_framework.response import Response
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework_gis.serializers import GeoFeatureModelSerializer
+
+from .utils import queryset_iterator
+from .serializers import CursorPaginationSerializer
+from .acl import get_access_level
+from .conditional import CONDITIONAL_GET_ENABLED, get_last_change
+from .revisions import create_revision
 
 
 class ACLMixin(object):
@@ -95,23 +117,326 @@ class ListSerializerMixin(object):
         return serializer
 
 
+class StreamingListMixin(object):
+    """
+    Streams unpaginated JSON lists (eg: limit=0) instead of building
+    the whole serialized list in memory: the queryset is fetched in chunks
+    and each object is rendered and sent to the client as soon as it's ready.
+    
+    GeoJSON serializers produce a FeatureCollection.
+    Items of streamed lists are ordered by primary key.
+    """
+    stream_chunk_size = 500
+    
+    def is_streamable(self, request):
+        """ stream only JSON responses without pagination """
+        return not self.get_paginate_by() and request.accepted_renderer.format == 'json'
+    
+    def get_stream(self, queryset):
+        """ returns a StreamingHttpResponse which renders queryset incrementally """
+        serializer_class = self.get_serializer_class()
+        context = self.get_serializer_context()
+        renderer = JSONRenderer()
+        
+        if issubclass(serializer_class, GeoFeatureModelSerializer):
+            start, end = '{"type": "FeatureCollection", "features": [', ']}'
+        else:
+            start, end = '[', ']'
+        
+        def content():
+            yield start
+            separator = ''
+            for obj in queryset_iterator(queryset, self.stream_chunk_size):
+                yield separator + renderer.render(serializer_class(obj, context=context).data)
+                separator = ','
+            yield end
+        
+        return StreamingHttpResponse(content(), content_type='application/json')
+    
+    def list(self, request, *args, **kwargs):
+        if self.is_streamable(request):
+            return self.get_stream(self.filter_queryset(self.get_queryset()))
+        
+        return super(StreamingListMixin, self).list(request, *args, **kwargs)
+
+
+class CursorPage(object):
+    """ page of a cursor paginated list """
+    
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+
+class CursorPaginationMixin(object):
+    """
+    Opt-in keyset pagination: when the `cursor` querystring parameter is present
+    (empty for the first page) items are ordered by `cursor_ordering`
+    and each page starts after the last item of the previous page.
+    
+    Unlike offset pagination there's no COUNT query and the cost of a page
+    does not depend on how deep the client is paging.
+    The page size is determined as usual (paginate_by and paginate_by_param).
+    
+    Cursors are opaque to clients: they encode the values of the
+    ordering fields of the last item of the previous page.
+    """
+    cursor_param = 'cursor'
+    # every field must be in the same direction, the last one must be unique
+    cursor_ordering = ('updated', 'id')
+    
+    def is_cursor_paginated(self):
+        return self.cursor_param in self.request.QUERY_PARAMS
+    
+    def encode_cursor(self, obj):
+        opts = obj._meta
+        values = [opts.get_field(name.lstrip('-')).value_to_string(obj) for name in self.cursor_ordering]
+        return base64.urlsafe_b64encode(json.dumps(values))
+    
+    def decode_cursor(self, cursor, model):
+        """ returns a Q object which selects the items following cursor """
+        try:
+            values = json.loads(base64.urlsafe_b64decode(str(cursor)))
+            assert len(values) == len(self.cursor_ordering)
+            values = [
+                model._meta.get_field(name.lstrip('-')).to_python(value)
+                for name, value in zip(self.cursor_ordering, values)
+            ]
+        except (TypeError, ValueError, AssertionError, ValidationError):
+            raise ParseError(_('invalid cursor'))
+        
+        # (a > x) OR (a = x AND b > y) ...
+        query = Q()
+        for i, name in enumerate(self.cursor_ordering):
+            field = name.lstrip('-')
+            lookup = '%s__%s' % (field, 'lt' if name.startswith('-') else 'gt')
+            equals = dict([(previous.lstrip('-'), values[j]) for j, previous in enumerate(self.cursor_ordering[:i])])
+            equals[lookup] = values[i]
+            query |= Q(**equals)
+        return query
+    
+    def paginate_queryset(self, queryset, page_size=None):
+        if not self.is_cursor_paginated():
+            return super(CursorPaginationMixin, self).paginate_queryset(queryset, page_size)
+        
+        page_size = page_size or self.get_paginate_by()
+        if not page_size:
+            return None
+        
+        queryset = queryset.order_by(*self.cursor_ordering)
+        cursor = self.request.QUERY_PARAMS[self.cursor_param]
+        if cursor:
+            queryset = queryset.filter(self.decode_cursor(cursor, queryset.model))
+        
+        # one more item tells if there's a next page
+        object_list = list(queryset[0:page_size + 1])
+        next_cursor = None
+        if len(object_list) > page_size:
+            object_list = object_list[0:page_size]
+            next_cursor = self.encode_cursor(object_list[-1])
+        
+        return CursorPage(object_list, next_cursor)
+    
+    def get_pagination_serializer(self, page):
+        if not isinstance(page, CursorPage):
+            return super(CursorPaginationMixin, self).get_pagination_serializer(page)
+        
+        class SerializerClass(CursorPaginationSerializer):
+            class Meta:
+                object_serializer_class = self.get_serializer_class()
+        
+        return SerializerClass(instance=page, context=self.get_serializer_context())
+
+
+class SparseFieldsMixin(object):
+    """
+    Sparse fieldsets: the `fields` querystring parameter (eg: ?fields=slug,name,geometry)
+    restricts the fields of the serializer (which must implement
+    nodeshot.core.base.serializers.SparseFieldsMixin) and project_queryset
+    loads only the columns and joins needed to serialize them.
+    """
+    fields_param = 'fields'
+    # always loaded by project_queryset (eg: read in the __init__ method of the model)
+    required_query_fields = ('id',)
+    
+    def get_requested_fields(self):
+        """ returns list of requested fields or None """
+        if self.request.method != 'GET':
+            return None
+        
+        value = self.request.QUERY_PARAMS.get(self.fields_param, '')
+        fields = [field.strip() for field in value.split(',') if field.strip()]
+        return fields or None
+    
+    def get_serializer_context(self):
+        context = super(SparseFieldsMixin, self).get_serializer_context()
+        context['fields'] = self.get_requested_fields()
+        return context
+    
+    def project_queryset(self, queryset):
+        """
+        restricts queryset with only() and select_related() to the lookups
+        needed by the serializer, queryset is returned unchanged if they can't be determined
+        """
+        serializer = self.get_serializer_class()(context=self.get_serializer_context())
+        lookups = serializer.get_query_fields()
+        
+        if lookups is None:
+            return queryset
+        
+        lookups = set(lookups) | set(self.required_query_fields)
+        # cursor pagination needs the values of the ordering fields of the last item
+        if getattr(self, 'is_cursor_paginated', lambda: False)():
+            lookups |= set([name.lstrip('-') for name in self.cursor_ordering])
+        
+        only, related = set(), set()
+        
+        for lookup in lookups:
+            model = queryset.model
+            parts = lookup.split('__')
+            
+            for i, part in enumerate(parts):
+                if part == 'pk':
+                    parts[i] = part = model._meta.pk.name
+                try:
+                    field = model._meta.get_field(part)
+                # not a database field (eg: property or method)
+                except FieldDoesNotExist:
+                    return queryset
+                
+                if i < len(parts) - 1:
+                    if not isinstance(field, ForeignKey):
+                        return queryset
+                    related.add('__'.join(parts[:i + 1]))
+                    only.add('__'.join(parts[:i + 1]))
+                    model = field.rel.to
+            
+            only.add('__'.join(parts))
+        
+        return queryset.select_related(*related).only(*only)
+
+
+class ConditionalGetMixin(object):
+    """
+    Answers conditional GET requests (If-None-Match, If-Modified-Since)
+    with 304 Not Modified before any object is serialized.
+    
+    Validators are computed with a single aggregate query (latest value of
+    conditional_updated_field and count of the filtered queryset, or of the requested object
+    in detail views) and with the time of the last change of the model of the queryset
+    (deletions don't change the latest value of conditional_updated_field) and of conditional_models
+    (related models whose data is included in the response), which is read from the cache;
+    these models must be tracked with conditional.track_changes.
+    """
+    conditional_updated_field = 'updated'
+    conditional_models = ()
+    
+    def get_conditional_queryset(self):
+        """ returns the queryset which determines the content of the response """
+        queryset = self.filter_queryset(self.get_queryset())
+        
+        # detail views
+        if isinstance(self, mixins.RetrieveModelMixin):
+            lookup = self.kwargs.get(self.lookup_field, None)
+            if lookup is not None:
+                queryset = queryset.filter(**{ self.lookup_field: lookup })
+            elif self.kwargs.get(self.pk_url_kwarg, None) is not None:
+                queryset = queryset.filter(pk=self.kwargs[self.pk_url_kwarg])
+        
+        return queryset
+    
+    def get_validators(self):
+        """
+        returns a tuple (etag, last modified timestamp),
+        last modified timestamp might be None; returns None if there's no object
+        """
+        aggregates = { 'count': Count('pk') }
+        if self.conditional_updated_field:
+            aggregates['last_updated'] = Max(self.conditional_updated_field)
+        
+        queryset = self.get_conditional_queryset()
+        values = queryset.aggregate(**aggregates)
+        
+        if not values['count'] and isinstance(self, mixins.RetrieveModelMixin):
+            return None
+        
+        models = [queryset.model] + [model for model in self.conditional_models if model is not queryset.model]
+        timestamps = [get_last_change(model) for model in models]
+        
+        if values.get('last_updated'):
+            timestamps.append(calendar.timegm(values['last_updated'].utctimetuple()))
+        
+        request = self.request
+        user = request.user
+        
+        etag = hashlib.md5(repr([
+            values['count'], timestamps,
+            request.get_host(), request.get_full_path(), request.accepted_renderer.format,
+            'superuser' if user.is_superuser else get_access_level(user)
+        ])).hexdigest()
+        
+        return etag, max(timestamps) if timestamps else None
+    
+    def is_not_modified(self, request, etag, last_modified):
+        """ If-None-Match takes precedence over If-Modified-Since """
+        if 'HTTP_IF_NONE_MATCH' in request.META:
+            etags = parse_etags(request.META['HTTP_IF_NONE_MATCH'])
+            return etag in etags or '*' in etags
+        
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return bool(if_modified_since and last_modified and int(last_modified) <= if_modified_since)
+    
+    def is_conditional(self, request):
+        """ might be overridden to disable validators (eg: content which is not in the database) """
+        return CONDITIONAL_GET_ENABLED
+    
+    def get(self, request, *args, **kwargs):
+        return self.conditional_get(super(ConditionalGetMixin, self).get, request, *args, **kwargs)
+    
+    def conditional_get(self, get, request, *args, **kwargs):
+        """
+        returns 304 Not Modified or the response of get, with validators;
+        views which override get call it with the function which builds the response
+        """
+        if not self.is_conditional(request):
+            return get(request, *args, **kwargs)
+        
+        validators = self.get_validators()
+        
+        # let the view return 404
+        if validators is None:
+            return get(request, *args, **kwargs)
+        
+        etag, last_modified = validators
+        
+        if self.is_not_modified(request, etag, last_modified):
+            response = HttpResponseNotModified()
+        else:
+            response = get(request, *args, **kwargs)
+        
+        if response.status_code in (200, 304):
+            response['ETag'] = quote_etag(etag)
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, ('Accept', 'Cookie'))
+        
+        return response
+
+
 class RevisionUpdate(object):
     """
     Mixin that adds compatibility with django reversion for PUT and PATCH requests
+    (revisions are written in background if REVERSION_DEFERRED is enabled)
     """
     
     def put(self, request, *args, **kwargs):
         """ custom put method to support django-reversion """       
-        with reversion.create_revision():            
-            reversion.set_user(request.user)
-            reversion.set_comment('changed through the RESTful API from ip %s' % request.META['REMOTE_ADDR'])
+        with create_revision(request.user, 'changed through the RESTful API from ip %s' % request.META['REMOTE_ADDR']):
             return self.update(request, *args, **kwargs)
 
     def patch(self, request, *args, **kwargs):
         """ custom patch method to support django-reversion """       
-        with reversion.create_revision():            
-            reversion.set_user(request.user)
-            reversion.set_comment('changed through the RESTful API from ip %s' % request.META['REMOTE_ADDR'])
+        with create_revision(request.user, 'changed through the RESTful API from ip %s' % request.META['REMOTE_ADDR']):
             kwargs['partial'] = True
             return self.update(request, *args, **kwargs)
 
@@ -119,11 +444,10 @@ class RevisionUpdate(object):
 class RevisionCreate(object):
     """
     Mixin that adds compatibility with django reversion for POST requests
+    (revisions are written in background if REVERSION_DEFERRED is enabled)
     """
     
     def post(self, request, *args, **kwargs):
         """ custom put method to support django-reversion """       
-        with reversion.create_revision():            
-            reversion.set_user(request.user)
-            reversion.set_comment('created through the RESTful API from ip %s' % request.META['REMOTE_ADDR'])
+        with create_revision(request.user, 'created through the RESTful API from ip %s' % request.META['REMOTE_ADDR']):
             return self.create(request, *args, **kwargs)
\ No newline at end of file
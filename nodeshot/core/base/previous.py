@@ -0,0 +1,68 @@
+"""
+values stored in the database before an instance is saved
+
+Several receivers of pre_save need the previous values of the instance being saved
+(eg: the tiles and the cached GeoJSON of the old position of a moved node, the counters
+and the websocket events of the old status). Each of them registers the fields it needs with
+track_previous_values, get_previous_values loads all of them with a single query per save:
+
+    track_previous_values(Node, ['geometry', 'layer'])
+
+    @receiver(pre_save, sender=Node)
+    def invalidate_previous_position(sender, instance, **kwargs):
+        previous = get_previous_values(instance)
+        if previous is not None and previous['geometry'] != instance.geometry:
+            ...
+"""
+
+from django.db.models.signals import post_save
+
+
+__all__ = [
+    'track_previous_values',
+    'get_previous_values',
+]
+
+
+# model -> list of field names
+_fields = {}
+
+
+def _get_model(model):
+    # deferred and proxy classes share the fields of their model
+    return model._meta.concrete_model
+
+
+def clear_previous_values(sender, instance, **kwargs):
+    """ the next save loads the values again """
+    instance.__dict__.pop('_previous_values', None)
+
+
+def track_previous_values(model, fields):
+    """ fields of model which are loaded by get_previous_values, must be called at import time """
+    model = _get_model(model)
+    registered = _fields.setdefault(model, [])
+    registered += [field for field in fields if field not in registered]
+    post_save.connect(clear_previous_values, sender=model, dispatch_uid='previous_values_%s' % model._meta.db_table)
+
+
+def get_previous_values(instance):
+    """
+    returns a dictionary of the values of the tracked fields stored in the database
+    (foreign keys are ids keyed by the name of the field), None if the instance is new;
+    the row is loaded by the first call during each save
+    """
+    if not instance.pk:
+        return None
+
+    try:
+        return instance._previous_values
+    except AttributeError:
+        pass
+
+    model = _get_model(instance.__class__)
+    previous = None
+    for values in model._default_manager.filter(pk=instance.pk).values(*_fields[model]):
+        previous = values
+    instance._previous_values = previous
+    return previous
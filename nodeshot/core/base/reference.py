@@ -0,0 +1,167 @@
+"""
+process local cache of reference data
+
+Small tables which rarely change (statuses, layers, ecc) are read on almost every request;
+the rows of each registered model are loaded once and kept in the memory of the process.
+
+Each model has a version number stored in the shared cache: saving or deleting an instance
+increments it, every process compares it with the version of its local copy
+(a single cache lookup) and reloads the rows if it changed.
+
+Changes done inside a managed transaction (eg: admin views, TransactionMiddleware) increment
+the version when the request is finished, after the commit: otherwise other processes could
+reload the old rows and keep them under the new version. Local copies older than
+REFERENCE_CACHE_MAX_AGE seconds are reloaded anyway (eg: changes done by scripts or tasks).
+"""
+
+import copy
+import time
+import threading
+
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.conf import settings
+
+
+__all__ = [
+    'ReferenceCache',
+    'get_current_site',
+]
+
+
+VERSION_KEY = 'reference_version:%s.%s'
+VERSION_TIMEOUT = 86400 * 30
+MAX_AGE = settings.NODESHOT['SETTINGS'].get('REFERENCE_CACHE_MAX_AGE', 300)
+
+# reference caches invalidated inside a managed transaction by the current thread
+_state = threading.local()
+
+
+class ReferenceCache(object):
+    """
+    process local cache of all the instances of a model,
+    returned objects are copies which can be safely modified
+
+    :param model: model class
+    :param queryset: optional queryset used to load instances (eg: to add select_related)
+    """
+
+    def __init__(self, model, queryset=None):
+        self.model = model
+        self.queryset = queryset
+        self.version_key = VERSION_KEY % (model._meta.app_label, model._meta.object_name.lower())
+        self._version = None
+        self._loaded = 0
+        self._objects = []
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+        uid = 'reference_cache_%s' % self.version_key
+        post_save.connect(self.invalidate, sender=model, weak=False, dispatch_uid=uid)
+        post_delete.connect(self.invalidate, sender=model, weak=False, dispatch_uid=uid)
+
+    def get_version(self):
+        """
+        returns current version number;
+        versions start from the current timestamp so that an evicted version key
+        will never match the version of a stale local copy
+        """
+        version = cache.get(self.version_key)
+        if version is None:
+            version = int(time.time() * 1000)
+            cache.add(self.version_key, version, VERSION_TIMEOUT)
+        return version
+
+    def get_queryset(self):
+        if self.queryset is not None:
+            return self.queryset._clone()
+        return self.model._default_manager.all()
+
+    def _load(self):
+        """ reloads the local copy if its version is outdated, returns the list of objects """
+        version = self.get_version()
+
+        if version != self._version or time.time() - self._loaded > MAX_AGE:
+            objects = list(self.get_queryset())
+            with self._lock:
+                self._objects, self._indexes, self._version = objects, {}, version
+                self._loaded = time.time()
+
+        return self._objects
+
+    def _index(self, field_name):
+        objects = self._load()
+        indexes = self._indexes
+        if field_name not in indexes:
+            indexes[field_name] = dict([(getattr(obj, field_name), obj) for obj in objects])
+        return indexes[field_name]
+
+    def all(self):
+        """ returns the list of all the instances """
+        return [copy.copy(obj) for obj in self._load()]
+
+    def filter(self, **kwargs):
+        """ returns the list of the instances whose attributes are equal to kwargs (eg: layer_id=1) """
+        return [copy.copy(obj) for obj in self._load()
+                if all(getattr(obj, key) == value for key, value in kwargs.items())]
+
+    def get(self, **kwargs):
+        """
+        returns the instance which matches a single lookup (eg: pk=1, slug='rome')
+
+        :raises DoesNotExist: if there's no such instance
+        """
+        (field_name, value), = kwargs.items()
+
+        if field_name == 'pk':
+            field_name = self.model._meta.pk.attname
+
+        try:
+            return copy.copy(self._index(field_name)[value])
+        except KeyError:
+            raise self.model.DoesNotExist('%s matching %s does not exist' % (self.model._meta.object_name, kwargs))
+
+    def invalidate(self, **kwargs):
+        """
+        invalidates the local copies of every process,
+        the version is incremented after the commit of the current transaction
+        """
+        # the current process reloads the rows immediately
+        self._version = None
+        if transaction.is_managed():
+            pending = getattr(_state, 'pending', None)
+            if pending is None:
+                pending = _state.pending = set()
+            pending.add(self)
+        else:
+            self.increment_version()
+
+    def increment_version(self):
+        try:
+            cache.incr(self.version_key)
+        # key not present, a new version will be generated on next access
+        except ValueError:
+            pass
+
+
+@receiver(request_finished)
+def flush_invalidations(sender, **kwargs):
+    """ increments the versions of the reference caches invalidated during the request """
+    pending = getattr(_state, 'pending', None)
+    _state.pending = None
+    for reference_cache in pending or []:
+        reference_cache._version = None
+        reference_cache.increment_version()
+
+
+if 'django.contrib.sites' in settings.INSTALLED_APPS:
+    from django.contrib.sites.models import Site
+
+    Site.reference_cache = ReferenceCache(Site)
+
+    def get_current_site():
+        """ returns the Site specified in settings.SITE_ID """
+        return Site.reference_cache.get(pk=settings.SITE_ID)
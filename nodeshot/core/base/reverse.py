@@ -0,0 +1,97 @@
+"""
+cached url reversing
+
+django's reverse() walks the url resolver and checks the result against
+the regular expression of the url pattern every time it's called,
+which is expensive when it's done several times for each object of a list.
+
+Here each view name is resolved once into a format string (eg: "api/v1/nodes/%(slug)s/")
+and urls are built by substitution.
+Lookup values come from the database, therefore they are not checked against the url pattern.
+"""
+
+from django.core.urlresolvers import get_resolver, get_script_prefix, NoReverseMatch
+from django.core.urlresolvers import reverse as django_reverse
+from django.utils.encoding import force_text, iri_to_uri
+from django.utils.http import urlquote
+from django.utils.translation import get_language
+
+
+__all__ = [
+    'reverse',
+    'clear_url_templates',
+]
+
+
+# (language, view_name, parameters) -> (format string, param names) or None
+_templates = {}
+
+
+def get_url_template(view_name, args, kwargs):
+    """
+    returns a tuple (format string, parameter names) for the url of view_name
+    which accepts the specified args or kwargs, None if there's no such url
+    """
+    if args:
+        key = (get_language(), view_name, len(args))
+    else:
+        key = (get_language(), view_name, frozenset(kwargs))
+
+    try:
+        return _templates[key]
+    except KeyError:
+        pass
+
+    template = None
+
+    for possibility, pattern, defaults in get_resolver(None).reverse_dict.getlist(view_name):
+        for result, params in possibility:
+            if (args and len(params) == len(args)) or (not args and set(params) == set(kwargs)):
+                template = (result, params)
+                break
+        if template:
+            break
+
+    _templates[key] = template
+    return template
+
+
+def clear_url_templates():
+    """ clears the cache (eg: after the urlconf changed) """
+    _templates.clear()
+
+
+def reverse(viewname, args=None, kwargs=None, request=None, format=None, **extra):
+    """
+    drop-in replacement of rest_framework.reverse.reverse
+    which uses url templates instead of the url resolver
+    """
+    if format is not None:
+        kwargs = kwargs or {}
+        kwargs['format'] = format
+
+    args = args or []
+    kwargs = kwargs or {}
+
+    # custom urlconfs and namespaced views are handled by django
+    if extra or (args and kwargs) or getattr(request, 'urlconf', None) or ':' in viewname:
+        url = django_reverse(viewname, args=args, kwargs=kwargs, **extra)
+    else:
+        template = get_url_template(viewname, args, kwargs)
+
+        if template is None:
+            raise NoReverseMatch("Reverse for '%s' with arguments '%s' and keyword "
+                                 "arguments '%s' not found." % (viewname, args, kwargs))
+
+        result, params = template
+
+        if args:
+            values = dict(zip(params, [force_text(value) for value in args]))
+        else:
+            values = dict([(name, force_text(value)) for name, value in kwargs.items()])
+
+        url = iri_to_uri(urlquote(get_script_prefix()) + result % values)
+
+    if request:
+        return request.build_absolute_uri(url)
+    return url
@@ -0,0 +1,213 @@
+"""
+deferred django-reversion revisions
+
+Serializing versions (and their followed relations) and writing the Revision and Version rows
+inside the request adds a noticeable latency to every edit done through the API.
+When the REVERSION_DEFERRED setting is enabled the objects saved inside a revision block
+are only serialized (a plain django serialization of each object),
+the rows are written by the save_revisions celery task in a single transaction
+(this module must be listed in the CELERY_IMPORTS setting to register the task in workers).
+
+Each deferred version gets a sequence number (per object) from the cache:
+a revision is not written until the previous revisions of its objects have been written,
+so the history of each object keeps the order of the changes even if tasks are executed out of order.
+"""
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import reversion
+from celery import task
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.core import serializers
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.conf import settings
+
+from .utils import now
+
+
+__all__ = [
+    'REVERSION_DEFERRED',
+    'DeferredRevision',
+    'create_revision',
+    'save_revision',
+    'save_revisions',
+]
+
+
+REVERSION_DEFERRED = settings.NODESHOT['SETTINGS'].get('REVERSION_DEFERRED', False)
+
+SERIALIZATION_FORMAT = 'json'
+SEQUENCE_KEY = 'revision_sequence:%s'
+WRITTEN_KEY = 'revision_written:%s'
+SEQUENCE_TIMEOUT = 86400 * 30
+# a revision waiting for previous revisions of its objects is written anyway after these retries
+MAX_RETRIES = 10
+RETRY_DELAY = 2
+
+_state = threading.local()
+
+
+def get_object_key(instance):
+    return '%s.%s:%s' % (instance._meta.app_label, instance._meta.object_name.lower(), instance.pk)
+
+
+def _next_sequence(key):
+    """ returns the sequence number of the next version of the object identified by key """
+    # first version or evicted counter: previous versions are not waited for
+    if cache.add(SEQUENCE_KEY % key, 1, SEQUENCE_TIMEOUT):
+        cache.delete(WRITTEN_KEY % key)
+        return 1
+    try:
+        return cache.incr(SEQUENCE_KEY % key)
+    # evicted in the meanwhile
+    except ValueError:
+        cache.add(SEQUENCE_KEY % key, 1, SEQUENCE_TIMEOUT)
+        return 1
+
+
+def _is_ready(revisions):
+    """ returns True if the previous versions of all the objects of revisions have been written """
+    for revision in revisions:
+        for key, sequence, data in revision['objects']:
+            written = cache.get(WRITTEN_KEY % key)
+            if written is not None and written < sequence - 1:
+                return False
+    return True
+
+
+def _mark_written(revision):
+    for key, sequence, data in revision['objects']:
+        written = cache.get(WRITTEN_KEY % key)
+        if written is None or written < sequence:
+            cache.set(WRITTEN_KEY % key, sequence, SEQUENCE_TIMEOUT)
+
+
+class DeferredRevision(object):
+    """
+    context manager which collects the objects of registered models saved inside its block
+    and sends them to the save_revisions task on exit (unless an exception is raised)
+    """
+
+    def __init__(self, user=None, comment=''):
+        if user is not None and not user.is_authenticated():
+            user = None
+        self.user_id = user.pk if user is not None else None
+        self.comment = comment
+        self.date_created = now()
+        # object key -> serialized data, the last save of each object wins
+        self.objects = OrderedDict()
+
+    def add(self, instance):
+        self.objects[get_object_key(instance)] = serializers.serialize(SERIALIZATION_FORMAT, [instance])
+
+    def commit(self):
+        """ sends the collected objects to the save_revisions task """
+        if not self.objects:
+            return
+        revision = {
+            'user_id': self.user_id,
+            'comment': self.comment,
+            'date_created': self.date_created,
+            'objects': [(key, _next_sequence(key), data) for key, data in self.objects.items()]
+        }
+        save_revisions.delay([revision])
+
+    def __enter__(self):
+        # nested blocks are part of the outer revision
+        if getattr(_state, 'revision', None) is None:
+            _state.revision = self
+        return _state.revision
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if _state.revision is not self:
+            return
+        _state.revision = None
+        if exc_type is None:
+            self.commit()
+
+
+@contextmanager
+def create_revision(user=None, comment=''):
+    """
+    stores a revision of the registered objects saved inside the block,
+    in background if REVERSION_DEFERRED is enabled
+    """
+    if REVERSION_DEFERRED:
+        with DeferredRevision(user, comment):
+            yield
+    else:
+        with reversion.create_revision():
+            reversion.set_user(user)
+            reversion.set_comment(comment)
+            yield
+
+
+def save_revision(objects, user=None, comment=''):
+    """ stores a revision of objects, in background if REVERSION_DEFERRED is enabled """
+    if REVERSION_DEFERRED:
+        revision = DeferredRevision(user, comment)
+        for instance in objects:
+            revision.add(instance)
+        revision.commit()
+    else:
+        reversion.default_revision_manager.save_revision(objects, user=user, comment=comment)
+
+
+# ------ Signals ------ #
+
+
+@receiver(post_save)
+def capture_instance(sender, instance, raw=False, **kwargs):
+    """ adds instances of registered models to the active deferred revision """
+    revision = getattr(_state, 'revision', None)
+    if revision is not None and not raw and reversion.is_registered(sender):
+        revision.add(instance)
+
+
+# ------ Asynchronous tasks ------ #
+
+
+def _write_revision(revision):
+    from reversion.models import Revision
+
+    User = get_user_model()
+    user = None
+
+    if revision['user_id'] is not None:
+        try:
+            user = User.objects.get(pk=revision['user_id'])
+        except User.DoesNotExist:
+            pass
+
+    objects = []
+    for key, sequence, data in revision['objects']:
+        objects += [deserialized.object for deserialized in serializers.deserialize(SERIALIZATION_FORMAT, data)]
+
+    saved = reversion.default_revision_manager.save_revision(objects, user=user, comment=revision['comment'])
+
+    # keep the time of the change rather than the time of the task
+    if saved is not None:
+        Revision.objects.filter(pk=saved.pk).update(date_created=revision['date_created'])
+
+
+@task
+def save_revisions(revisions):
+    """
+    writes the Revision and Version rows of a batch of deferred revisions (list of dictionaries),
+    retries later if previous versions of their objects have not been written yet
+    """
+    if not _is_ready(revisions) and save_revisions.request.retries < MAX_RETRIES:
+        raise save_revisions.retry(countdown=RETRY_DELAY)
+
+    with transaction.commit_on_success():
+        for revision in revisions:
+            _write_revision(revision)
+
+    for revision in revisions:
+        _mark_written(revision)
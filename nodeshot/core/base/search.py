@@ -0,0 +1,207 @@
+"""
+full text search backend
+
+On PostgreSQL items are matched against a weighted tsvector built from the searchable fields
+and ranked with ts_rank; short fields (name, slug, ecc) are also matched by substring and,
+if the pg_trgm extension is available, by trigram similarity in order to tolerate typos.
+
+The tsvector and the trigrams are not stored in columns: GIN expression indexes are
+created (and maintained by PostgreSQL itself) when syncdb is run, the same expressions
+are used in queries so that the planner can use the indexes.
+
+On other databases the backend falls back to icontains lookups.
+"""
+
+import re
+
+from django.db import connections, transaction, DatabaseError
+from django.db.models import Q
+from django.db.models.signals import post_syncdb
+from django.dispatch import receiver
+from django.conf import settings
+
+
+__all__ = [
+    'SEARCH_CONFIG',
+    'SearchBackend',
+]
+
+
+# text search configuration, "simple" does not apply any language specific stemming
+SEARCH_CONFIG = settings.NODESHOT['SETTINGS'].get('SEARCH_CONFIG', 'simple')
+
+# list of instantiated backends, used to create indexes on syncdb
+registry = []
+
+
+class SearchBackend(object):
+    """
+    search backend of a model
+
+    :param model: model class
+    :param fields: list of (field_name, weight) tuples, weight is one of "A", "B", "C", "D"
+    :param trigram_fields: fields matched by substring and trigram similarity
+    """
+
+    def __init__(self, model, fields, trigram_fields=None):
+        self.model = model
+        self.fields = fields
+        self.trigram_fields = trigram_fields or []
+        # cache of pg_trgm availability for each database alias
+        self._trigram = {}
+        registry.append(self)
+
+    @property
+    def table(self):
+        return self.model._meta.db_table
+
+    def column(self, field_name, qualified=True):
+        """ returns quoted column name, qualified with the table name by default """
+        connection = connections['default']
+        column = connection.ops.quote_name(self.model._meta.get_field(field_name).column)
+        if qualified:
+            return '%s.%s' % (connection.ops.quote_name(self.table), column)
+        return column
+
+    def vector_sql(self, qualified=True):
+        """ SQL expression of the weighted tsvector """
+        return ' || '.join([
+            "setweight(to_tsvector('%s'::regconfig, coalesce(%s, '')), '%s')" % (
+                SEARCH_CONFIG, self.column(field_name, qualified), weight
+            )
+            for field_name, weight in self.fields
+        ])
+
+    def is_postgres(self, using):
+        return connections[using].vendor == 'postgresql'
+
+    def has_trigram(self, using):
+        """ returns True if the pg_trgm extension is installed in the database """
+        if using not in self._trigram:
+            cursor = connections[using].cursor()
+            cursor.execute("SELECT COUNT(*) FROM pg_extension WHERE extname = 'pg_trgm'")
+            self._trigram[using] = cursor.fetchone()[0] > 0
+        return self._trigram[using]
+
+    def get_tsquery(self, text):
+        """
+        converts user input in a tsquery string in which every word must match,
+        the last word is matched as a prefix ("search as you type")
+        returns None if text does not contain any word
+        """
+        words = re.findall(r'\w+', text, re.UNICODE)
+        if not words:
+            return None
+        words[-1] = '%s:*' % words[-1]
+        return ' & '.join(words)
+
+    def fallback(self, queryset, text):
+        """ icontains lookups for databases other than PostgreSQL """
+        search_query = Q()
+        for field_name, weight in self.fields:
+            search_query |= Q(**{ '%s__icontains' % field_name: text })
+        return queryset.filter(search_query)
+
+    def search(self, queryset, text):
+        """
+        restricts queryset to the items matching text, ordered by relevance
+
+        :param queryset: queryset of self.model
+        :param text: search string as typed by the user
+        """
+        text = text.strip()
+
+        if not text:
+            return queryset
+
+        if not self.is_postgres(queryset.db):
+            return self.fallback(queryset, text)
+
+        tsquery = self.get_tsquery(text)
+        vector = self.vector_sql()
+        trigram = self.has_trigram(queryset.db)
+
+        where, where_params = [], []
+        rank, rank_params = [], []
+
+        if tsquery is not None:
+            where.append("(%s) @@ to_tsquery('%s', %%s)" % (vector, SEARCH_CONFIG))
+            where_params.append(tsquery)
+            rank.append("ts_rank(%s, to_tsquery('%s', %%s))" % (vector, SEARCH_CONFIG))
+            rank_params.append(tsquery)
+
+        for field_name in self.trigram_fields:
+            column = self.column(field_name)
+            # ILIKE is also accelerated by the trigram index
+            where.append('%s ILIKE %%s' % column)
+            where_params.append('%%%s%%' % text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+            if trigram:
+                # "%" is the similarity operator of pg_trgm, it must be escaped
+                where.append('%s %%%% %%s' % column)
+                where_params.append(text)
+                rank.append('similarity(%s, %%s)' % column)
+                rank_params.append(text)
+
+        if not where:
+            return queryset.none()
+
+        return queryset.extra(
+            where=['(%s)' % ' OR '.join(where)],
+            params=where_params,
+            select={ 'search_rank': ' + '.join(rank) if rank else '0' },
+            select_params=rank_params,
+            order_by=['-search_rank']
+        )
+
+    def create_indexes(self, using='default'):
+        """
+        creates the GIN indexes used by the search (if not already present),
+        the pg_trgm extension is installed if possible
+        """
+        if not self.is_postgres(using):
+            return
+
+        connection = connections[using]
+        cursor = connection.cursor()
+
+        trigram = False
+        if self.trigram_fields:
+            self._trigram.pop(using, None)
+            try:
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+                trigram = True
+            # extensions can be installed only by privileged users,
+            # in that case fuzzy matching is not used
+            except DatabaseError:
+                transaction.rollback_unless_managed(using=using)
+
+        cursor.execute('SELECT indexname FROM pg_indexes WHERE tablename = %s', [self.table])
+        existing = set([row[0] for row in cursor.fetchall()])
+
+        index_name = '%s_search' % self.table
+        if index_name not in existing:
+            cursor.execute('CREATE INDEX %s ON %s USING GIN ((%s))' % (
+                connection.ops.quote_name(index_name),
+                connection.ops.quote_name(self.table),
+                self.vector_sql(qualified=False)
+            ))
+
+        for field_name in self.trigram_fields if trigram else []:
+            index_name = '%s_%s_trgm' % (self.table, field_name)
+            if index_name not in existing:
+                cursor.execute('CREATE INDEX %s ON %s USING GIN (%s gin_trgm_ops)' % (
+                    connection.ops.quote_name(index_name),
+                    connection.ops.quote_name(self.table),
+                    self.column(field_name, qualified=False)
+                ))
+
+        transaction.commit_unless_managed(using=using)
+
+
+@receiver(post_syncdb)
+def create_search_indexes(sender, **kwargs):
+    """ creates the search indexes of the models of the app being synced """
+    db = kwargs.get('db', 'default')
+    for backend in registry:
+        if backend.model._meta.app_label == sender.__name__.split('.')[-2]:
+            backend.create_indexes(using=db)
@@ -1,8 +1,14 @@
+import re
+import simplejson as json
+
 from django.core.urlresolvers import NoReverseMatch
 
-from rest_framework import serializers
+from rest_framework import serializers, pagination
 from rest_framework.fields import Field
-from rest_framework.reverse import reverse
+from rest_framework import relations
+from rest_framework.templatetags.rest_framework import replace_query_param
+
+from .reverse import reverse
 
 
 class ExtensibleModelSerializerOptions(serializers.SerializerOptions):
@@ -53,6 +59,104 @@ class ExtensibleModelSerializer(serializers.ModelSerializer):
         return ret
 
 
+class SparseFieldsMixin(object):
+    """
+    Django Rest Framework Serializer Mixin
+    which restricts the fields of the serializer to the ones listed
+    in the "fields" key of the serializer context (eg: ?fields=slug,name,geometry).
+    The geometry of GeoJSON serializers is always included.
+    
+    Unknown field names are ignored.
+    """
+    display_method = re.compile(r'^get_(\w+)_display$')
+    
+    def get_fields(self):
+        fields = super(SparseFieldsMixin, self).get_fields()
+        requested = self.context.get('fields')
+        
+        if requested:
+            geo_field = getattr(self.opts, 'geo_field', None)
+            for name in fields.keys():
+                if name not in requested and name != geo_field:
+                    del fields[name]
+        
+        return fields
+    
+    def get_field_dependencies(self, name, field):
+        """
+        returns the list of model attributes (as ORM lookups, eg: "layer__name")
+        read by the specified field or None if they can't be determined;
+        override to handle custom fields
+        """
+        # the url is built with lookup_field, slug_field is the fallback
+        if isinstance(field, relations.HyperlinkedIdentityField):
+            return [field.lookup_field, field.slug_field]
+        
+        source = field.source or name
+        
+        if source == '*':
+            return None
+        
+        parts = source.split('.')
+        # eg: get_access_level_display
+        match = self.display_method.match(parts[-1])
+        if match:
+            parts[-1] = match.group(1)
+        
+        return ['__'.join(parts)]
+    
+    def get_query_fields(self):
+        """
+        returns the set of ORM lookups needed to serialize objects
+        or None if they can't be determined
+        """
+        lookups = set()
+        
+        for name, field in self.fields.items():
+            dependencies = self.get_field_dependencies(name, field)
+            if dependencies is None:
+                return None
+            lookups.update(dependencies)
+        
+        return lookups
+
+
+class SimplifiedGeometryField(Field):
+    """
+    Read only geometry field which outputs the GeoJSON selected
+    in the "simplified_<field name>" attribute of objects
+    (see nodeshot.core.nodes.simplify.SimplifiedGeometryMixin)
+    """
+    
+    def field_to_native(self, obj, field_name):
+        geojson = getattr(obj, 'simplified_%s' % (self.source or field_name))
+        return json.loads(geojson) if geojson is not None else None
+
+
+class SimplifiedGeometrySerializerMixin(object):
+    """
+    Django Rest Framework Serializer Mixin
+    which replaces the geometry fields listed in the "simplified_fields" key
+    of the serializer context with SimplifiedGeometryField
+    """
+    
+    def get_fields(self):
+        fields = super(SimplifiedGeometrySerializerMixin, self).get_fields()
+        
+        for name in self.context.get('simplified_fields', []):
+            if name in fields:
+                fields[name] = SimplifiedGeometryField(source=fields[name].source or name,
+                                                       label=fields[name].label)
+        
+        return fields
+    
+    def get_field_dependencies(self, name, field):
+        """ the simplified GeoJSON is selected separately """
+        if isinstance(field, SimplifiedGeometryField):
+            return []
+        return super(SimplifiedGeometrySerializerMixin, self).get_field_dependencies(name, field)
+
+
 class DynamicRelationshipsMixin(object):
     """
     Django Rest Framework Serializer Mixin
@@ -147,4 +251,59 @@ class HyperlinkedField(Field):
         except NoReverseMatch:
             pass
 
-        raise Exception('Could not resolve URL for field using view name "%s"' % view_name)
\ No newline at end of file
+        raise Exception('Could not resolve URL for field using view name "%s"' % view_name)
+
+
+class HyperlinkedIdentityField(relations.HyperlinkedIdentityField):
+    """
+    HyperlinkedIdentityField which builds urls with nodeshot.core.base.reverse
+    """
+    
+    def get_url(self, obj, view_name, request, format):
+        lookup_value = getattr(obj, self.lookup_field, None)
+        
+        # unsaved object
+        if lookup_value is None:
+            return None
+        
+        try:
+            return reverse(view_name, kwargs={ self.lookup_field: lookup_value }, request=request, format=format)
+        except NoReverseMatch:
+            pass
+        
+        if self.pk_url_kwarg != 'pk':
+            try:
+                return reverse(view_name, kwargs={ self.pk_url_kwarg: obj.pk }, request=request, format=format)
+            except NoReverseMatch:
+                pass
+        
+        slug = getattr(obj, self.slug_field, None)
+        
+        if slug is not None:
+            try:
+                return reverse(view_name, kwargs={ self.slug_url_kwarg: slug }, request=request, format=format)
+            except NoReverseMatch:
+                pass
+        
+        raise NoReverseMatch()
+
+
+class NextCursorField(Field):
+    """
+    Field that returns a link to the next page of a cursor paginated list
+    """
+    def to_native(self, value):
+        if value.next_cursor is None:
+            return None
+        request = self.context.get('request')
+        url = request and request.build_absolute_uri() or ''
+        cursor_param = getattr(self.context.get('view'), 'cursor_param', 'cursor')
+        return replace_query_param(url, cursor_param, value.next_cursor)
+
+
+class CursorPaginationSerializer(pagination.BasePaginationSerializer):
+    """
+    Pagination serializer for cursor paginated lists,
+    there's no count of the items nor a link to the previous page
+    """
+    next = NextCursorField(source='*')
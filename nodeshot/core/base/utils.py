@@ -15,6 +15,7 @@ __all__ = [
     'now',
     'now_after',
     'after',
+    'queryset_iterator',
 ]
 
 
@@ -75,6 +76,36 @@ def get_key_by_value(dictionary, search_value):
             return ugettext(key)
 
 
+def queryset_iterator(queryset, chunk_size=500):
+    """
+    Iterates over a queryset fetching chunk_size rows at a time,
+    so that memory usage stays flat regardless of the size of the result.
+    Chunks are retrieved with keyset pagination on the primary key,
+    therefore items are returned ordered by primary key
+    (descending if queryset is ordered by "-id" or "-pk", ascending otherwise).
+    
+    :param queryset: queryset to iterate over
+    :param chunk_size: number of rows fetched with each query
+    """
+    ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+    descending = ordering in (['-id'], ['-pk'])
+    queryset = queryset.order_by('-pk' if descending else 'pk')
+    lookup = 'pk__lt' if descending else 'pk__gt'
+    last_pk = None
+    
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(**{ lookup: last_pk })
+        chunk = list(chunk[:chunk_size])
+        
+        for item in chunk:
+            yield item
+        
+        if len(chunk) < chunk_size:
+            break
+        
+        last_pk = chunk[-1].pk
+
+
 def pause_disconnectable_signals():
     """
     Disconnects non critical signals like notifications, websockets and stuff like that.
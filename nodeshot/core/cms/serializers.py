@@ -1,6 +1,8 @@
 from django.conf import settings
 from rest_framework import serializers
 
+from nodeshot.core.base.serializers import HyperlinkedIdentityField
+
 from .models import *
 
 
@@ -16,7 +18,7 @@ class PageListSerializer(serializers.ModelSerializer):
     Page List Serializer
     """
     
-    details = serializers.HyperlinkedIdentityField(view_name='api_page_detail', slug_field='slug')
+    details = HyperlinkedIdentityField(view_name='api_page_detail', slug_field='slug')
     
     class Meta:
         model = Page
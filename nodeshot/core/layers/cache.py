@@ -0,0 +1,118 @@
+"""
+cache of the rendered GeoJSON of the nodes of each layer
+
+The rendered (and gzip compressed) content is stored once for each layer and access level.
+Keys are versioned: invalidating a layer means incrementing its version number,
+which is cheap and makes all the entries of that layer (every access level and host) unreachable.
+Changes to statuses affect every layer and increment a global version number instead.
+"""
+
+import time
+import gzip
+import hashlib
+from cStringIO import StringIO
+
+from django.core.cache import cache
+from django.utils.text import compress_string
+from django.conf import settings
+
+from nodeshot.core.base import acl
+
+
+__all__ = [
+    'GEOJSON_CACHE_ENABLED',
+    'get_access_level',
+    'get_layer_geojson',
+    'set_layer_geojson',
+    'invalidate_layer',
+    'invalidate_all_layers',
+    'decompress',
+]
+
+
+GEOJSON_CACHE_ENABLED = settings.NODESHOT['SETTINGS'].get('GEOJSON_CACHE', True)
+GEOJSON_CACHE_TIMEOUT = settings.NODESHOT['SETTINGS'].get('GEOJSON_CACHE_TIMEOUT', 86400)
+
+GLOBAL_VERSION_KEY = 'layer_geojson_version'
+LAYER_VERSION_KEY = 'layer_geojson_version:%s'
+# version keys outlive the content they point to
+VERSION_TIMEOUT = GEOJSON_CACHE_TIMEOUT * 30
+
+
+def get_access_level(user):
+    """
+    returns the access level used to build the cache key of the specified user,
+    superusers can see everything so they get a special level
+    """
+    if user.is_superuser:
+        return 'superuser'
+    return acl.get_access_level(user)
+
+
+def _get_version(key):
+    """
+    returns current version number stored at key;
+    versions start from the current timestamp so that an evicted version key
+    will never point to content which was cached before its eviction
+    """
+    version = cache.get(key)
+    if version is None:
+        version = int(time.time())
+        cache.add(key, version, VERSION_TIMEOUT)
+    return version
+
+
+def _get_key(layer_id, access_level, host):
+    key = 'layer_geojson:%s:%s:%s:%s' % (
+        _get_version(GLOBAL_VERSION_KEY),
+        layer_id,
+        _get_version(LAYER_VERSION_KEY % layer_id),
+        access_level
+    )
+    # host is hashed because it might contain chars which are not allowed in memcached keys
+    return '%s:%s' % (key, hashlib.md5(host).hexdigest())
+
+
+def get_layer_geojson(layer_id, access_level, host):
+    """
+    returns a dictionary with the keys "etag" (unquoted) and "content" (gzip compressed)
+    or None if nothing is cached
+    """
+    return cache.get(_get_key(layer_id, access_level, host))
+
+
+def set_layer_geojson(layer_id, access_level, host, content):
+    """
+    compresses and stores rendered content, returns the stored dictionary
+
+    :param content: rendered (uncompressed) GeoJSON string
+    """
+    entry = {
+        'etag': hashlib.md5(content).hexdigest(),
+        'content': compress_string(content)
+    }
+    cache.set(_get_key(layer_id, access_level, host), entry, GEOJSON_CACHE_TIMEOUT)
+    return entry
+
+
+def _increment(key):
+    try:
+        cache.incr(key)
+    # key not present, a new version will be generated on next access
+    except ValueError:
+        pass
+
+
+def invalidate_layer(layer_id):
+    """ invalidates the cached GeoJSON of the specified layer """
+    _increment(LAYER_VERSION_KEY % layer_id)
+
+
+def invalidate_all_layers():
+    """ invalidates the cached GeoJSON of every layer """
+    _increment(GLOBAL_VERSION_KEY)
+
+
+def decompress(content):
+    """ decompress gzip compressed string """
+    return gzip.GzipFile(fileobj=StringIO(content)).read()
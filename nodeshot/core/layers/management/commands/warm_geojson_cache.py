@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import reverse
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sites.models import Site
+from django.test.client import RequestFactory
+from django.conf import settings
+
+from nodeshot.core.layers.models import Layer
+from nodeshot.core.layers.views import nodes_geojson_list
+from nodeshot.core.layers.cache import GEOJSON_CACHE_ENABLED
+
+
+class Command(BaseCommand):
+    args = '<layer_slug layer_slug ...>'
+    help = 'Render and cache the public GeoJSON of the specified layers (all published layers if none specified)'
+
+    def retrieve_layers(self, *args):
+        """ retrieve specified layers or all published layers if no layer specified """
+        layers = Layer.objects.published()
+
+        if len(args) < 1:
+            return layers
+
+        layers = layers.filter(slug__in=args)
+
+        if len(layers) != len(args):
+            missing = set(args) - set([layer.slug for layer in layers])
+            raise CommandError('Layers not found or not published: %s\n\r' % ', '.join(missing))
+
+        return layers
+
+    def handle(self, *args, **options):
+        """ warm GeoJSON cache """
+        if not GEOJSON_CACHE_ENABLED:
+            self.stdout.write('GeoJSON cache is disabled in settings, nothing to do\n\r')
+            return
+
+        # the cache is keyed by host, requests are built for the current site
+        factory = RequestFactory(**{
+            'HTTP_HOST': Site.objects.get_current().domain,
+            'wsgi.url_scheme': getattr(settings, 'PROTOCOL', 'http')
+        })
+
+        for layer in self.retrieve_layers(*args):
+            request = factory.get(reverse('api_layer_nodes_geojson', args=[layer.slug]),
+                                  HTTP_ACCEPT='application/json')
+            # public access level; other access levels are cached on first request
+            request.user = AnonymousUser()
+            response = nodes_geojson_list(request, slug=layer.slug)
+
+            if response.status_code == 200:
+                self.stdout.write('cached GeoJSON of layer "%s"\n\r' % layer.slug)
+            else:
+                self.stdout.write('could not cache GeoJSON of layer "%s": HTTP %s\n\r' % (layer.slug, response.status_code))
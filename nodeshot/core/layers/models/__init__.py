@@ -3,6 +3,21 @@ from layer import Layer
 __all__ = ['Layer']
 
 
+# ------ Reference data cache ------ #
+
+from nodeshot.core.base.reference import ReferenceCache
+
+Layer.reference_cache = ReferenceCache(Layer)
+
+
+# ------ Conditional GET ------ #
+
+from nodeshot.core.base.conditional import track_changes
+
+# name and slug of layers are serialized with nodes
+track_changes(Layer)
+
+
 # ------ Add relationship to ExtensibleNodeSerializer ------ #
 
 from nodeshot.core.nodes.serializers import ExtensibleNodeSerializer
@@ -12,3 +27,99 @@ ExtensibleNodeSerializer.add_relationship(**{
     'view_name': 'api_layer_detail',
     'lookup_field': 'layer.slug'
 })
+
+
+# ------ Invalidate cached GeoJSON of layers ------ #
+
+from django.dispatch import receiver
+from django.db.models.signals import pre_save, post_save, pre_delete
+
+from nodeshot.core.base.previous import track_previous_values, get_previous_values
+from nodeshot.core.nodes.models import Node, Status
+from nodeshot.core.nodes.signals import nodes_bulk_saved
+
+from ..cache import invalidate_layer, invalidate_all_layers
+
+track_previous_values(Node, ['layer'])
+
+
+@receiver(pre_save, sender=Node)
+def invalidate_previous_layer_geojson(sender, **kwargs):
+    """ a node which is moved to another layer must disappear from the old one """
+    previous = get_previous_values(kwargs['instance'])
+    if previous is not None and previous['layer'] != kwargs['instance'].layer_id:
+        invalidate_layer(previous['layer'])
+
+
+@receiver(post_save, sender=Node)
+@receiver(pre_delete, sender=Node)
+def invalidate_node_layer_geojson(sender, **kwargs):
+    invalidate_layer(kwargs['instance'].layer_id)
+
+
+@receiver(post_save, sender=Layer)
+@receiver(pre_delete, sender=Layer)
+def invalidate_layer_geojson(sender, **kwargs):
+    invalidate_layer(kwargs['instance'].id)
+
+
+@receiver(post_save, sender=Status)
+@receiver(pre_delete, sender=Status)
+def invalidate_all_layers_geojson(sender, **kwargs):
+    invalidate_all_layers()
+
+
+@receiver(nodes_bulk_saved)
+def invalidate_bulk_saved_layers_geojson(sender, **kwargs):
+    """ nodes saved in bulk might have been moved between several layers """
+    invalidate_all_layers()
+
+
+# ------ Invalidate cached vector tiles ------ #
+
+from .. import tiles
+
+track_previous_values(Node, ['geometry', 'layer'])
+
+
+@receiver(pre_save, sender=Node)
+def invalidate_previous_node_tiles(sender, **kwargs):
+    """ a node which has been moved must disappear from the tiles of its previous position """
+    node = kwargs['instance']
+    previous = get_previous_values(node)
+    if previous is not None and (previous['geometry'] != node.geometry or previous['layer'] != node.layer_id):
+        tiles.invalidate_geometry(previous['geometry'], previous['layer'])
+
+
+@receiver(post_save, sender=Node)
+@receiver(pre_delete, sender=Node)
+def invalidate_node_tiles(sender, **kwargs):
+    node = kwargs['instance']
+    tiles.invalidate_geometry(node.geometry, node.layer_id)
+
+
+@receiver(post_save, sender=Layer)
+@receiver(pre_delete, sender=Layer)
+@receiver(post_save, sender=Status)
+@receiver(pre_delete, sender=Status)
+@receiver(nodes_bulk_saved)
+def invalidate_all_node_tiles(sender, **kwargs):
+    """ layers, statuses and nodes saved in bulk affect too many tiles """
+    tiles.invalidate_all_tiles()
+
+
+# ------ Simplified areas ------ #
+
+from django.db.models.signals import post_delete
+
+from nodeshot.core.nodes.simplify import simplify_geometry, delete_simplified_geometries
+
+
+@receiver(post_save, sender=Layer)
+def simplify_layer_area(sender, instance, **kwargs):
+    simplify_geometry(instance, 'area')
+
+
+@receiver(post_delete, sender=Layer)
+def delete_simplified_layer_area(sender, instance, **kwargs):
+    delete_simplified_geometries(instance)
@@ -77,7 +77,9 @@ class Layer(BaseDate):
 
 @property
 def intersecting_layers(self):
-    return Layer.objects.filter(area__contains=self.point)
+    """ list of layers whose area contains the node, resolved in memory """
+    from ..resolver import resolver
+    return resolver.layers_containing(self.point)
 
 Node.intersecting_layers = intersecting_layers
 
@@ -105,6 +107,7 @@ def node_layer_validation(self):
         minimum_distance = self.layer.minimum_distance
         geometry = self.geometry
         layer_area = self.layer.area
+        layer_id = self.layer.id
     except ObjectDoesNotExist:
         # this happens if node.layer is None 
         return
@@ -115,7 +118,17 @@ def node_layer_validation(self):
         if near_nodes > 0 :
             raise ValidationError(_('Distance between nodes cannot be less than %s meters') % minimum_distance)        
     
-    if layer_area is not None and not layer_area.contains(geometry):
+    if layer_area is None:
+        return
+    
+    # the prepared areas of saved layers are indexed in memory
+    if layer_id is not None:
+        from ..resolver import resolver
+        contained = resolver.area_contains(layer_id, geometry, area=layer_area)
+    else:
+        contained = layer_area.contains(geometry)
+    
+    if not contained:
         raise ValidationError(_('Node must be inside layer area'))
 
 Node.add_validation_method(new_nodes_allowed_for_layer)
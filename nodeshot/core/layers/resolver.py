@@ -0,0 +1,145 @@
+"""
+in memory point-in-layer resolution
+
+The areas of all the layers are loaded (from the reference data cache of layers)
+in prepared GEOS geometries indexed by a packed R-tree built with the
+Sort-Tile-Recursive algorithm: finding the layers which contain a point costs a few
+bounding box comparisons and a prepared "contains" test instead of a query.
+
+The index is rebuilt when the version of the reference data cache of layers changes,
+that is each time a layer is saved or deleted (in any process).
+"""
+
+import math
+import threading
+
+from .models import Layer
+
+
+__all__ = [
+    'LayerAreaResolver',
+    'resolver',
+]
+
+
+# maximum number of children of each node of the tree
+NODE_CAPACITY = 8
+
+
+def _union(boxes):
+    return (
+        min([box[0] for box in boxes]),
+        min([box[1] for box in boxes]),
+        max([box[2] for box in boxes]),
+        max([box[3] for box in boxes])
+    )
+
+
+def _intersects(box, other):
+    return box[0] <= other[2] and other[0] <= box[2] and box[1] <= other[3] and other[1] <= box[3]
+
+
+class STRtree(object):
+    """
+    static packed R-tree of (bounding box, item) tuples,
+    bounding boxes are (minx, miny, maxx, maxy) tuples
+    """
+
+    def __init__(self, entries, capacity=NODE_CAPACITY):
+        self.capacity = capacity
+        self.root = self._pack([(box, item) for box, item in entries], leaf=True) if entries else None
+
+    def _pack(self, entries, leaf):
+        """ recursively groups entries in nodes, returns the root (box, children, leaf) """
+        if len(entries) <= self.capacity:
+            return (_union([box for box, child in entries]), entries, leaf)
+
+        capacity = self.capacity
+        slice_count = int(math.ceil(math.sqrt(math.ceil(len(entries) / float(capacity)))))
+        slice_size = slice_count * capacity
+
+        # sort by the center of boxes: vertical slices ordered by x, nodes of each slice ordered by y
+        entries = sorted(entries, key=lambda entry: entry[0][0] + entry[0][2])
+        nodes = []
+
+        for start in range(0, len(entries), slice_size):
+            vertical_slice = sorted(entries[start:start + slice_size], key=lambda entry: entry[0][1] + entry[0][3])
+            for offset in range(0, len(vertical_slice), capacity):
+                children = vertical_slice[offset:offset + capacity]
+                node_box = _union([box for box, child in children])
+                nodes.append((node_box, (node_box, children, leaf)))
+
+        return self._pack(nodes, leaf=False)
+
+    def query(self, box):
+        """ returns the items whose bounding box intersects box """
+        results = []
+        stack = [self.root] if self.root is not None else []
+
+        while stack:
+            node_box, children, leaf = stack.pop()
+            if not _intersects(node_box, box):
+                continue
+            for child_box, child in children:
+                if _intersects(child_box, box):
+                    if leaf:
+                        results.append(child)
+                    else:
+                        stack.append(child)
+
+        return results
+
+
+class LayerAreaResolver(object):
+    """ answers which layers contain a geometry using the in memory index of layer areas """
+
+    def __init__(self):
+        self._version = None
+        self._tree = None
+        self._areas = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """ rebuilds the index if layers changed """
+        version = Layer.reference_cache.get_version()
+
+        if version != self._version:
+            layers = [layer for layer in Layer.reference_cache.all() if layer.area is not None]
+            # layer id -> (layer, prepared area)
+            areas = dict([(layer.id, (layer, layer.area.prepared)) for layer in layers])
+            tree = STRtree([(layer.area.extent, layer.id) for layer in layers])
+            with self._lock:
+                self._areas, self._tree, self._version = areas, tree, version
+
+        return self._areas, self._tree
+
+    def _resolve(self, geometry, areas, tree):
+        layer_ids = [layer_id for layer_id in tree.query(geometry.extent) if areas[layer_id][1].contains(geometry)]
+        return [areas[layer_id][0] for layer_id in sorted(layer_ids)]
+
+    def layers_containing(self, geometry):
+        """ returns the list of layers (ordered by id) whose area contains geometry """
+        areas, tree = self._load()
+        return self._resolve(geometry, areas, tree)
+
+    def layers_containing_many(self, geometries):
+        """ returns a list which contains the result of layers_containing for each geometry """
+        areas, tree = self._load()
+        return [self._resolve(geometry, areas, tree) for geometry in geometries]
+
+    def area_contains(self, layer_id, geometry, area=None):
+        """
+        returns True if the area of the specified layer contains geometry
+        or if the layer has no area
+
+        :param area: area of the layer, used if the layer is not indexed
+                     (eg: the reference cache of this process is stale)
+        """
+        areas, tree = self._load()
+        if layer_id not in areas:
+            return area is None or area.contains(geometry)
+        return areas[layer_id][1].contains(geometry)
+
+
+# shared by the whole process
+resolver = LayerAreaResolver()
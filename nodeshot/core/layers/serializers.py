@@ -4,8 +4,9 @@ from rest_framework_gis import serializers as geoserializers
 
 from .models import Layer
 
-from nodeshot.core.nodes.models import Node,StatusIcon
+from nodeshot.core.nodes.models import Node, Status, StatusIcon
 from nodeshot.core.nodes.serializers import NodeListSerializer
+from nodeshot.core.base.serializers import HyperlinkedIdentityField, SimplifiedGeometrySerializerMixin
 
 
 __all__ = [
@@ -24,9 +25,9 @@ class LayerListSerializer(geoserializers.GeoModelSerializer):
     """
     Layer list
     """
-    details = serializers.HyperlinkedIdentityField(view_name='api_layer_detail', slug_field='slug')
-    nodes = serializers.HyperlinkedIdentityField(view_name='api_layer_nodes_list', slug_field='slug')
-    geojson = serializers.HyperlinkedIdentityField(view_name='api_layer_nodes_geojson', slug_field='slug')
+    details = HyperlinkedIdentityField(view_name='api_layer_detail', slug_field='slug')
+    nodes = HyperlinkedIdentityField(view_name='api_layer_nodes_list', slug_field='slug')
+    geojson = HyperlinkedIdentityField(view_name='api_layer_nodes_geojson', slug_field='slug')
     
     class Meta:
         model = Layer
@@ -42,7 +43,7 @@ class PaginatedLayerListSerializer(pagination.PaginationSerializer):
         object_serializer_class = LayerListSerializer
 
 
-class GeoLayerListSerializer(geoserializers.GeoFeatureModelSerializer, LayerListSerializer):
+class GeoLayerListSerializer(SimplifiedGeometrySerializerMixin, geoserializers.GeoFeatureModelSerializer, LayerListSerializer):
     class Meta:
         model = Layer
         geo_field = 'area'
@@ -86,7 +87,12 @@ class LayerNodeListSerializer(LayerDetailSerializer):
         
         
 class StatusIconSerializer(serializers.ModelSerializer):
-    status = serializers.Field(source='status')
+    status = serializers.SerializerMethodField('get_status')
+    
+    def get_status(self, obj):
+        """ name of the status, read from the reference data cache """
+        return unicode(Status.reference_cache.get(pk=obj.status_id))
+    
     class Meta:
         model = StatusIcon
         fields = ('status','background_color',)
@@ -96,7 +102,12 @@ class LayerStatusIconSerializer(serializers.ModelSerializer):
     """
     Layer details
     """
-    status_icons = StatusIconSerializer(source='statusicon_set')
+    status_icons = serializers.SerializerMethodField('get_status_icons')
+    
+    def get_status_icons(self, obj):
+        """ icons of the layer, read from the reference data cache instead of a query per layer """
+        icons = StatusIcon.reference_cache.filter(layer_id=obj.id)
+        return StatusIconSerializer(icons, many=True, context=self.context).data
     
     class Meta:
         model = Layer
@@ -131,6 +131,37 @@ class LayerTest(TestCase):
         
         self.assertTrue(False, 'validation not working as expected')
     
+    def test_layer_area_resolver(self):
+        """ point in layer resolution with prepared geometries """
+        from .resolver import resolver, STRtree
+        
+        layer = Layer.objects.get(slug='rome')
+        layer.area = GEOSGeometry('POLYGON ((12.19 41.92, 12.58 42.17, 12.82 41.86, 12.43 41.64, 12.43 41.65, 12.19 41.92))')
+        layer.save()
+        
+        inside = GEOSGeometry('POINT (12.50 41.90)')
+        outside = GEOSGeometry('POINT (50.0 50.0)')
+        self.assertEqual([l.slug for l in resolver.layers_containing(inside)], ['rome'])
+        self.assertEqual(resolver.layers_containing(outside), [])
+        self.assertEqual([len(layers) for layers in resolver.layers_containing_many([inside, outside])], [1, 0])
+        self.assertEqual([l.slug for l in Node.objects.get(slug='rdp').intersecting_layers], ['rome'])
+        
+        # index is rebuilt when layers change
+        layer.area = GEOSGeometry('POLYGON ((49 49, 51 49, 51 51, 49 51, 49 49))')
+        layer.save()
+        self.assertEqual(resolver.layers_containing(inside), [])
+        self.assertEqual(len(resolver.layers_containing(outside)), 1)
+        
+        # layers missing from the index (stale reference cache) are checked with their area
+        self.assertTrue(resolver.area_contains(999, outside))
+        self.assertTrue(resolver.area_contains(999, outside, area=layer.area))
+        self.assertFalse(resolver.area_contains(999, inside, area=layer.area))
+        
+        # tree with more entries than the capacity of a node
+        tree = STRtree([((i, i, i + 1, i + 1), i) for i in range(100)], capacity=4)
+        self.assertEqual(sorted(tree.query((10.5, 10.5, 12.5, 12.5))), [10, 11, 12])
+        self.assertEqual(tree.query((200, 200, 201, 201)), [])
+    
     def test_layers_api(self,*args,**kwargs):
         """
         Layers endpoint should be reachable and return 404 if layer is not found.
@@ -180,10 +211,13 @@ class LayerTest(TestCase):
         response = self.client.get(reverse('api_layer_nodes_list', args=[layer_slug]))
         layer_public_nodes_count = Node.objects.filter(layer=layer).published().access_level_up_to('public').count()
         self.assertEqual(len(response.data['nodes']['results']), layer_public_nodes_count)
+        # conditional requests
+        response = self.client.get(reverse('api_layer_nodes_list', args=[layer_slug]), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
         
         # ensure number of elements is the expected, even by disabling layerinfo and pagination
         response = self.client.get(reverse('api_layer_nodes_list', args=[layer_slug]), { 'limit': 0, 'layerinfo': 'false' })
-        self.assertEqual(len(response.data), layer_public_nodes_count)
+        self.assertEqual(len(json.loads(''.join(response.streaming_content))), layer_public_nodes_count)
         
         # api_layer_nodes_geojson
         response = self.client.get(reverse('api_layer_nodes_geojson', args=[layer_slug]), { 'limit': 0, 'layerinfo': 'true' })
@@ -192,9 +226,69 @@ class LayerTest(TestCase):
         
         # test layer info geojson without layerinfo
         response = self.client.get(reverse('api_layer_nodes_geojson', args=[layer_slug]), { 'limit': 0 })
-        # ensure "features" are at root level
-        self.assertEqual(len(response.data['features']), layer_public_nodes_count)
+        # ensure "features" are at root level (unpaginated lists are streamed)
+        self.assertEqual(len(json.loads(''.join(response.streaming_content))['features']), layer_public_nodes_count)
         
+    def test_layer_nodes_geojson_cache(self):
+        """ cached GeoJSON supports conditional requests and gzip """
+        url = reverse('api_layer_nodes_geojson', args=['rome'])
+        
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        etag = response['ETag']
+        layer_public_nodes_count = Node.objects.filter(layer__slug='rome').published().access_level_up_to('public').count()
+        self.assertEqual(len(json.loads(response.content)['features']), layer_public_nodes_count)
+        
+        # client already has the current version
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        
+        # gzip compressed content
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        
+        # changing a node changes the content and its etag
+        node = Node.objects.filter(layer__slug='rome').published().access_level_up_to('public')[0]
+        node.name = 'changed name'
+        node.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+    
+    def test_layer_vector_tiles(self):
+        """ vector tiles are cached and invalidated per tile """
+        from nodeshot.core.base.choices import ACCESS_LEVELS
+        from . import tiles
+        
+        public = ACCESS_LEVELS.get('public')
+        
+        response = self.client.get(reverse('api_layer_vector_tile', args=['all', 0, 0, 0]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        self.assertIsNotNone(tiles.get_tile('all', 0, 0, 0, public))
+        
+        # tiles which contain fusolab (rome) and eigenlab (pisa) at zoom level 8
+        self.client.get(reverse('api_layer_vector_tile', args=['rome', 8, 136, 95]))
+        self.client.get(reverse('api_layer_vector_tile', args=['all', 8, 135, 93]))
+        self.assertIsNotNone(tiles.get_tile(1, 8, 136, 95, public))
+        self.assertIsNotNone(tiles.get_tile('all', 8, 135, 93, public))
+        
+        # only the tiles which contain the changed node are invalidated
+        node = Node.objects.get(slug='fusolab')
+        node.name = 'changed name'
+        node.save()
+        self.assertIsNone(tiles.get_tile('all', 0, 0, 0, public))
+        self.assertIsNone(tiles.get_tile(1, 8, 136, 95, public))
+        self.assertIsNotNone(tiles.get_tile('all', 8, 135, 93, public))
+        
+        # tile out of range and unknown layer
+        response = self.client.get(reverse('api_layer_vector_tile', args=['all', 1, 2, 0]))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('api_layer_vector_tile', args=['idontexist', 0, 0, 0]))
+        self.assertEqual(response.status_code, 404)
+    
     def test_layers_api_post(self):
         layer_count = Layer.objects.all().count()
         
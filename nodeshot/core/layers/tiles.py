@@ -0,0 +1,269 @@
+"""
+vector tiles (Mapbox Vector Tile format) of nodes and links
+
+Tiles are addressed with the usual z/x/y scheme (web mercator, origin top left)
+and are rendered by PostGIS (ST_AsMVTGeom + ST_AsMVT, PostGIS >= 2.4),
+each tile contains a "nodes" layer and, if the links app is installed, a "links" layer.
+Only the properties needed to style the map are included:
+status and layer slug for nodes, status, layer slug and metric value (quality) for links.
+
+Rendered tiles are cached for each layer ("all" for the tiles of every layer) and access level.
+When a node or a link changes only the tiles which contain its geometry
+(before and after the change) are invalidated, one tile for each zoom level in case of nodes;
+changes which affect too many tiles (statuses, layers, bulk operations, long links)
+increment a global version number instead.
+"""
+
+import math
+import time
+
+from django.db import connection
+from django.core.cache import cache
+from django.contrib.gis.geos import Polygon
+from django.conf import settings
+
+from nodeshot.core.base.choices import ACCESS_LEVELS
+
+
+__all__ = [
+    'TILE_MAX_ZOOM',
+    'MVT_CONTENT_TYPE',
+    'is_valid_tile',
+    'tile_bbox',
+    'render_tile',
+    'get_tile',
+    'set_tile',
+    'invalidate_geometry',
+    'invalidate_all_tiles',
+]
+
+
+LINKS_ENABLED = 'nodeshot.networking.links' in settings.INSTALLED_APPS
+
+TILE_CACHE_ENABLED = settings.NODESHOT['SETTINGS'].get('TILE_CACHE', True)
+TILE_CACHE_TIMEOUT = settings.NODESHOT['SETTINGS'].get('TILE_CACHE_TIMEOUT', 86400)
+# tiles are served up to this zoom level
+TILE_MAX_ZOOM = settings.NODESHOT['SETTINGS'].get('TILE_MAX_ZOOM', 18)
+# a change affecting more tiles than this (on a single zoom level) invalidates every tile
+TILE_INVALIDATION_LIMIT = settings.NODESHOT['SETTINGS'].get('TILE_INVALIDATION_LIMIT', 64)
+
+MVT_CONTENT_TYPE = 'application/vnd.mapbox-vector-tile'
+
+# size of a tile in integer coordinates and size of the buffer around it
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+
+# half circumference of the earth in web mercator meters
+EARTH_RADIUS = 6378137.0
+ORIGIN = math.pi * EARTH_RADIUS
+# web mercator does not cover the poles
+MAX_LATITUDE = 85.0511287798
+
+VERSION_KEY = 'vector_tile_version'
+# version keys outlive the content they point to
+VERSION_TIMEOUT = TILE_CACHE_TIMEOUT * 30
+
+
+NODE_TILE_SQL = """
+SELECT ST_AsMVT(tile, 'nodes', %(extent)d, 'geom') FROM (
+    SELECT
+        ST_AsMVTGeom(ST_Transform(n.geometry, 3857), ST_MakeEnvelope(%%s, %%s, %%s, %%s, 3857),
+                     %(extent)d, %(buffer)d, true) AS geom,
+        s.slug AS status,
+        l.slug AS layer
+    FROM nodes_node n
+    LEFT OUTER JOIN nodes_status s ON s.id = n.status_id
+    LEFT OUTER JOIN layers_layer l ON l.id = n.layer_id
+    WHERE n.id IN (%(subquery)s)
+) AS tile
+WHERE geom IS NOT NULL
+"""
+
+LINK_TILE_SQL = """
+SELECT ST_AsMVT(tile, 'links', %(extent)d, 'geom') FROM (
+    SELECT
+        ST_AsMVTGeom(ST_Transform(k.line, 3857), ST_MakeEnvelope(%%s, %%s, %%s, %%s, 3857),
+                     %(extent)d, %(buffer)d, true) AS geom,
+        CASE k.status %(status_cases)s END AS status,
+        l.slug AS layer,
+        k.metric_value AS quality
+    FROM links_link k
+    LEFT OUTER JOIN nodes_node n ON n.id = k.node_a_id
+    LEFT OUTER JOIN layers_layer l ON l.id = n.layer_id
+    WHERE k.id IN (%(subquery)s)
+) AS tile
+WHERE geom IS NOT NULL
+"""
+
+
+def is_valid_tile(z, x, y):
+    """ returns True if z/x/y identifies an existing tile """
+    return 0 <= z <= TILE_MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tile_bounds(z, x, y):
+    """ returns the bounds (minx, miny, maxx, maxy) of the tile in web mercator meters """
+    size = 2 * ORIGIN / 2 ** z
+    minx = -ORIGIN + x * size
+    maxy = ORIGIN - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def _lnglat(mx, my):
+    """ converts web mercator meters to longitude and latitude """
+    return mx / ORIGIN * 180.0, math.degrees(math.atan(math.sinh(my / EARTH_RADIUS)))
+
+
+def tile_bbox(z, x, y):
+    """
+    returns the polygon (EPSG:4326) of the tile including its buffer,
+    used to retrieve the geometries which are drawn on the tile
+    """
+    minx, miny, maxx, maxy = tile_bounds(z, x, y)
+    buffer = (maxx - minx) * TILE_BUFFER / TILE_EXTENT
+    west, south = _lnglat(max(minx - buffer, -ORIGIN), max(miny - buffer, -ORIGIN))
+    east, north = _lnglat(min(maxx + buffer, ORIGIN), min(maxy + buffer, ORIGIN))
+    bbox = Polygon.from_bbox((west, south, east, north))
+    bbox.srid = 4326
+    return bbox
+
+
+def _render_layer(sql, queryset, bounds, **context):
+    subquery, params = queryset.values('id').query.sql_with_params()
+    context.update({
+        'extent': TILE_EXTENT,
+        'buffer': TILE_BUFFER,
+        'subquery': subquery
+    })
+    cursor = connection.cursor()
+    cursor.execute(sql % context, list(bounds) + list(params))
+    row = cursor.fetchone()
+    # bytea is returned as a buffer
+    return str(row[0]) if row and row[0] is not None else ''
+
+
+def _link_status_cases():
+    from nodeshot.networking.links.models.choices import LINK_STATUS
+    return ' '.join(["WHEN %d THEN '%s'" % (value, key) for key, value in LINK_STATUS.items()])
+
+
+def render_tile(z, x, y, nodes, links=None):
+    """
+    returns the content of the tile (string)
+
+    :param nodes: node queryset, already filtered (ACL, layer, ecc)
+    :param links: link queryset, already filtered, None if links are not shown
+    """
+    bounds = tile_bounds(z, x, y)
+    bbox = tile_bbox(z, x, y)
+
+    content = _render_layer(NODE_TILE_SQL, nodes.filter(geometry__bboverlaps=bbox), bounds)
+
+    if links is not None and LINKS_ENABLED:
+        # the layers of a tile are independent messages, concatenating them gives a valid tile
+        content += _render_layer(LINK_TILE_SQL, links.filter(line__bboverlaps=bbox), bounds,
+                                 status_cases=_link_status_cases())
+
+    return content
+
+
+# ------ cache ------ #
+
+
+def _get_version():
+    """
+    returns current global version number;
+    versions start from the current timestamp so that an evicted version key
+    will never point to content which was cached before its eviction
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = int(time.time())
+        cache.add(VERSION_KEY, version, VERSION_TIMEOUT)
+    return version
+
+
+def _get_key(version, layer_id, z, x, y, access_level):
+    return 'vector_tile:%s:%s:%s:%s:%s:%s' % (version, layer_id, z, x, y, access_level)
+
+
+def get_tile(layer_id, z, x, y, access_level):
+    """
+    returns the cached content of the tile, None if not cached
+
+    :param layer_id: id of the layer, "all" for the tiles of every layer
+    """
+    if not TILE_CACHE_ENABLED:
+        return None
+    return cache.get(_get_key(_get_version(), layer_id, z, x, y, access_level))
+
+
+def set_tile(layer_id, z, x, y, access_level, content):
+    """ stores the rendered content of the tile """
+    if TILE_CACHE_ENABLED:
+        cache.set(_get_key(_get_version(), layer_id, z, x, y, access_level), content, TILE_CACHE_TIMEOUT)
+
+
+def _tile_range(extent, z):
+    """
+    returns the ranges of x and y of the tiles (buffer included)
+    which intersect extent (west, south, east, north) at zoom level z
+    """
+    n = 2 ** z
+    margin = float(TILE_BUFFER) / TILE_EXTENT
+
+    def tile_x(lng):
+        return (lng + 180.0) / 360.0 * n
+
+    def tile_y(lat):
+        lat = math.radians(max(min(lat, MAX_LATITUDE), -MAX_LATITUDE))
+        return (1.0 - math.log(math.tan(lat) + 1.0 / math.cos(lat)) / math.pi) / 2.0 * n
+
+    west, south, east, north = extent
+    min_x = max(int(math.floor(tile_x(west) - margin)), 0)
+    max_x = min(int(math.floor(tile_x(east) + margin)), n - 1)
+    # y grows southwards
+    min_y = max(int(math.floor(tile_y(north) - margin)), 0)
+    max_y = min(int(math.floor(tile_y(south) + margin)), n - 1)
+    return range(min_x, max_x + 1), range(min_y, max_y + 1)
+
+
+def invalidate_geometry(geometry, layer_id):
+    """
+    invalidates the cached tiles which contain geometry
+    (in the tiles of the specified layer and in the tiles of all layers)
+
+    :param geometry: geometry (EPSG:4326) of the changed node or link
+    :param layer_id: id of the layer of the node or link, might be None
+    """
+    if not TILE_CACHE_ENABLED or geometry is None:
+        return
+
+    extent = geometry.extent
+    access_levels = ACCESS_LEVELS.values() + ['superuser']
+    layer_ids = ['all'] if layer_id is None else ['all', layer_id]
+    version = _get_version()
+    keys = []
+
+    for z in range(0, TILE_MAX_ZOOM + 1):
+        xs, ys = _tile_range(extent, z)
+
+        if len(xs) * len(ys) > TILE_INVALIDATION_LIMIT:
+            invalidate_all_tiles()
+            return
+
+        for x in xs:
+            for y in ys:
+                for layer in layer_ids:
+                    keys += [_get_key(version, layer, z, x, y, level) for level in access_levels]
+
+    cache.delete_many(keys)
+
+
+def invalidate_all_tiles():
+    """ invalidates every cached tile """
+    try:
+        cache.incr(VERSION_KEY)
+    # key not present, a new version will be generated on next access
+    except ValueError:
+        pass
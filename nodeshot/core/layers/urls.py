@@ -10,6 +10,7 @@ urlpatterns = patterns('nodeshot.core.layers.views',
     url(r'^layers.geojson$', 'layers_geojson_list', name='api_layer_geojson'),
     url(r'^layers/(?P<slug>[-\w]+)/status_icons/$', 'layer_status_icon_list', name='api_layer_status_icon_list'),
     url(r'^layers.status_icons/$', 'all_layer_status_icon_list', name='api_all_layer_status_icon_list'),
+    url(r'^tiles/(?P<layer>[-\w]+)/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.mvt$', 'layer_vector_tile', name='api_layer_vector_tile'),
 )
 
 #urlpatterns = format_suffix_patterns(urlpatterns)
\ No newline at end of file
@@ -1,19 +1,29 @@
-from django.http import Http404
+from django.http import Http404, HttpResponse, HttpResponseNotModified
 from django.utils.translation import ugettext_lazy as _
+from django.utils.http import parse_etags, quote_etag
+from django.utils.cache import patch_vary_headers
 from django.conf import settings
 
 from rest_framework import generics, permissions, authentication
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
+from rest_framework.negotiation import BaseContentNegotiation
 
-from nodeshot.core.base.mixins import ListSerializerMixin
+from nodeshot.core.base.mixins import ListSerializerMixin, ConditionalGetMixin
 from nodeshot.core.base.utils import Hider
+from nodeshot.core.nodes.models import Node
 from nodeshot.core.nodes.views import NodeList
 from nodeshot.core.nodes.serializers import NodeGeoSerializer
+from nodeshot.core.nodes.simplify import SimplifiedGeometryMixin
 
 from .models import Layer
 from .serializers import *
+from .cache import (GEOJSON_CACHE_ENABLED, get_access_level,
+                    get_layer_geojson, set_layer_geojson, decompress)
+from . import tiles
 
 REVERSION_ENABLED = settings.NODESHOT['SETTINGS'].get('REVERSION_NODES', True)
+LINKS_ENABLED = 'nodeshot.networking.links' in settings.INSTALLED_APPS
 
 if REVERSION_ENABLED:
     from nodeshot.core.base.mixins import RevisionCreate, RevisionUpdate
@@ -31,7 +41,7 @@ else:
         pass
 
 
-class LayerList(LayerListBase):
+class LayerList(ConditionalGetMixin, LayerListBase):
     """
     Retrieve list of all layers.
     
@@ -75,9 +85,16 @@ class LayerNodesList(ListSerializerMixin, NodeList):
     
     Parameters:
     
-     * `search=<word>`: search <word> in name of nodes of specified layer
+     * `search=<words>`: search <words> in name, slug, description and address of nodes (ordered by relevance)
+     * `bbox=<minx,miny,maxx,maxy>`: retrieve only nodes intersecting the bounding box
+     * `within=<wkt polygon>`: retrieve only nodes contained in the polygon
+     * `near=<lng,lat>&radius=<meters>`: retrieve only nodes within radius meters from the point
      * `limit=<n>`: specify number of items per page (defaults to 40)
-     * `limit=0`: turns off pagination
+     * `limit=0`: turns off pagination (the list is streamed if layerinfo is false)
+     * `cursor`: turns on cursor pagination (see the `next` link), empty for the first page, no count is returned
+     * `fields=<field,field,...>`: output only the specified fields (eg: slug,name,geometry)
+     * `zoom=<n>`: simplify polygons and lines for the specified zoom level of the map
+     * `simplify=<tolerance>`: simplify polygons and lines with the specified tolerance (degrees)
      * `layerinfo`: true shows layer description and other info, false doesn't (defaults to true)
     """
     
@@ -89,7 +106,7 @@ class LayerNodesList(ListSerializerMixin, NodeList):
         if self.layer:
             return
         try:
-            self.layer = Layer.objects.get(slug=self.kwargs['slug'])
+            self.layer = Layer.reference_cache.get(slug=self.kwargs['slug'])
         except Layer.DoesNotExist:
             raise Http404(_('Layer not found'))
     
@@ -105,11 +122,11 @@ class LayerNodesList(ListSerializerMixin, NodeList):
     
     def get(self, request, *args, **kwargs):
         """ Retrieve list of nodes of the specified layer """
+        return self.conditional_get(self.get_response, request, *args, **kwargs)
+    
+    def get_response(self, request, *args, **kwargs):
         self.get_layer()
         
-        # get nodes of layer
-        nodes = self.get_nodes(request, *args, **kwargs)
-        
         # determine if layer info should be shown
         layer_info_default = str(self.layer_info_default).lower()  # convert boolean to string ("true" or "false")
         show_layer_info = (self.request.QUERY_PARAMS.get('layerinfo', layer_info_default) == 'true')  # is the get param true? if not is false
@@ -118,9 +135,12 @@ class LayerNodesList(ListSerializerMixin, NodeList):
         if show_layer_info:
             content = LayerNodeListSerializer(self.layer, context=self.get_serializer_context()).data
             content['nodes'] = self.get_nodes(request, *args, **kwargs)
-        # otherwise just output nodes in GeoJSON format
+        # stream nodes if pagination is turned off
+        elif self.is_streamable(request):
+            return self.get_stream(self.filter_queryset(self.get_queryset()))
+        # otherwise just output nodes
         else:
-            content = nodes
+            content = self.get_nodes(request, *args, **kwargs)
         
         return Response(content)
     
@@ -135,31 +155,90 @@ class LayerNodesGeoJSONList(LayerNodesList):
     
     Parameters:
     
-     * `search=<word>`: search <word> in name, slug, description and address of nodes
+     * `search=<words>`: search <words> in name, slug, description and address of nodes (ordered by relevance)
+     * `bbox=<minx,miny,maxx,maxy>`: retrieve only nodes intersecting the bounding box
+     * `within=<wkt polygon>`: retrieve only nodes contained in the polygon
+     * `near=<lng,lat>&radius=<meters>`: retrieve only nodes within radius meters from the point
      * `limit=<n>`: specify number of items per page (defaults to 40)
-     * `limit=0`: turns off pagination (default)
+     * `limit=0`: turns off pagination (default, the list is streamed if layerinfo is false)
+     * `cursor`: turns on cursor pagination (see the `next` link), empty for the first page, no count is returned
+     * `fields=<field,field,...>`: output only the specified fields (eg: slug,name,geometry)
+     * `zoom=<n>`: simplify polygons and lines for the specified zoom level of the map
+     * `simplify=<tolerance>`: simplify polygons and lines with the specified tolerance (degrees)
      * `layerinfo`: true shows layer description and other info, false doesn't (defaults to false)
+    
+    When no parameter is specified the response is served from a cache
+    which is invalidated each time nodes, statuses or the layer change.
     """
     
     serializer_class = NodeGeoSerializer
     paginate_by = 0
     layer_info_default = False  # don't show layer info by default
     
+    def is_cacheable(self, request):
+        """ only the default JSON representation (no filters, no layer info) is cached """
+        return (GEOJSON_CACHE_ENABLED and
+                set(request.QUERY_PARAMS.keys()) <= set(['format']) and
+                request.accepted_renderer.format == 'json')
+    
+    def get_cached(self, request, *args, **kwargs):
+        """
+        returns the cached GeoJSON of the current layer (rendering it if necessary)
+        compressed with gzip if the client supports it,
+        or 304 Not Modified if the client already has the current version
+        """
+        self.get_layer()
+        
+        access_level = get_access_level(request.user)
+        # absolute urls of the response depend on protocol and host
+        host = request.build_absolute_uri('/')
+        
+        entry = get_layer_geojson(self.layer.id, access_level, host)
+        
+        if entry is None:
+            content = JSONRenderer().render(self.get_nodes(request, *args, **kwargs))
+            entry = set_layer_geojson(self.layer.id, access_level, host, content)
+        
+        etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        
+        if entry['etag'] in etags or '*' in etags:
+            response = HttpResponseNotModified()
+        elif 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            response = HttpResponse(entry['content'], content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(decompress(entry['content']), content_type='application/json')
+        
+        response['ETag'] = quote_etag(entry['etag'])
+        patch_vary_headers(response, ('Accept', 'Accept-Encoding', 'Cookie'))
+        return response
+    
     def get(self, request, *args, **kwargs):
         """ Retrieve list of nodes of the specified layer in GeoJSON format. """
-        # overwritten just to tweak the docstring for auto documentation purposes
+        if self.is_cacheable(request):
+            return self.get_cached(request, *args, **kwargs)
+        
         return super(LayerNodesGeoJSONList, self).get(request, *args, **kwargs)
 
 nodes_geojson_list = LayerNodesGeoJSONList.as_view()
 
 
-class LayerGeoJSONList(generics.ListAPIView):
+class LayerGeoJSONList(SimplifiedGeometryMixin, generics.ListAPIView):
     """
     Retrieve list of layers in GeoJSON format.
+    
+    Parameters:
+    
+     * `zoom=<n>`: simplify areas for the specified zoom level of the map
+     * `simplify=<tolerance>`: simplify areas with the specified tolerance (degrees)
     """
     
     serializer_class = GeoLayerListSerializer
     queryset = Layer.objects.published().exclude(area__isnull=True)
+    simplify_fields = ('area',)
+    
+    def get_queryset(self):
+        return self.simplify_queryset(super(LayerGeoJSONList, self).get_queryset())
 
 layers_geojson_list = LayerGeoJSONList.as_view()
 
@@ -190,3 +269,68 @@ class AllLayerStatusIconList(generics.ListAPIView):
     queryset = Layer.objects.published()
 
 all_layer_status_icon_list = AllLayerStatusIconList.as_view()
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """ map clients send all sorts of Accept headers, errors are always rendered in JSON """
+    
+    def select_parser(self, request, parsers):
+        return parsers[0]
+    
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
+
+class LayerVectorTile(generics.GenericAPIView):
+    """
+    Retrieve a vector tile (Mapbox Vector Tile format) of the nodes and links
+    of the specified layer, use `all` instead of the layer slug to retrieve the tiles of every layer.
+    
+    The tile contains a `nodes` layer (properties: `status`, `layer`)
+    and a `links` layer (properties: `status`, `layer`, `quality`).
+    
+    Tiles are cached, the cache of a tile is invalidated when nodes or links inside it change.
+    """
+    
+    content_negotiation_class = IgnoreClientContentNegotiation
+    
+    def get(self, request, layer, z, x, y):
+        """ Retrieve vector tile """
+        z, x, y = int(z), int(x), int(y)
+        
+        if not tiles.is_valid_tile(z, x, y):
+            raise Http404(_('Tile not found'))
+        
+        nodes = Node.objects.published().accessible_to(request.user)
+        links = None
+        
+        if LINKS_ENABLED:
+            from nodeshot.networking.links.models import Link
+            links = Link.objects.accessible_to(request.user)
+        
+        if layer == 'all':
+            layer_id = layer
+        else:
+            try:
+                layer = Layer.reference_cache.get(slug=layer)
+            except Layer.DoesNotExist:
+                raise Http404(_('Layer not found'))
+            if not layer.is_published:
+                raise Http404(_('Layer not found'))
+            layer_id = layer.id
+            nodes = nodes.filter(layer_id=layer_id)
+            if links is not None:
+                links = links.filter(node_a__layer_id=layer_id)
+        
+        access_level = get_access_level(request.user)
+        content = tiles.get_tile(layer_id, z, x, y, access_level)
+        
+        if content is None:
+            content = tiles.render_tile(z, x, y, nodes, links)
+            tiles.set_tile(layer_id, z, x, y, access_level, content)
+        
+        response = HttpResponse(content, content_type=tiles.MVT_CONTENT_TYPE)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+layer_vector_tile = LayerVectorTile.as_view()
@@ -1,10 +1,10 @@
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import serializers, pagination
 from rest_framework_gis import serializers as geoserializers
-from nodeshot.core.base.serializers import DynamicRelationshipsMixin
+from nodeshot.core.base.serializers import DynamicRelationshipsMixin, SparseFieldsMixin, SimplifiedGeometrySerializerMixin
 
 
-class ExtensibleNodeSerializer(DynamicRelationshipsMixin, geoserializers.GeoModelSerializer):
+class ExtensibleNodeSerializer(SimplifiedGeometrySerializerMixin, SparseFieldsMixin, DynamicRelationshipsMixin, geoserializers.GeoModelSerializer):
     """ node detail """
     user = serializers.Field(source='user.username')
     status = serializers.Field(source='status.slug')
@@ -19,4 +19,10 @@ class ExtensibleNodeSerializer(DynamicRelationshipsMixin, geoserializers.GeoMode
     # and the second must be the lookup field, usually slug or id/pk
     _relationships = {
         'images': ('api_node_images', 'slug'),
-    }
\ No newline at end of file
+    }
+    
+    def get_field_dependencies(self, name, field):
+        """ relationships depend on the lookup fields of each relationship """
+        if name == 'relationships':
+            return [lookup_field.replace('.', '__') for view_name, lookup_field in self._relationships.values()]
+        return super(ExtensibleNodeSerializer, self).get_field_dependencies(name, field)
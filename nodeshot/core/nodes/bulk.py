@@ -0,0 +1,221 @@
+"""
+bulk creation and update of nodes
+
+The features of a GeoJSON FeatureCollection are matched to nodes by slug:
+existing nodes are updated, the others are created.
+
+Features are validated in batches: existing nodes, layers and statuses
+are retrieved with a few queries per batch instead of a few queries per node.
+Nodes are written in a single transaction with bulk_create (new nodes)
+and queryset updates (existing nodes) and a single revision is stored.
+
+Per node signals (post_save, node_status_changed) are not sent,
+a single nodes_bulk_saved signal is sent instead.
+"""
+
+from contextlib import contextmanager
+
+import simplejson as json
+
+from django.db import transaction
+from django.contrib.gis.geos import GEOSGeometry, GEOSException
+from django.core.exceptions import ValidationError, NON_FIELD_ERRORS
+from django.utils.translation import ugettext_lazy as _
+from django.conf import settings
+
+from nodeshot.core.base.acl import get_access_level
+from nodeshot.core.base.utils import now
+
+from .models import Node, Status
+from .signals import nodes_bulk_saved
+
+
+__all__ = [
+    'BULK_BATCH_SIZE',
+    'bulk_upsert',
+]
+
+
+HSTORE_ENABLED = settings.NODESHOT['SETTINGS'].get('HSTORE', True)
+REVERSION_ENABLED = settings.NODESHOT['SETTINGS'].get('REVERSION_NODES', True)
+LAYERS_ENABLED = 'nodeshot.core.layers' in settings.INSTALLED_APPS
+WEBSOCKETS_ENABLED = 'nodeshot.core.websockets' in settings.INSTALLED_APPS
+
+# number of features validated together
+BULK_BATCH_SIZE = settings.NODESHOT['SETTINGS'].get('NODE_BULK_BATCH_SIZE', 500)
+
+# properties which are copied as they are
+EDITABLE_FIELDS = ['name', 'address', 'description', 'elev', 'is_published']
+
+if HSTORE_ENABLED:
+    EDITABLE_FIELDS += ['data']
+
+if WEBSOCKETS_ENABLED:
+    from nodeshot.core.websockets.publisher import batch as event_batch
+else:
+    @contextmanager
+    def event_batch():
+        yield
+
+
+def get_layers(features):
+    """ returns a dictionary of the layers referenced by features, keyed by slug and id """
+    if not LAYERS_ENABLED:
+        return {}
+
+    from nodeshot.core.layers.models import Layer
+
+    values = set([unicode(feature['properties']['layer']) for feature in features
+                  if 'layer' in feature['properties']])
+    ids = [int(value) for value in values if value.isdigit()]
+
+    layers = {}
+    for layer in Layer.reference_cache.all():
+        if layer.slug in values or layer.pk in ids:
+            layers[layer.slug] = layers[unicode(layer.pk)] = layer
+    return layers
+
+
+def build_node(feature, existing, layers, statuses, user):
+    """
+    returns a tuple (node, changed fields), node is not saved
+
+    :raises ValidationError: if node is not valid or user can't change it
+    """
+    properties = feature['properties']
+    slug = properties.get('slug')
+
+    if not slug:
+        raise ValidationError({ 'slug': [_('This field is required.')] })
+
+    node = existing.get(slug)
+    changed = set()
+
+    if node is None:
+        node = Node(slug=slug, user=user, status=statuses.get(None))
+        node.added = now()
+    # same rules of the node detail API
+    elif (node.user_id != user.id and not user.has_perm('nodes.change_node')) or node.access_level > get_access_level(user):
+        raise ValidationError({ NON_FIELD_ERRORS: [_('You do not have permission to change this node')] })
+
+    for field in EDITABLE_FIELDS:
+        if field in properties:
+            setattr(node, field, properties[field])
+            changed.add(field)
+
+    if 'layer' in properties:
+        try:
+            node.layer = layers[unicode(properties['layer'])]
+        except KeyError:
+            raise ValidationError({ 'layer': [_('Layer not found')] })
+        changed.add('layer')
+    # layer is required but not validated by clean_fields
+    elif LAYERS_ENABLED and node.pk is None:
+        raise ValidationError({ 'layer': [_('This field is required.')] })
+
+    if 'status' in properties:
+        try:
+            node.status = statuses[properties['status']]
+        except KeyError:
+            raise ValidationError({ 'status': [_('Status not found')] })
+        changed.add('status')
+
+    if feature.get('geometry'):
+        try:
+            node.geometry = GEOSGeometry(json.dumps(feature['geometry']))
+        except (GEOSException, ValueError):
+            raise ValidationError({ 'geometry': [_('Invalid geometry')] })
+        changed.add('geometry')
+
+    node.updated = now()
+    changed.add('updated')
+
+    # foreign keys have already been resolved, validating them would cost a query each
+    node.clean_fields(exclude=['layer', 'status', 'user'])
+    node.clean()
+
+    return node, changed
+
+
+def bulk_upsert(features, user, comment=''):
+    """
+    creates or updates the nodes described by features,
+    returns a tuple of lists (created nodes, updated nodes)
+
+    :param features: list of GeoJSON features, properties must contain the slug of the node
+    :param user: user who is performing the operation, owner of the new nodes
+    :param comment: comment of the revision
+    :raises ValidationError: with a dictionary of errors keyed by the index of the invalid features,
+                             nothing is written if any feature is invalid
+    """
+    if not isinstance(features, list) or not features:
+        raise ValidationError({ 'features': [_('A non empty list of features is required')] })
+
+    for feature in features:
+        if not isinstance(feature, dict) or not isinstance(feature.get('properties'), dict):
+            raise ValidationError({ 'features': [_('Every feature must have properties')] })
+
+    layers = get_layers(features)
+    statuses = dict([(status.slug, status) for status in Status.reference_cache.all()])
+    statuses[None] = ([status for status in statuses.values() if status.is_default] or [None])[0]
+
+    errors = {}
+    new_nodes, updated_nodes = [], []
+    seen_slugs, seen_names = set(), {}
+
+    for offset in range(0, len(features), BULK_BATCH_SIZE):
+        batch = features[offset:offset + BULK_BATCH_SIZE]
+        slugs = [feature['properties'].get('slug') for feature in batch]
+        names = [feature['properties']['name'] for feature in batch if feature['properties'].get('name')]
+
+        existing = dict([(node.slug, node) for node in Node.objects.filter(slug__in=slugs).select_related('layer')])
+        # names are unique
+        seen_names.update(dict(Node.objects.filter(name__in=names).values_list('name', 'slug')))
+
+        for index, feature in enumerate(batch, offset):
+            try:
+                node, changed = build_node(feature, existing, layers, statuses, user)
+
+                if node.slug in seen_slugs:
+                    raise ValidationError({ 'slug': [_('Duplicated slug')] })
+
+                if seen_names.get(node.name, node.slug) != node.slug:
+                    raise ValidationError({ 'name': [_('Node with this name already exists.')] })
+            except ValidationError as e:
+                errors[str(index)] = getattr(e, 'message_dict', { NON_FIELD_ERRORS: e.messages })
+                continue
+
+            seen_slugs.add(node.slug)
+            seen_names[node.name] = node.slug
+
+            if node.pk:
+                updated_nodes.append((node, changed))
+            else:
+                new_nodes.append(node)
+
+    if errors:
+        raise ValidationError(errors)
+
+    # websocket events sent by the receivers of nodes_bulk_saved are published after the commit
+    with event_batch():
+        with transaction.commit_on_success():
+            Node.objects.bulk_create(new_nodes, batch_size=BULK_BATCH_SIZE)
+
+            # django 1.5 has no bulk update
+            for node, changed in updated_nodes:
+                Node.objects.filter(pk=node.pk).update(**dict([(field, getattr(node, field)) for field in changed]))
+
+            # bulk_create does not set primary keys
+            created = list(Node.objects.filter(slug__in=[node.slug for node in new_nodes]).select_related('layer'))
+            updated = [node for node, changed in updated_nodes]
+
+            nodes_bulk_saved.send(sender=Node, created=created, updated=updated, user=user)
+
+    # after the commit: deferred revisions are written by a task which must find the nodes
+    if REVERSION_ENABLED:
+        import reversion
+        from nodeshot.core.base.revisions import save_revision
+        if reversion.is_registered(Node):
+            save_revision(created + updated, user=user, comment=comment)
+
+    return created, updated
@@ -0,0 +1,81 @@
+"""
+server side clustering of nodes
+
+Nodes are grouped in the cells of a regular grid whose size depends on the zoom level,
+the grouping is performed by PostGIS (ST_SnapToGrid + GROUP BY) so the number of rows
+returned depends on the number of cells visible on the screen and not on the number of nodes.
+"""
+
+from django.db import connection
+from django.conf import settings
+
+
+__all__ = [
+    'CLUSTER_RADIUS',
+    'CLUSTER_MAX_ZOOM',
+    'grid_size',
+    'get_clusters',
+]
+
+
+# size of a cluster cell in pixels
+CLUSTER_RADIUS = settings.NODESHOT['SETTINGS'].get('CLUSTER_RADIUS', 64)
+# starting from this zoom level nodes are returned individually
+CLUSTER_MAX_ZOOM = settings.NODESHOT['SETTINGS'].get('CLUSTER_MAX_ZOOM', 16)
+# size of map tiles in pixels
+TILE_SIZE = 256
+
+
+CLUSTER_SQL = """
+SELECT
+    ST_AsText(ST_SnapToGrid(ST_Centroid(n.geometry), %%s)) AS cell,
+    s.slug,
+    COUNT(n.id),
+    AVG(ST_X(ST_Centroid(n.geometry))),
+    AVG(ST_Y(ST_Centroid(n.geometry)))
+FROM nodes_node n
+LEFT OUTER JOIN nodes_status s ON s.id = n.status_id
+WHERE n.id IN (%s)
+GROUP BY cell, s.slug
+"""
+
+
+def grid_size(zoom):
+    """ returns the size in degrees of a cluster cell at the specified zoom level """
+    return 360.0 / (2 ** zoom) / (float(TILE_SIZE) / CLUSTER_RADIUS)
+
+
+def get_clusters(queryset, zoom):
+    """
+    groups the nodes of queryset in clusters,
+    returns a list of dictionaries with the following keys:
+        * lng, lat: position of the cluster (average of its nodes)
+        * count: number of nodes in the cluster
+        * statuses: dictionary which contains the count of nodes for each status slug
+
+    :param queryset: node queryset, already filtered (ACL, bbox, layer, ecc)
+    :param zoom: zoom level of the map
+    """
+    subquery, params = queryset.values('id').query.sql_with_params()
+
+    cursor = connection.cursor()
+    cursor.execute(CLUSTER_SQL % subquery, [grid_size(zoom)] + list(params))
+
+    clusters = {}
+
+    # each row contains the nodes of a cell which have the same status
+    for cell, status, count, lng, lat in cursor.fetchall():
+        cluster = clusters.setdefault(cell, {
+            'lng': 0.0,
+            'lat': 0.0,
+            'count': 0,
+            'statuses': {}
+        })
+        # weighted average of the position
+        total = cluster['count'] + count
+        cluster['lng'] = (cluster['lng'] * cluster['count'] + lng * count) / total
+        cluster['lat'] = (cluster['lat'] * cluster['count'] + lat * count) / total
+        cluster['count'] = total
+        cluster['statuses'][status] = count
+
+    return clusters.values()
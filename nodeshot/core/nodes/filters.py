@@ -0,0 +1,198 @@
+"""
+spatial filters for node querysets
+
+All the filters defined here translate to index assisted PostGIS predicates
+(the GiST index on nodes_node.geometry is created by GeoDjango through spatial_index=True)
+"""
+
+from math import cos, radians
+
+from django.db import connection
+from django.contrib.gis.geos import GEOSGeometry, GEOSException, Point, Polygon
+from django.contrib.gis.measure import D
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework.exceptions import ParseError
+
+
+__all__ = [
+    'parse_bbox',
+    'parse_point',
+    'parse_polygon',
+    'radius_bbox',
+    'filter_by_geometry',
+    'nearest',
+]
+
+
+SRID = 4326
+# length in meters of one degree of latitude at the equator (the shortest on the spheroid)
+LATITUDE_DEGREE_LENGTH = 110574.0
+# length in meters of one degree of longitude at the equator
+LONGITUDE_DEGREE_LENGTH = 111320.0
+# bounding boxes of circles are enlarged by this factor to absorb the approximation
+BBOX_MARGIN = 1.01
+
+# index assisted ordering by distance (KNN), in degrees
+KNN_SQL = '%(table)s.%(column)s <-> ST_GeomFromText(%%s, %(srid)d)'
+# distance in meters on the spheroid
+DISTANCE_SQL = 'ST_Distance(%(table)s.%(column)s::geography, ST_GeogFromText(%%s))'
+
+
+def parse_bbox(value):
+    """
+    converts a "minx,miny,maxx,maxy" string into a Polygon
+
+    :param value: string in the format "minx,miny,maxx,maxy"
+    :raises ParseError: if the string is not a valid bounding box
+    """
+    try:
+        coords = [float(coord) for coord in value.split(',')]
+    except ValueError:
+        raise ParseError(_('bbox must be in the format "minx,miny,maxx,maxy"'))
+
+    if len(coords) != 4 or coords[0] > coords[2] or coords[1] > coords[3]:
+        raise ParseError(_('bbox must be in the format "minx,miny,maxx,maxy"'))
+
+    bbox = Polygon.from_bbox(coords)
+    bbox.srid = SRID
+    return bbox
+
+
+def parse_point(value):
+    """
+    converts a "lng,lat" string into a Point
+
+    :param value: string in the format "lng,lat"
+    :raises ParseError: if the string is not a valid point
+    """
+    try:
+        lng, lat = [float(coord) for coord in value.split(',')]
+    except ValueError:
+        raise ParseError(_('point must be in the format "lng,lat"'))
+
+    return Point(lng, lat, srid=SRID)
+
+
+def parse_polygon(value):
+    """
+    converts a WKT string into a Polygon or MultiPolygon
+
+    :param value: WKT string
+    :raises ParseError: if the string is not a valid polygon
+    """
+    try:
+        polygon = GEOSGeometry(value, srid=SRID)
+    except (GEOSException, ValueError):
+        raise ParseError(_('within must be a valid WKT polygon'))
+
+    if polygon.geom_type not in ['Polygon', 'MultiPolygon']:
+        raise ParseError(_('within must be a valid WKT polygon'))
+
+    return polygon
+
+
+def radius_bbox(point, radius):
+    """
+    returns a bounding box (in degrees) which contains the circle
+    of the specified radius (in meters) around point, never smaller than the circle
+    """
+    radius *= BBOX_MARGIN
+    lat_delta = radius / LATITUDE_DEGREE_LENGTH
+    # degrees of longitude are shortest at the poleward edge of the circle
+    cos_lat = cos(radians(min(abs(point.y) + lat_delta, 90)))
+    # close to the poles the circle might cover every longitude
+    lng_delta = radius / (LONGITUDE_DEGREE_LENGTH * cos_lat) if cos_lat > 0.01 else 360
+
+    bbox = Polygon.from_bbox((
+        point.x - lng_delta, point.y - lat_delta,
+        point.x + lng_delta, point.y + lat_delta
+    ))
+    bbox.srid = SRID
+    return bbox
+
+
+def filter_by_geometry(queryset, params, geo_field='geometry'):
+    """
+    restricts queryset according to the following querystring parameters:
+
+     * `bbox=minx,miny,maxx,maxy`: items intersecting the bounding box
+     * `within=<wkt polygon>`: items contained in the polygon
+     * `near=lng,lat&radius=<meters>`: items closer than radius to the point
+
+    :param queryset: GeoQuerySet to filter
+    :param params: querystring parameters (eg: request.QUERY_PARAMS)
+    :param geo_field: name of the geometry field to filter on
+    """
+    bbox = params.get('bbox', None)
+    within = params.get('within', None)
+    near = params.get('near', None)
+
+    if bbox is not None:
+        queryset = queryset.filter(**{ '%s__intersects' % geo_field: parse_bbox(bbox) })
+
+    if within is not None:
+        queryset = queryset.filter(**{ '%s__within' % geo_field: parse_polygon(within) })
+
+    if near is not None:
+        point = parse_point(near)
+
+        try:
+            radius = float(params['radius'])
+        except (KeyError, ValueError):
+            raise ParseError(_('near requires a numeric radius parameter (in meters)'))
+
+        if radius <= 0:
+            raise ParseError(_('radius must be greater than 0'))
+
+        # the bounding box lookup uses the spatial index (&& operator)
+        # while the distance lookup refines the result on the few rows left
+        queryset = queryset.filter(**{
+            '%s__bboverlaps' % geo_field: radius_bbox(point, radius),
+            '%s__distance_lte' % geo_field: (point, D(m=radius))
+        })
+
+    return queryset
+
+
+def _select_distance(queryset, point, geo_field, order_by):
+    """ selects the "knn" and "distance" (meters) columns and orders queryset by one of them """
+    model = queryset.model
+    qn = connection.ops.quote_name
+    context = {
+        'table': qn(model._meta.db_table),
+        'column': qn(model._meta.get_field(geo_field).column),
+        'srid': SRID
+    }
+    wkt = point.wkt
+    return queryset.extra(
+        # both expressions take the same parameter, their order does not matter
+        select={ 'knn': KNN_SQL % context, 'distance': DISTANCE_SQL % context },
+        select_params=[wkt, wkt],
+        order_by=[order_by]
+    )
+
+
+def nearest(queryset, point, k, geo_field='geometry'):
+    """
+    returns the list of the k items of queryset closest to point,
+    ordered by distance; the distance in meters is set in the "distance" attribute of each item.
+
+    The KNN operator (<->) walks the spatial index and finds the k closest items in degrees,
+    but degrees of longitude are shorter than degrees of latitude: a second index assisted
+    query retrieves the k closest items (in meters) in the bounding box of the farthest candidate.
+
+    :param queryset: GeoQuerySet to search
+    :param point: Point (EPSG:4326)
+    :param k: number of items
+    :param geo_field: name of the geometry field
+    """
+    candidates = list(_select_distance(queryset, point, geo_field, 'knn')[:k])
+
+    # every item has been retrieved
+    if len(candidates) < k:
+        return sorted(candidates, key=lambda item: item.distance)
+
+    radius = max(max([item.distance for item in candidates]), 1.0)
+    queryset = queryset.filter(**{ '%s__bboverlaps' % geo_field: radius_bbox(point, radius) })
+    return list(_select_distance(queryset, point, geo_field, 'distance')[:k])
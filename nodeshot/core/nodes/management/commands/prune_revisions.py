@@ -0,0 +1,65 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.contrib.contenttypes.models import ContentType
+from django.conf import settings
+
+from reversion.models import Revision, Version
+
+from nodeshot.core.nodes.models import Node
+
+
+REVERSION_HISTORY_LIMIT = settings.NODESHOT['SETTINGS'].get('REVERSION_HISTORY_LIMIT', 50)
+
+PRUNE_VERSIONS_SQL = """
+DELETE FROM %(version)s WHERE id IN (
+    SELECT id FROM (
+        SELECT id, row_number() OVER (PARTITION BY object_id ORDER BY id DESC) AS position
+        FROM %(version)s WHERE content_type_id = %%s
+    ) AS versions
+    WHERE position > %%s
+)
+"""
+
+PRUNE_REVISIONS_SQL = """
+DELETE FROM %(revision)s WHERE NOT EXISTS (
+    SELECT 1 FROM %(version)s WHERE %(version)s.revision_id = %(revision)s.id
+)
+"""
+
+
+class Command(BaseCommand):
+    help = 'Delete the oldest versions of each node, keeping at most --keep versions per node'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--keep',
+            action='store',
+            type='int',
+            dest='keep',
+            default=REVERSION_HISTORY_LIMIT,
+            help='Number of versions kept for each node (defaults to the REVERSION_HISTORY_LIMIT setting)'),
+    )
+
+    def handle(self, *args, **options):
+        """ delete old versions and the revisions which are left empty """
+        keep = options['keep']
+
+        if keep < 1:
+            raise CommandError('--keep must be at least 1')
+
+        tables = {
+            'version': connection.ops.quote_name(Version._meta.db_table),
+            'revision': connection.ops.quote_name(Revision._meta.db_table)
+        }
+        content_type = ContentType.objects.get_for_model(Node)
+        cursor = connection.cursor()
+
+        with transaction.commit_on_success():
+            cursor.execute(PRUNE_VERSIONS_SQL % tables, [content_type.id, keep])
+            versions = cursor.rowcount
+            # revisions might contain versions of other objects (eg: followed relations)
+            cursor.execute(PRUNE_REVISIONS_SQL % tables)
+            revisions = cursor.rowcount
+
+        self.stdout.write('deleted %d versions of nodes and %d empty revisions\n\r' % (versions, revisions))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+
+from nodeshot.core.base.utils import queryset_iterator
+from nodeshot.core.nodes.models import Node
+from nodeshot.core.nodes.simplify import simplify_geometry
+
+
+class Command(BaseCommand):
+    help = 'Compute the simplified geometries of polygon and line nodes and of layer areas'
+
+    def handle(self, *args, **options):
+        """ (re)compute simplified geometries """
+        count = 0
+
+        for node in queryset_iterator(Node.objects.exclude(geometry__isnull=True)):
+            if node.geometry.geom_type != 'Point':
+                simplify_geometry(node, 'geometry')
+                count += 1
+
+        self.stdout.write('simplified the geometry of %d nodes\n\r' % count)
+
+        if 'nodeshot.core.layers' in settings.INSTALLED_APPS:
+            from nodeshot.core.layers.models import Layer
+
+            count = 0
+
+            for layer in Layer.objects.exclude(area__isnull=True):
+                simplify_geometry(layer, 'area')
+                count += 1
+
+            self.stdout.write('simplified the area of %d layers\n\r' % count)
@@ -2,16 +2,47 @@ from .node import Node
 from .image import Image
 from .status import Status
 from .status_icon import StatusIcon
+from .simplified_geometry import SimplifiedGeometry
 
 
 __all__ = [
     'Node',
     'Image',
     'Status',
-    'StatusIcon'
+    'StatusIcon',
+    'SimplifiedGeometry'
 ]
 
 
+# ------ Reference data cache ------ #
+
+
+from nodeshot.core.base.reference import ReferenceCache
+
+Status.reference_cache = ReferenceCache(Status)
+StatusIcon.reference_cache = ReferenceCache(StatusIcon)
+
+
+# ------ Conditional GET ------ #
+
+
+from nodeshot.core.base.conditional import track_changes, model_changed
+
+# deletions are not reflected by the updated field, statuses are serialized with nodes
+track_changes(Status, StatusIcon, Node)
+
+
+# ------ Search ------ #
+
+
+from nodeshot.core.base.search import SearchBackend
+
+Node.search_backend = SearchBackend(Node,
+    fields=[('name', 'A'), ('slug', 'A'), ('address', 'B'), ('description', 'C')],
+    trigram_fields=['name', 'address']
+)
+
+
 # ------ Signals ------ #
 
 
@@ -25,4 +56,37 @@ from django.core.cache import cache
 @receiver(pre_delete, sender=Status)
 @receiver(pre_delete, sender=StatusIcon)
 def clear_cache(sender, **kwargs):
-    cache.clear()
\ No newline at end of file
+    cache.clear()
+
+# ------ Simplified geometries ------ #
+
+
+from django.db.models.signals import post_delete
+
+from ..signals import nodes_bulk_saved
+from ..simplify import simplify_geometry, delete_simplified_geometries
+
+
+@receiver(post_save, sender=Node)
+def simplify_node_geometry(sender, instance, created, **kwargs):
+    """ simplified versions of polygons and lines are recomputed each time a node is saved """
+    if created and (instance.geometry is None or instance.geometry.geom_type == 'Point'):
+        return
+    simplify_geometry(instance, 'geometry')
+
+
+@receiver(nodes_bulk_saved)
+def record_bulk_saved_nodes_change(sender, **kwargs):
+    """ bulk operations don't send post_save """
+    model_changed(Node)
+
+
+@receiver(nodes_bulk_saved)
+def simplify_bulk_saved_node_geometries(sender, created, updated, **kwargs):
+    for node in updated + [node for node in created if node.geometry.geom_type != 'Point']:
+        simplify_geometry(node, 'geometry')
+
+
+@receiver(post_delete, sender=Node)
+def delete_simplified_node_geometry(sender, instance, **kwargs):
+    delete_simplified_geometries(instance)
@@ -64,6 +64,8 @@ class Node(BaseAccessLevel):
         db_table = 'nodes_node'
         app_label= 'nodes'
         permissions = (('can_view_nodes', 'Can view nodes'),)
+        # used by cursor pagination
+        index_together = (('updated', 'id'),)
     
     def __unicode__(self):
         return '%s' % self.name
@@ -93,7 +95,7 @@ class Node(BaseAccessLevel):
         # if no status specified
         if not self.status and not self.status_id:
             try:
-                self.status = Status.objects.filter(is_default=True)[0]
+                self.status = Status.reference_cache.filter(is_default=True)[0]
             except IndexError:
                 pass
         
@@ -104,7 +106,7 @@ class Node(BaseAccessLevel):
             self.status_id and self._current_status and self.status_id != self._current_status
         ):
             # send django signal
-            node_status_changed.send(sender=self.__class__, instance=self, old_status=Status.objects.get(pk=self._current_status), new_status=self.status)
+            node_status_changed.send(sender=self.__class__, instance=self, old_status=Status.reference_cache.get(pk=self._current_status), new_status=self.status)
         # update _current_status
         self._current_status = self.status_id
     
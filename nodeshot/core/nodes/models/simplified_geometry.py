@@ -0,0 +1,27 @@
+from django.contrib.gis.db import models
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.contenttypes import generic
+from django.utils.translation import ugettext_lazy as _
+
+
+class SimplifiedGeometry(models.Model):
+    """
+    Simplified version of a geometry field (eg: Node.geometry, Layer.area)
+    precomputed for a zoom band, see nodeshot.core.nodes.simplify
+    """
+    content_type = models.ForeignKey(ContentType)
+    object_id = models.PositiveIntegerField()
+    content_object = generic.GenericForeignKey('content_type', 'object_id')
+    field = models.CharField(_('field'), max_length=50)
+    band = models.SmallIntegerField(_('maximum zoom level of the band'))
+    geometry = models.GeometryField(_('simplified geometry'))
+    
+    objects = models.GeoManager()
+    
+    class Meta:
+        db_table = 'nodes_simplified_geometry'
+        app_label = 'nodes'
+        unique_together = (('content_type', 'object_id', 'field', 'band'),)
+    
+    def __unicode__(self):
+        return '%s %s (zoom <= %s)' % (self.content_type, self.object_id, self.band)
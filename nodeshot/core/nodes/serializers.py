@@ -2,9 +2,10 @@ from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
 
 from rest_framework import serializers, pagination
-from rest_framework.reverse import reverse
 from rest_framework_gis import serializers as geoserializers
 
+from nodeshot.core.base.reverse import reverse
+from nodeshot.core.base.serializers import HyperlinkedIdentityField
 from .base import ExtensibleNodeSerializer
 from .models import *
 
@@ -20,6 +21,7 @@ __all__ = [
     'NodeCreatorSerializer',
     'NodeDetailSerializer',
     'NodeGeoSerializer',
+    'NodeNearestSerializer',
     'PaginatedNodeListSerializer',
     'ImageListSerializer',
     'ImageAddSerializer',
@@ -60,7 +62,7 @@ class NodeDetailSerializer(ExtensibleNodeSerializer):
 class NodeListSerializer(NodeDetailSerializer):
     """ node list """
     
-    details = serializers.HyperlinkedIdentityField(view_name='api_node_details', slug_field='slug')
+    details = HyperlinkedIdentityField(view_name='api_node_details', slug_field='slug')
     
     class Meta:
         model = Node
@@ -91,6 +93,17 @@ class NodeGeoSerializer(geoserializers.GeoFeatureModelSerializer, NodeListSerial
     pass
 
 
+class NodeNearestSerializer(NodeListSerializer):
+    """ node list with distance (meters) from the requested point """
+    distance = serializers.Field(source='distance')
+    
+    class Meta:
+        model = Node
+        fields = NodeListSerializer.Meta.fields + ['distance']
+        read_only_fields = NodeListSerializer.Meta.read_only_fields
+        geo_field = 'geometry'
+
+
 class ImageListSerializer(serializers.ModelSerializer):
     """ Serializer used to show list """
     
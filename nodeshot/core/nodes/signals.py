@@ -1,3 +1,5 @@
 import django.dispatch
 
-node_status_changed = django.dispatch.Signal(providing_args=["instance", "old_status", "new_status"])
\ No newline at end of file
+node_status_changed = django.dispatch.Signal(providing_args=["instance", "old_status", "new_status"])
+# sent by bulk operations instead of post_save
+nodes_bulk_saved = django.dispatch.Signal(providing_args=["created", "updated", "user"])
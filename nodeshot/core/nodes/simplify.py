@@ -0,0 +1,184 @@
+"""
+zoom dependent simplification of geometries
+
+Big polygons and lines (eg: the borders imported by the ProvinciaBorders synchronizer)
+are simplified with a topology preserving algorithm for a few zoom bands,
+the tolerance of each band is the size of a pixel at the highest zoom level of the band.
+Simplified geometries are stored in the SimplifiedGeometry model each time the original changes.
+
+Lists accept a `zoom=<n>` or `simplify=<tolerance>` parameter: the GeoJSON of the simplified geometries
+(or of the original one if no simplified version is stored, eg: points) is built by PostGIS
+with a number of decimal digits which matches the zoom level, the original geometries are not loaded.
+"""
+
+import math
+
+from django.db import connection
+from django.contrib.contenttypes.models import ContentType
+from django.utils.translation import ugettext_lazy as _
+from django.conf import settings
+
+from rest_framework.exceptions import ParseError
+
+from .models import SimplifiedGeometry
+
+
+__all__ = [
+    'SIMPLIFICATION_BANDS',
+    'tolerance',
+    'precision',
+    'get_band',
+    'get_band_for_tolerance',
+    'simplify_geometry',
+    'delete_simplified_geometries',
+    'simplified_queryset',
+    'SimplifiedGeometryMixin',
+]
+
+
+# highest zoom level of each band, originals are returned above the last one
+SIMPLIFICATION_BANDS = sorted(settings.NODESHOT['SETTINGS'].get('SIMPLIFICATION_ZOOM_BANDS', (5, 8, 11, 14)))
+# size of map tiles in pixels
+TILE_SIZE = 256
+
+SIMPLIFIED_SQL = """
+COALESCE(
+    (SELECT ST_AsGeoJSON(s.geometry, %%s) FROM nodes_simplified_geometry s
+     WHERE s.content_type_id = %%s AND s.object_id = %(table)s.%(pk)s AND s.field = %%s AND s.band = %%s),
+    ST_AsGeoJSON(%(table)s.%(column)s, %%s)
+)
+"""
+
+
+def tolerance(band):
+    """ returns the tolerance (degrees) of the specified band, the size of a pixel at that zoom level """
+    return 360.0 / (TILE_SIZE * 2 ** band)
+
+
+def precision(band):
+    """ returns the number of decimal digits needed to draw the geometries of the band """
+    return max(int(math.ceil(-math.log10(tolerance(band)))), 0)
+
+
+def get_band(zoom):
+    """ returns the band which contains the specified zoom level, None if originals must be used """
+    for band in SIMPLIFICATION_BANDS:
+        if zoom <= band:
+            return band
+    return None
+
+
+def get_band_for_tolerance(value):
+    """ returns the most simplified band whose tolerance does not exceed value, None if there's none """
+    for band in SIMPLIFICATION_BANDS:
+        if tolerance(band) <= value:
+            return band
+    return None
+
+
+def simplify_geometry(instance, field_name):
+    """
+    (re)computes the simplified versions of a geometry field of instance,
+    points and geometries which can't be simplified further are not stored
+    """
+    content_type = ContentType.objects.get_for_model(instance)
+    geometry = getattr(instance, field_name)
+
+    delete_simplified_geometries(instance, field_name)
+
+    if geometry is None or geometry.geom_type == 'Point':
+        return
+
+    simplified_geometries = []
+
+    for band in SIMPLIFICATION_BANDS:
+        simplified = geometry.simplify(tolerance(band), preserve_topology=True)
+        if simplified.empty or simplified.num_coords >= geometry.num_coords:
+            continue
+        simplified_geometries.append(SimplifiedGeometry(
+            content_type=content_type,
+            object_id=instance.pk,
+            field=field_name,
+            band=band,
+            geometry=simplified
+        ))
+
+    SimplifiedGeometry.objects.bulk_create(simplified_geometries)
+
+
+def delete_simplified_geometries(instance, field_name=None):
+    """ deletes the simplified geometries of instance (of every field if field_name is None) """
+    queryset = SimplifiedGeometry.objects.filter(
+        content_type=ContentType.objects.get_for_model(instance),
+        object_id=instance.pk
+    )
+    if field_name is not None:
+        queryset = queryset.filter(field=field_name)
+    queryset.delete()
+
+
+def simplified_queryset(queryset, field_name, band):
+    """
+    selects the GeoJSON of the simplified version of field_name
+    in the "simplified_<field_name>" attribute and defers the original geometry
+    """
+    model = queryset.model
+    qn = connection.ops.quote_name
+    sql = SIMPLIFIED_SQL % {
+        'table': qn(model._meta.db_table),
+        'pk': qn(model._meta.pk.column),
+        'column': qn(model._meta.get_field(field_name).column)
+    }
+    digits = precision(band)
+    content_type = ContentType.objects.get_for_model(model)
+
+    return queryset.extra(
+        select={ 'simplified_%s' % field_name: sql },
+        select_params=[digits, content_type.id, field_name, band, digits]
+    ).defer(field_name)
+
+
+class SimplifiedGeometryMixin(object):
+    """
+    Django Rest Framework View Mixin
+    which outputs the geometries listed in simplify_fields simplified for the zoom level
+    specified in the `zoom` or `simplify` (tolerance in degrees) query parameters.
+    The serializer must include nodeshot.core.base.serializers.SimplifiedGeometrySerializerMixin.
+    """
+    simplify_fields = ('geometry',)
+
+    def get_simplification_band(self):
+        """ returns the band requested by the client, None if geometries must not be simplified """
+        if self.request.method != 'GET':
+            return None
+
+        params = self.request.QUERY_PARAMS
+
+        if 'zoom' in params:
+            try:
+                return get_band(int(params['zoom']))
+            except ValueError:
+                raise ParseError(_('zoom must be an integer'))
+
+        if 'simplify' in params:
+            try:
+                return get_band_for_tolerance(float(params['simplify']))
+            except ValueError:
+                raise ParseError(_('simplify must be a number'))
+
+        return None
+
+    def get_serializer_context(self):
+        context = super(SimplifiedGeometryMixin, self).get_serializer_context()
+        if self.get_simplification_band() is not None:
+            context['simplified_fields'] = self.simplify_fields
+        return context
+
+    def simplify_queryset(self, queryset):
+        """ applies the requested simplification to queryset """
+        band = self.get_simplification_band()
+        if band is None:
+            return queryset
+        for field_name in self.simplify_fields:
+            queryset = simplified_queryset(queryset, field_name, band)
+        return queryset
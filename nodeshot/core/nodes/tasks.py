@@ -0,0 +1,11 @@
+from celery import task
+
+from django.core import management
+
+
+@task()
+def prune_revisions():
+    """
+    deletes the oldest versions of nodes
+    """
+    management.call_command('prune_revisions')
@@ -8,8 +8,10 @@ import simplejson as json
 from django.test import TestCase
 from django.test.client import Client
 from django.core.urlresolvers import reverse
+from django.core.signals import request_finished
 from django.core.exceptions import ValidationError
 from django.utils.translation import ugettext_lazy as _
+from django.utils.http import http_date
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.gis.geos import GEOSGeometry
 from django.contrib.gis.measure import D
@@ -19,6 +21,7 @@ User = get_user_model()
 
 from nodeshot.core.layers.models import Layer
 from nodeshot.core.base.tests import user_fixtures, BaseTestCase
+from nodeshot.core.base.conditional import get_last_change
 
 from .models import *
 
@@ -168,6 +171,76 @@ class ModelsTest(TestCase):
             Node.objects.filter(is_published=True, access_level__lte=0).order_by('-id')[0]
         )
     
+    def test_queryset_iterator(self):
+        """ chunked iteration returns every item exactly once, ordered by pk """
+        from nodeshot.core.base.utils import queryset_iterator
+        
+        pks = [node.pk for node in queryset_iterator(Node.objects.all(), chunk_size=3)]
+        self.assertEqual(pks, list(Node.objects.order_by('pk').values_list('pk', flat=True)))
+        
+        pks = [node.pk for node in queryset_iterator(Node.objects.order_by('-id'), chunk_size=3)]
+        self.assertEqual(pks, list(Node.objects.order_by('-pk').values_list('pk', flat=True)))
+    
+    def test_access_level_resolver(self):
+        """ access level is resolved once per request and invalidated when groups change """
+        from django.contrib.auth.models import Group
+        from nodeshot.core.base.acl import get_access_level
+
+        user = User.objects.get(username='registered')
+        self.assertEqual(1, get_access_level(user))
+        self.assertEqual(9, Node.objects.accessible_to(user).count())
+        # level is stored on the instance, no more queries
+        with self.assertNumQueries(0):
+            get_access_level(user)
+
+        # adding a group invalidates the level
+        user.groups.add(Group.objects.get(name='community'))
+        self.assertEqual(2, get_access_level(user))
+        self.assertEqual(10, Node.objects.accessible_to(User.objects.get(username='registered')).count())
+
+        # removing users from the group side too
+        Group.objects.get(name='community').user_set.remove(user)
+        self.assertEqual(1, get_access_level(User.objects.get(username='registered')))
+
+    def test_reference_cache(self):
+        """ statuses are loaded once per process and reloaded when they change """
+        Status.reference_cache.invalidate()
+        with self.assertNumQueries(1):
+            Status.reference_cache.all()
+            Status.reference_cache.get(slug='attivo')
+        with self.assertNumQueries(0):
+            status = Status.reference_cache.get(pk=1)
+            self.assertEqual(status.pk, 1)
+            self.assertTrue(len(Status.reference_cache.filter(is_default=True)) <= 1)
+        with self.assertRaises(Status.DoesNotExist):
+            Status.reference_cache.get(slug='idontexist')
+        
+        # returned objects are copies
+        status.name = 'changed'
+        self.assertNotEqual(Status.reference_cache.get(pk=1).name, 'changed')
+        
+        # saving invalidates the cache
+        version = Status.reference_cache.get_version()
+        status.save()
+        self.assertEqual(Status.reference_cache.get(pk=1).name, 'changed')
+        # other processes are notified after the commit (tests run in a managed transaction)
+        self.assertEqual(Status.reference_cache.get_version(), version)
+        request_finished.send(sender=None)
+        self.assertNotEqual(Status.reference_cache.get_version(), version)
+    
+    def test_previous_values(self):
+        """ the previous values of a node are loaded once per save """
+        from nodeshot.core.base.previous import get_previous_values
+        self.assertIsNone(get_previous_values(Node()))
+        node = Node.objects.get(slug='fusolab')
+        layer_id = node.layer_id
+        node.layer = Layer.objects.exclude(pk=layer_id)[0]
+        with self.assertNumQueries(1):
+            self.assertEqual(get_previous_values(node)['layer'], layer_id)
+            self.assertEqual(get_previous_values(node)['layer'], layer_id)
+        node.save()
+        self.assertEqual(get_previous_values(node)['layer'], node.layer_id)
+    
     def test_node_point(self):
         node = Node.objects.first()
         self.assertEqual(node.point, node.geometry)
@@ -280,7 +353,9 @@ class APITest(BaseTestCase):
         
         # GET: 200
         response = self.client.get(url, { "limit": 0 })
-        nodes = json.loads(response.content)
+        # unpaginated lists are streamed
+        self.assertTrue(response.streaming)
+        nodes = json.loads(''.join(response.streaming_content))
         public_node_count = Node.objects.published().access_level_up_to('public').count()
         self.assertEqual(public_node_count, len(nodes))
         
@@ -321,7 +396,369 @@ class APITest(BaseTestCase):
         # GET: 200
         response = self.client.get(url)
         self.assertEqual(200, response.status_code)
-    
+
+    def test_node_list_spatial_filters(self):
+        """ test bbox, within and near filters """
+        url = reverse('api_node_gejson_list')
+
+        # bbox around rome: 4 public nodes
+        response = self.client.get(url, { 'bbox': '12.4,41.6,12.7,42.0', 'limit': 0 })
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(4, len(json.loads(''.join(response.streaming_content))['features']))
+
+        # same area expressed as a WKT polygon
+        response = self.client.get(url, {
+            'within': 'POLYGON ((12.4 41.6, 12.4 42.0, 12.7 42.0, 12.7 41.6, 12.4 41.6))',
+            'limit': 0
+        })
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(4, len(json.loads(''.join(response.streaming_content))['features']))
+
+        # 1 km around fusolab: only fusolab itself
+        response = self.client.get(url, { 'near': '12.5822391919,41.8720419277', 'radius': 1000, 'limit': 0 })
+        self.assertEqual(200, response.status_code)
+        features = json.loads(''.join(response.streaming_content))['features']
+        self.assertEqual(1, len(features))
+        self.assertEqual('fusolab', features[0]['properties']['slug'])
+
+        # layer views honour the same filters
+        layer_url = reverse('api_layer_nodes_geojson', args=['rome'])
+        response = self.client.get(layer_url, { 'near': '12.5822391919,41.8720419277', 'radius': 1000 })
+        self.assertEqual(1, len(json.loads(''.join(response.streaming_content))['features']))
+
+        # malformed parameters: 400
+        response = self.client.get(url, { 'bbox': '12.4,41.6,12.7' })
+        self.assertEqual(400, response.status_code)
+        response = self.client.get(url, { 'within': 'POINT (12.4 41.6)' })
+        self.assertEqual(400, response.status_code)
+        response = self.client.get(url, { 'near': '12.58,41.87' })
+        self.assertEqual(400, response.status_code)
+
+    def test_node_nearest_list(self):
+        """ test nearest nodes """
+        url = reverse('api_node_nearest_list')
+
+        response = self.client.get(url, { 'lng': 12.5822391919, 'lat': 41.8720419277, 'k': 3 })
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(3, len(response.data))
+        self.assertEqual('fusolab', response.data[0]['slug'])
+        self.assertTrue(response.data[0]['distance'] < 1)
+        # ordered by distance
+        distances = [node['distance'] for node in response.data]
+        self.assertEqual(distances, sorted(distances))
+
+        # same nodes of a full scan ordered by distance
+        point = GEOSGeometry('POINT (12.58 41.87)', srid=4326)
+        nodes = Node.objects.published().accessible_to(AnonymousUser()).distance(point).order_by('distance')
+        response = self.client.get(url, { 'lng': 12.58, 'lat': 41.87, 'k': 5 })
+        self.assertEqual([node.slug for node in nodes[:5]], [node['slug'] for node in response.data])
+
+        # the bounding box of the refinement query contains the whole circle
+        from .filters import radius_bbox
+        self.assertTrue(radius_bbox(GEOSGeometry('POINT (0 0)'), 10000).contains(GEOSGeometry('POINT (0 %f)' % (10000 / 110574.0))))
+
+        # k larger than the number of nodes returns all the accessible nodes
+        response = self.client.get(url, { 'lng': 12.58, 'lat': 41.87, 'k': 100 })
+        self.assertEqual(Node.objects.published().accessible_to(AnonymousUser()).count(), len(response.data))
+
+        # scoped to a layer
+        response = self.client.get(url, { 'lng': 12.58, 'lat': 41.87, 'layer': 'pisa' })
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(len(response.data) > 0)
+        for node in response.data:
+            self.assertEqual(Node.objects.get(slug=node['slug']).layer.slug, 'pisa')
+
+        # malformed parameters: 400
+        response = self.client.get(url, { 'lng': 12.58 })
+        self.assertEqual(400, response.status_code)
+        response = self.client.get(url, { 'lng': 12.58, 'lat': 41.87, 'k': 0 })
+        self.assertEqual(400, response.status_code)
+        response = self.client.get(url, { 'lng': 190, 'lat': 41.87 })
+        self.assertEqual(400, response.status_code)
+
+    def test_node_list_search(self):
+        """ test full text search """
+        url = reverse('api_node_list')
+
+        # all words must match, the last one as a prefix
+        response = self.client.get(url, { 'search': 'potenziale' })
+        self.assertEqual(3, len(response.data['results']))
+        response = self.client.get(url, { 'search': 'potenziale rom' })
+        self.assertEqual(1, len(response.data['results']))
+        self.assertEqual('potenziale-romano', response.data['results'][0]['slug'])
+
+        # substrings of the name are matched too
+        response = self.client.get(url, { 'search': 'lab' })
+        self.assertEqual(2, len(response.data['results']))
+
+        # matches in the name rank higher than matches in the description
+        response = self.client.get(url, { 'search': 'pomezia' })
+        self.assertEqual('pomezia', response.data['results'][0]['slug'])
+
+        # layer views use the same search
+        layer_url = reverse('api_layer_nodes_list', args=['rome'])
+        response = self.client.get(layer_url, { 'search': 'potenziale', 'layerinfo': 'true' })
+        self.assertEqual(1, len(response.data['nodes']['results']))
+
+    def test_node_list_cursor_pagination(self):
+        """ test keyset pagination """
+        url = reverse('api_node_list')
+        expected = list(Node.objects.published().access_level_up_to('public')
+                                    .order_by('updated', 'id').values_list('slug', flat=True))
+
+        slugs = []
+        response = self.client.get(url, { 'cursor': '', 'limit': 3 })
+        self.assertNotIn('count', response.data)
+        while True:
+            self.assertEqual(200, response.status_code)
+            slugs += [node['slug'] for node in response.data['results']]
+            if response.data['next'] is None:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(expected, slugs)
+
+        # offset pagination is still the default
+        response = self.client.get(url, { 'limit': 3 })
+        self.assertEqual(len(expected), response.data['count'])
+
+        # malformed cursor: 400
+        response = self.client.get(url, { 'cursor': 'wrong' })
+        self.assertEqual(400, response.status_code)
+
+    def test_node_list_sparse_fields(self):
+        """ test fields parameter """
+        url = reverse('api_node_list')
+        response = self.client.get(url, { 'fields': 'slug,name,layer_name,relationships' })
+        self.assertEqual(200, response.status_code)
+        node = response.data['results'][0]
+        self.assertEqual(set(['slug', 'name', 'layer_name', 'relationships']), set(node.keys()))
+        self.assertIn('images', node['relationships'])
+
+        # streamed lists
+        response = self.client.get(url, { 'fields': 'slug,unknown', 'limit': 0 })
+        nodes = json.loads(''.join(response.streaming_content))
+        self.assertEqual(['slug'], nodes[0].keys())
+
+        # geojson always includes geometry
+        url = reverse('api_node_gejson_list')
+        response = self.client.get(url, { 'fields': 'slug', 'limit': 0 })
+        feature = json.loads(''.join(response.streaming_content))['features'][0]
+        self.assertIn('coordinates', feature['geometry'])
+        self.assertEqual(['slug'], feature['properties'].keys())
+
+    def test_conditional_get(self):
+        """ ETag and Last-Modified validators """
+        url = reverse('api_node_list')
+        response = self.client.get(url)
+        self.assertEqual(200, response.status_code)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        self.assertEqual('', response.content)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(304, response.status_code)
+
+        # changes of models which are not serialized with nodes (eg: logins) are ignored
+        self.client.login(username='admin', password='tester')
+        self.client.logout()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+
+        # usernames are serialized with nodes
+        user = User.objects.get(username='romano')
+        user.username = 'romano2'
+        user.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        etag = response['ETag']
+
+        # parameters change the content
+        response = self.client.get(url, { 'limit': 2 }, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+
+        # changing a node changes the validators of the list and of its details
+        details_url = reverse('api_node_details', args=['fusolab'])
+        details_etag = self.client.get(details_url)['ETag']
+        self.assertEqual(304, self.client.get(details_url, HTTP_IF_NONE_MATCH=details_etag).status_code)
+        node = Node.objects.get(slug='fusolab')
+        node.name = 'changed name'
+        node.save()
+        self.assertEqual(200, self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code)
+        self.assertEqual(200, self.client.get(details_url, HTTP_IF_NONE_MATCH=details_etag).status_code)
+
+        # deletions change Last-Modified too (the latest updated value doesn't change)
+        Node.objects.get(slug='eigenlab').delete()
+        response = self.client.get(url)
+        self.assertEqual(response['Last-Modified'], http_date(get_last_change(Node)))
+
+        # statuses are serialized with nodes and do not have an updated field
+        url = reverse('api_status_list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(304, self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code)
+        status = Status.objects.get(pk=1)
+        status.description = 'changed'
+        status.save()
+        self.assertEqual(200, self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code)
+
+        # unknown node
+        response = self.client.get(reverse('api_node_details', args=['idontexist']), HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(404, response.status_code)
+
+    def test_cached_reverse(self):
+        """ url templates produce the same urls of django reverse """
+        from django.core.urlresolvers import NoReverseMatch
+        from nodeshot.core.base.reverse import reverse as cached_reverse
+
+        self.assertEqual(reverse('api_node_details', args=['fusolab']),
+                         cached_reverse('api_node_details', args=['fusolab']))
+        kwargs = { 'slug': 'fusolab', 'pk': 1 }
+        self.assertEqual(reverse('api_node_image_detail', kwargs=kwargs),
+                         cached_reverse('api_node_image_detail', kwargs=kwargs))
+        self.assertEqual(reverse('api_node_list'), cached_reverse('api_node_list'))
+
+        with self.assertRaises(NoReverseMatch):
+            cached_reverse('api_node_details', kwargs={ 'wrong': 'fusolab' })
+        with self.assertRaises(NoReverseMatch):
+            cached_reverse('api_not_existing')
+
+    def test_node_bulk_upsert(self):
+        """ test bulk creation and update of nodes """
+        url = reverse('api_node_bulk_upsert')
+        collection = {
+            'type': 'FeatureCollection',
+            'features': [
+                {
+                    'type': 'Feature',
+                    'geometry': { 'type': 'Point', 'coordinates': [12.51, 41.89] },
+                    'properties': { 'slug': 'bulk-1', 'name': 'bulk 1', 'layer': 'rome' }
+                },
+                {
+                    'type': 'Feature',
+                    'geometry': { 'type': 'Point', 'coordinates': [12.52, 41.88] },
+                    'properties': { 'slug': 'bulk-2', 'name': 'bulk 2', 'layer': 'rome', 'address': 'via dei test' }
+                },
+                {
+                    'type': 'Feature',
+                    'geometry': None,
+                    'properties': { 'slug': 'fusolab', 'description': 'changed in bulk' }
+                }
+            ]
+        }
+
+        # POST: 403 - unauthenticated
+        response = self.client.post(url, json.dumps(collection), content_type='application/json')
+        self.assertEqual(403, response.status_code)
+
+        # fusolab belongs to romano
+        self.client.login(username='romano', password='tester')
+        count = Node.objects.count()
+        response = self.client.post(url, json.dumps(collection), content_type='application/json')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(['bulk-1', 'bulk-2'], sorted(response.data['created']))
+        self.assertEqual(['fusolab'], response.data['updated'])
+        self.assertEqual(count + 2, Node.objects.count())
+        self.assertEqual('changed in bulk', Node.objects.get(slug='fusolab').description)
+        node = Node.objects.get(slug='bulk-2')
+        self.assertEqual('romano', node.user.username)
+        self.assertEqual('via dei test', node.address)
+        self.assertIsNotNone(node.status_id)
+
+        # same collection again: everything is updated
+        response = self.client.post(url, json.dumps(collection), content_type='application/json')
+        self.assertEqual(3, len(response.data['updated']))
+
+        # invalid features: nothing is saved
+        collection['features'][0]['properties']['layer'] = 'wrong'
+        collection['features'][1]['properties']['name'] = 'EigenLab'
+        collection['features'][2]['properties']['description'] = 'not saved'
+        response = self.client.post(url, json.dumps(collection), content_type='application/json')
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(['0', '1'], sorted(response.data['errors'].keys()))
+        self.assertEqual('changed in bulk', Node.objects.get(slug='fusolab').description)
+
+        # new nodes require a layer
+        collection['features'] = [{
+            'type': 'Feature',
+            'geometry': { 'type': 'Point', 'coordinates': [12.51, 41.89] },
+            'properties': { 'slug': 'bulk-3', 'name': 'bulk 3' }
+        }]
+        response = self.client.post(url, json.dumps(collection), content_type='application/json')
+        self.assertEqual(400, response.status_code)
+        self.assertIn('layer', response.data['errors']['0'])
+        self.assertFalse(Node.objects.filter(slug='bulk-3').exists())
+
+        # nodes of other users can't be changed
+        collection['features'] = [{ 'type': 'Feature', 'geometry': None, 'properties': { 'slug': 'eigenlab', 'name': 'x' } }]
+        response = self.client.post(url, json.dumps(collection), content_type='application/json')
+        self.assertEqual(400, response.status_code)
+
+        # not a FeatureCollection
+        response = self.client.post(url, json.dumps([]), content_type='application/json')
+        self.assertEqual(400, response.status_code)
+
+    def test_node_list_simplified_geometries(self):
+        """ test zoom and simplify parameters """
+        node = Node.objects.get(slug='fusolab')
+        # polygon with a lot of vertices
+        node.geometry = GEOSGeometry('POINT (12.58 41.87)').buffer(0.2, quadsegs=32)
+        node.save()
+        original_coords = len(node.geometry.coords[0])
+        self.assertTrue(SimplifiedGeometry.objects.filter(object_id=node.id, field='geometry').exists())
+
+        url = reverse('api_node_gejson_list')
+        response = self.client.get(url, { 'zoom': 5, 'search': 'fusolab' })
+        self.assertEqual(200, response.status_code)
+        coordinates = response.data['results'][0]['geometry']['coordinates'][0]
+        self.assertLess(len(coordinates), original_coords)
+        # precision matches the zoom level
+        for lng, lat in coordinates:
+            self.assertEqual(round(lng, 2), lng)
+
+        # tolerance smaller than the one of any band returns the original
+        response = self.client.get(url, { 'simplify': 0.0000001, 'search': 'fusolab' })
+        self.assertEqual(len(response.data['results'][0]['geometry']['coordinates'][0]), original_coords)
+
+        response = self.client.get(url, { 'zoom': 'a' })
+        self.assertEqual(400, response.status_code)
+
+        # simplified geometries are deleted with the node
+        node_id = node.id
+        node.delete()
+        self.assertFalse(SimplifiedGeometry.objects.filter(object_id=node_id, field='geometry').exists())
+
+    def test_node_cluster_list(self):
+        """ test server side clustering """
+        url = reverse('api_node_cluster_list')
+
+        # zoom is required
+        response = self.client.get(url)
+        self.assertEqual(400, response.status_code)
+
+        # low zoom: a single cluster containing all the public nodes of rome
+        response = self.client.get(url, { 'zoom': 3, 'bbox': '12.4,41.6,12.7,42.0' })
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, len(response.data['features']))
+        cluster = response.data['features'][0]['properties']
+        self.assertTrue(cluster['cluster'])
+        self.assertEqual(4, cluster['count'])
+        self.assertEqual(4, sum(cluster['statuses'].values()))
+
+        # all the public nodes are counted exactly once
+        response = self.client.get(url, { 'zoom': 6 })
+        count = sum([feature['properties']['count'] for feature in response.data['features']])
+        self.assertEqual(Node.objects.published().access_level_up_to('public').count(), count)
+
+        # high zoom: single nodes
+        response = self.client.get(url, { 'zoom': 18, 'bbox': '12.4,41.6,12.7,42.0' })
+        self.assertEqual(4, len(response.data['features']))
+        self.assertFalse(response.data['features'][0]['properties']['cluster'])
+
+        # layer filter
+        response = self.client.get(url, { 'zoom': 18, 'layer': 'pisa' })
+        self.assertEqual(2, len(response.data['features']))
+
     def test_node_details(self):
         """ test node details """
         url = reverse('api_node_details', args=['fusolab'])
@@ -396,6 +833,58 @@ class APITest(BaseTestCase):
         with self.assertRaises(Node.DoesNotExist):
             Node.objects.get(slug='fusolab')
     
+    def test_deferred_revisions(self):
+        """ test revisions written in background and pruning of old versions """
+        import reversion
+        from django.core import management
+        from django.core.cache import cache
+        from nodeshot.core.base.revisions import DeferredRevision, get_object_key, _is_ready, WRITTEN_KEY
+
+        if not reversion.is_registered(Node):
+            reversion.register(Node)
+
+        node = Node.objects.get(slug='fusolab')
+        count = reversion.get_for_object(node).count()
+
+        # celery is eager in tests, the revision is written when the block exits
+        with DeferredRevision(comment='deferred test'):
+            node.name = 'Fusolab deferred'
+            node.save()
+            node.description = 'deferred description'
+            node.save()
+
+        versions = reversion.get_for_object(node)
+        # one version with the last state of the node
+        self.assertEqual(versions.count(), count + 1)
+        self.assertEqual(versions[0].field_dict['name'], 'Fusolab deferred')
+        self.assertEqual(versions[0].field_dict['description'], 'deferred description')
+        self.assertEqual(versions[0].revision.comment, 'deferred test')
+
+        # revisions wait for the previous versions of their objects
+        key = get_object_key(node)
+        written = cache.get(WRITTEN_KEY % key)
+        self.assertTrue(_is_ready([{ 'objects': [(key, written + 1, '')] }]))
+        self.assertFalse(_is_ready([{ 'objects': [(key, written + 2, '')] }]))
+
+        # exceptions discard the revision
+        try:
+            with DeferredRevision():
+                node.save()
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEqual(reversion.get_for_object(node).count(), count + 1)
+
+        for i in range(0, 3):
+            with DeferredRevision():
+                node.name = 'Fusolab %d' % i
+                node.save()
+
+        management.call_command('prune_revisions', keep=2)
+        versions = reversion.get_for_object(node)
+        self.assertEqual(versions.count(), 2)
+        self.assertEqual(versions[0].field_dict['name'], 'Fusolab 2')
+    
     def test_node_images(self):
         """ test node images """
         url = reverse('api_node_images', args=['fusolab'])
@@ -4,6 +4,9 @@ from django.conf.urls import patterns, url
 urlpatterns = patterns('nodeshot.core.nodes.views',
     url(r'^nodes/$', 'node_list', name='api_node_list'),
     url(r'^nodes.geojson$', 'geojson_list', name='api_node_gejson_list'),
+    url(r'^nodes/clusters.geojson$', 'cluster_list', name='api_node_cluster_list'),
+    url(r'^nodes/bulk/$', 'node_bulk_upsert', name='api_node_bulk_upsert'),
+    url(r'^nodes/nearest/$', 'nearest_list', name='api_node_nearest_list'),
     url(r'^nodes/(?P<slug>[-\w]+)/$', 'node_details', name='api_node_details'),
     
     # images
@@ -1,32 +1,49 @@
+import simplejson as json
+
 from django.http import Http404
+from django.core.exceptions import ValidationError
+from django.contrib.gis.geos import Point
 from django.utils.translation import ugettext_lazy as _
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.contrib.auth import get_user_model
 from django.conf import settings
-from django.db.models import Q
 
 from rest_framework import permissions, authentication, generics
 from rest_framework.response import Response
+from rest_framework.exceptions import ParseError
 
-from nodeshot.core.base.mixins import ACLMixin, CustomDataMixin
+from nodeshot.core.base.mixins import (ACLMixin, CustomDataMixin, StreamingListMixin, CursorPaginationMixin,
+                                       SparseFieldsMixin, ConditionalGetMixin)
 from nodeshot.core.base.utils import Hider
 
 from .permissions import IsOwnerOrReadOnly
+from .filters import filter_by_geometry, nearest
+from .clusters import get_clusters, CLUSTER_MAX_ZOOM
+from .bulk import bulk_upsert
+from .simplify import SimplifiedGeometryMixin
 from .serializers import *
 from .models import *
 
 REVERSION_ENABLED = settings.NODESHOT['SETTINGS'].get('REVERSION_NODES', True)
 
+# related models serialized with nodes (status and username of the owner)
+NODE_RELATED_MODELS = (Status, get_user_model())
+
+if 'nodeshot.core.layers' in settings.INSTALLED_APPS:
+    from nodeshot.core.layers.models import Layer
+    NODE_RELATED_MODELS += (Layer,)
+
 if REVERSION_ENABLED:
     from nodeshot.core.base.mixins import RevisionCreate, RevisionUpdate
     
-    class NodeListBase(ACLMixin, RevisionCreate, generics.ListCreateAPIView):
+    class NodeListBase(ACLMixin, RevisionCreate, StreamingListMixin, CursorPaginationMixin, SparseFieldsMixin,
+                       SimplifiedGeometryMixin, generics.ListCreateAPIView):
         pass
     
     class NodeDetailBase(ACLMixin, RevisionUpdate, generics.RetrieveUpdateDestroyAPIView):
         pass
 else:
-    class NodeListBase(ACLMixin, generics.ListCreateAPIView):
+    class NodeListBase(ACLMixin, StreamingListMixin, CursorPaginationMixin, SparseFieldsMixin,
+                       SimplifiedGeometryMixin, generics.ListCreateAPIView):
         pass
     
     class NodeDetailBase(ACLMixin, generics.RetrieveUpdateDestroyAPIView):
@@ -46,15 +63,22 @@ def get_queryset_or_404(queryset, kwargs):
     return obj
 
 
-class NodeList(NodeListBase):
+class NodeList(ConditionalGetMixin, NodeListBase):
     """
     Retrieve list of all published nodes.
     
     Parameters:
     
-     * `search=<word>`: search <word> in name, slug, description and address of nodes
+     * `search=<words>`: search <words> in name, slug, description and address of nodes (ordered by relevance)
+     * `bbox=<minx,miny,maxx,maxy>`: retrieve only nodes intersecting the bounding box
+     * `within=<wkt polygon>`: retrieve only nodes contained in the polygon
+     * `near=<lng,lat>&radius=<meters>`: retrieve only nodes within radius meters from the point
      * `limit=<n>`: specify number of items per page (defaults to 40)
-     * `limit=0`: turns off pagination
+     * `limit=0`: turns off pagination (the list is streamed)
+     * `cursor`: turns on cursor pagination (see the `next` link), empty for the first page, no count is returned
+     * `fields=<field,field,...>`: output only the specified fields (eg: slug,name,geometry)
+     * `zoom=<n>`: simplify polygons and lines for the specified zoom level of the map
+     * `simplify=<tolerance>`: simplify polygons and lines with the specified tolerance (degrees)
     
     ### POST
     
@@ -68,35 +92,45 @@ class NodeList(NodeListBase):
     pagination_serializer_class = PaginatedNodeListSerializer
     paginate_by_param = 'limit'
     paginate_by = 40
+    # Node.__init__ reads status_id
+    required_query_fields = ('id', 'status')
+    conditional_models = NODE_RELATED_MODELS
     
     def get_queryset(self):
         """
         Optionally restricts the returned nodes
-        by filtering against a `search` query parameter in the URL.
+        by filtering against the `search`, `bbox`, `within`
+        and `near` query parameters in the URL.
         """
         # retrieve all nodes which are published and accessible to current user
-        # and use joins to retrieve related fields
-        queryset = super(NodeList, self).get_queryset().select_related('layer', 'status', 'user')
+        queryset = super(NodeList, self).get_queryset()
+        
+        # load only columns and joins needed by the requested fields
+        if self.get_requested_fields():
+            queryset = self.project_queryset(queryset)
+        # otherwise use joins to retrieve related fields
+        else:
+            queryset = queryset.select_related('layer', 'status', 'user')
         
         # retrieve value of querystring parameter "search"
         search = self.request.QUERY_PARAMS.get('search', None)
         
         if search is not None:
-            search_query = (
-                Q(name__icontains=search) |
-                Q(slug__icontains=search) |
-                Q(description__icontains=search) |
-                Q(address__icontains=search)
-            )
-            # add instructions for search to queryset
-            queryset = queryset.filter(search_query)
+            # full text search, results are ordered by relevance
+            queryset = Node.search_backend.search(queryset, search)
+        
+        # spatial filters (bbox, within, near & radius)
+        queryset = filter_by_geometry(queryset, self.request.QUERY_PARAMS)
+        
+        # simplified geometries (zoom, simplify)
+        queryset = self.simplify_queryset(queryset)
         
         return queryset
     
 node_list = NodeList.as_view()
     
     
-class NodeDetail(NodeDetailBase):
+class NodeDetail(ConditionalGetMixin, NodeDetailBase):
     """
     Retrieve details of specified node. Node must be published and accessible.
     
@@ -114,6 +148,7 @@ class NodeDetail(NodeDetailBase):
     authentication_classes = (authentication.SessionAuthentication, )
     permission_classes = (IsOwnerOrReadOnly, )
     queryset = Node.objects.published().select_related('user', 'layer')
+    conditional_models = NODE_RELATED_MODELS
 
 node_details = NodeDetail.as_view()
 
@@ -124,9 +159,16 @@ class NodeGeoJSONList(NodeList):
     
     Parameters:
     
-     * `search=<word>`: search <word> in name, slug, description and address of nodes
+     * `search=<words>`: search <words> in name, slug, description and address of nodes (ordered by relevance)
+     * `bbox=<minx,miny,maxx,maxy>`: retrieve only nodes intersecting the bounding box
+     * `within=<wkt polygon>`: retrieve only nodes contained in the polygon
+     * `near=<lng,lat>&radius=<meters>`: retrieve only nodes within radius meters from the point
      * `limit=<n>`: specify number of items per page (defaults to 40)
      * `limit=0`: turns off pagination
+     * `cursor`: turns on cursor pagination (see the `next` link), empty for the first page, no count is returned
+     * `fields=<field,field,...>`: output only the specified fields (eg: slug,name,geometry)
+     * `zoom=<n>`: simplify polygons and lines for the specified zoom level of the map
+     * `simplify=<tolerance>`: simplify polygons and lines with the specified tolerance (degrees)
     """
     
     serializer_class = NodeGeoSerializer
@@ -135,6 +177,211 @@ class NodeGeoJSONList(NodeList):
 geojson_list = NodeGeoJSONList.as_view()
 
 
+class NodeClusterList(ACLMixin, generics.GenericAPIView):
+    """
+    Retrieve published nodes grouped in clusters in GeoJSON format.
+    
+    Each feature is a cluster which contains the count of its nodes
+    and the count of nodes for each status; starting from a certain
+    zoom level nodes are returned individually instead.
+    
+    Parameters:
+    
+     * `zoom=<n>`: zoom level of the map - **required**
+     * `bbox=<minx,miny,maxx,maxy>`: cluster only nodes intersecting the bounding box
+     * `layer=<slug>`: cluster only nodes of the specified layer
+    """
+    authentication_classes = (authentication.SessionAuthentication,)
+    queryset = Node.objects.published()
+    
+    def get_queryset(self):
+        """ restricts nodes according to bbox and layer parameters """
+        queryset = super(NodeClusterList, self).get_queryset()
+        queryset = filter_by_geometry(queryset, self.request.QUERY_PARAMS)
+        
+        layer = self.request.QUERY_PARAMS.get('layer', None)
+        
+        if layer is not None and 'nodeshot.core.layers' in settings.INSTALLED_APPS:
+            queryset = queryset.filter(layer__slug=layer)
+        
+        return queryset
+    
+    def get_zoom(self):
+        """ validates zoom parameter """
+        try:
+            zoom = int(self.request.QUERY_PARAMS['zoom'])
+        except (KeyError, ValueError):
+            raise ParseError(_('zoom parameter is required and must be an integer'))
+        
+        if not 0 <= zoom <= 18:
+            raise ParseError(_('zoom must be between 0 and 18'))
+        
+        return zoom
+    
+    def get_node_features(self, queryset):
+        """ single nodes, returned at high zoom levels """
+        features = []
+        
+        for node in queryset.select_related('status').only('name', 'slug', 'geometry', 'status', 'status__slug'):
+            features.append({
+                'type': 'Feature',
+                'geometry': json.loads(node.geometry.geojson),
+                'properties': {
+                    'cluster': False,
+                    'name': node.name,
+                    'slug': node.slug,
+                    'status': node.status.slug if node.status else None
+                }
+            })
+        
+        return features
+    
+    def get_cluster_features(self, queryset, zoom):
+        """ clusters of nodes, returned at low zoom levels """
+        features = []
+        
+        for cluster in get_clusters(queryset, zoom):
+            features.append({
+                'type': 'Feature',
+                'geometry': {
+                    'type': 'Point',
+                    'coordinates': [cluster['lng'], cluster['lat']]
+                },
+                'properties': {
+                    'cluster': True,
+                    'count': cluster['count'],
+                    'statuses': cluster['statuses']
+                }
+            })
+        
+        return features
+    
+    def get(self, request, *args, **kwargs):
+        """ Retrieve clusters of nodes in GeoJSON format """
+        zoom = self.get_zoom()
+        queryset = self.get_queryset()
+        
+        if zoom >= CLUSTER_MAX_ZOOM:
+            features = self.get_node_features(queryset)
+        else:
+            features = self.get_cluster_features(queryset, zoom)
+        
+        return Response({
+            'type': 'FeatureCollection',
+            'features': features
+        })
+
+cluster_list = NodeClusterList.as_view()
+
+
+class NodeNearestList(ACLMixin, generics.GenericAPIView):
+    """
+    Retrieve the published nodes closest to a point, ordered by distance.
+    
+    The `distance` of each node from the point is expressed in meters.
+    
+    Parameters:
+    
+     * `lng=<longitude>&lat=<latitude>`: the point - **required**
+     * `k=<n>`: number of nodes (defaults to 10, maximum 100)
+     * `layer=<slug>`: retrieve only nodes of the specified layer
+     * `status=<slug>`: retrieve only nodes with the specified status
+    """
+    authentication_classes = (authentication.SessionAuthentication,)
+    queryset = Node.objects.published()
+    serializer_class = NodeNearestSerializer
+    default_k = 10
+    max_k = 100
+    
+    def get_point(self):
+        """ validates lng and lat parameters """
+        try:
+            lng = float(self.request.QUERY_PARAMS['lng'])
+            lat = float(self.request.QUERY_PARAMS['lat'])
+        except (KeyError, ValueError):
+            raise ParseError(_('lng and lat parameters are required and must be numbers'))
+        
+        if not (-180 <= lng <= 180 and -90 <= lat <= 90):
+            raise ParseError(_('lng must be between -180 and 180, lat between -90 and 90'))
+        
+        return Point(lng, lat, srid=4326)
+    
+    def get_k(self):
+        """ validates k parameter """
+        try:
+            k = int(self.request.QUERY_PARAMS.get('k', self.default_k))
+        except ValueError:
+            raise ParseError(_('k must be an integer'))
+        
+        if not 1 <= k <= self.max_k:
+            raise ParseError(_('k must be between 1 and %d') % self.max_k)
+        
+        return k
+    
+    def get_queryset(self):
+        """ restricts nodes according to layer and status parameters """
+        queryset = super(NodeNearestList, self).get_queryset().select_related('layer', 'status', 'user')
+        
+        layer = self.request.QUERY_PARAMS.get('layer', None)
+        status = self.request.QUERY_PARAMS.get('status', None)
+        
+        if layer is not None and 'nodeshot.core.layers' in settings.INSTALLED_APPS:
+            queryset = queryset.filter(layer__slug=layer)
+        
+        if status is not None:
+            queryset = queryset.filter(status__slug=status)
+        
+        return queryset
+    
+    def get(self, request, *args, **kwargs):
+        """ Retrieve the nodes closest to the point """
+        point = self.get_point()
+        k = self.get_k()
+        nodes = nearest(self.get_queryset(), point, k)
+        serializer = self.get_serializer(nodes, many=True)
+        return Response(serializer.data)
+
+nearest_list = NodeNearestList.as_view()
+
+
+class NodeBulkUpsert(generics.GenericAPIView):
+    """
+    Create or update many nodes at once. Requires authentication.
+    
+    ### POST
+    
+    Accepts a GeoJSON FeatureCollection; features are matched to nodes
+    by the `slug` property: existing nodes are updated with the specified
+    properties (`name`, `layer`, `status`, `address`, `description`, `elev`, `data`)
+    and geometry, the other features are created as new nodes.
+    
+    If any feature is invalid nothing is saved and the errors
+    of each invalid feature are returned (keyed by the index of the feature).
+    """
+    authentication_classes = (authentication.SessionAuthentication,)
+    permission_classes = (permissions.IsAuthenticated,)
+    
+    def post(self, request, *args, **kwargs):
+        """ create or update nodes """
+        data = request.DATA
+        
+        if not isinstance(data, dict) or data.get('type') != 'FeatureCollection':
+            raise ParseError(_('a GeoJSON FeatureCollection is required'))
+        
+        try:
+            created, updated = bulk_upsert(data.get('features'), request.user,
+                                           comment='bulk operation through the RESTful API from ip %s' % request.META['REMOTE_ADDR'])
+        except ValidationError as e:
+            return Response({ 'errors': e.message_dict }, status=400)
+        
+        return Response({
+            'created': [node.slug for node in created],
+            'updated': [node.slug for node in updated]
+        })
+
+node_bulk_upsert = NodeBulkUpsert.as_view()
+
+
 ### ------ Images ------ ###
 
 
@@ -239,15 +486,14 @@ node_image_detail = ImageDetail.as_view()
 ### ------ Status ------ ###
 
 
-class StatusList(generics.ListAPIView):
+class StatusList(ConditionalGetMixin, generics.ListAPIView):
     """
     Retrieve a list of all the available statuses and their relative icons/colors.
     """
     model = Status
     serializer_class = StatusListSerializer
-    
-    @method_decorator(cache_page(86400))  # cache for 1 day
-    def dispatch(self, *args, **kwargs):
-        return super(StatusList, self).dispatch(*args, **kwargs)
+    # statuses do not have an updated field
+    conditional_updated_field = None
+    conditional_models = (Status, StatusIcon)
     
 status_list = StatusList.as_view()
\ No newline at end of file
@@ -1,7 +1,7 @@
 from django.conf import settings
 
-PUBLIC_PIPE = settings.NODESHOT['WEBSOCKETS']['PUBLIC_PIPE']
-PRIVATE_PIPE = settings.NODESHOT['WEBSOCKETS']['PRIVATE_PIPE']
 ADDRESS = settings.NODESHOT['WEBSOCKETS'].get('LISTENING_ADDRESS', 8080)
 PORT = settings.NODESHOT['WEBSOCKETS'].get('LISTENING_PORT', 8080)
-DOMAIN = settings.NODESHOT['WEBSOCKETS']['DOMAIN']
\ No newline at end of file
+DOMAIN = settings.NODESHOT['WEBSOCKETS']['DOMAIN']
+# number of server processes, 0 means one per CPU core
+PROCESSES = settings.NODESHOT['WEBSOCKETS'].get('PROCESSES', 1)
@@ -0,0 +1,65 @@
+"""
+Message brokers between the django processes which publish messages
+(views, signal handlers, celery workers) and the websocket server which delivers them to clients.
+
+The broker is configured in settings.NODESHOT['WEBSOCKETS']['BROKER'], eg:
+
+    'BROKER': {
+        'BACKEND': 'nodeshot.core.websockets.brokers.redis_pubsub.RedisBroker',
+        'OPTIONS': { 'url': 'redis://localhost:6379/1' }
+    }
+
+Available backends:
+
+ * nodeshot.core.websockets.brokers.local.UnixSocketBroker (default, single machine)
+ * nodeshot.core.websockets.brokers.local.InProcessBroker (publisher and server in the same process, tests)
+ * nodeshot.core.websockets.brokers.redis_pubsub.RedisBroker (requires the redis package)
+ * nodeshot.core.websockets.brokers.postgres.PostgresBroker (LISTEN/NOTIFY)
+"""
+
+from importlib import import_module
+
+from django.core.exceptions import ImproperlyConfigured
+from django.conf import settings
+
+from .base import BaseBroker
+
+
+__all__ = [
+    'BaseBroker',
+    'load_broker',
+    'get_broker',
+]
+
+
+DEFAULT_BROKER = {
+    'BACKEND': 'nodeshot.core.websockets.brokers.local.UnixSocketBroker',
+    'OPTIONS': {}
+}
+
+
+def load_broker(config):
+    """
+    returns a new instance of the broker described by config
+
+    :param config: dictionary with BACKEND (python path of the broker class) and OPTIONS keys
+    """
+    module_path, class_name = config['BACKEND'].rsplit('.', 1)
+
+    try:
+        broker_class = getattr(import_module(module_path), class_name)
+    except (ImportError, AttributeError):
+        raise ImproperlyConfigured('websocket broker %s could not be imported' % config['BACKEND'])
+
+    return broker_class(**config.get('OPTIONS', {}))
+
+
+_broker = None
+
+
+def get_broker():
+    """ returns the broker of the current process, configured in settings """
+    global _broker
+    if _broker is None:
+        _broker = load_broker(settings.NODESHOT['WEBSOCKETS'].get('BROKER', DEFAULT_BROKER))
+    return _broker
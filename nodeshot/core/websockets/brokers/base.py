@@ -0,0 +1,49 @@
+import simplejson as json
+
+
+class BaseBroker(object):
+    """
+    Interface of websocket brokers:
+
+     * publish is called by django processes and should return quickly
+     * subscribe is called once by the websocket server, the callback must be executed
+       in the tornado IOLoop as soon as a message is published (no polling)
+
+    Messages are transported in a JSON envelope which contains the channel, the message
+    and optional metadata used to route public events (layer, status, bbox, see subscriptions.py).
+    """
+
+    # maximum size (bytes) of the messages accepted by the transport, None if unlimited
+    max_message_size = None
+
+    def __init__(self, **options):
+        self.options = options
+
+    def encode(self, channel, message, meta=None):
+        envelope = { 'channel': channel, 'message': message }
+        if meta is not None:
+            envelope['meta'] = meta
+        return json.dumps(envelope)
+
+    def decode(self, data):
+        """ returns a (channel, message, meta) tuple """
+        envelope = json.loads(data)
+        return envelope['channel'], envelope['message'], envelope.get('meta')
+
+    def publish(self, channel, message, meta=None):
+        """
+        publishes message (string) on channel (eg: "public", "private")
+
+        :param meta: optional dictionary used to route the message (eg: layer, status, bbox)
+        """
+        raise NotImplementedError('brokers must implement publish')
+
+    def subscribe(self, callback, io_loop):
+        """
+        delivers every published message to callback(channel, message, meta) in io_loop
+        """
+        raise NotImplementedError('brokers must implement subscribe')
+
+    def close(self):
+        """ releases the resources used by subscribe """
+        pass
@@ -0,0 +1,123 @@
+"""
+brokers which don't require external services
+"""
+
+import os
+import glob
+import errno
+import socket
+import tempfile
+import threading
+
+from .base import BaseBroker
+
+
+__all__ = [
+    'UnixSocketBroker',
+    'InProcessBroker',
+]
+
+
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), 'nodeshot.websockets.sock')
+# maximum size of a message (bytes)
+MAX_MESSAGE_SIZE = 262144
+
+
+class UnixSocketBroker(BaseBroker):
+    """
+    Each websocket server process binds a Unix datagram socket (path + "." + pid)
+    and registers it in its IOLoop, publishers send one datagram per message to every
+    server process: datagrams are never split nor mixed, so concurrent publishers
+    can't corrupt each other's messages.
+
+    Messages published while the server is not running, or while its socket buffer is full,
+    are discarded: publishers never wait for the server.
+
+    :param path: path of the socket file (defaults to nodeshot.websockets.sock in the temporary directory)
+    """
+
+    # fits in the default socket buffer (net.core.wmem_default)
+    max_message_size = 65536
+
+    def __init__(self, path=DEFAULT_PATH, **options):
+        super(UnixSocketBroker, self).__init__(**options)
+        self.path = path
+        self._local = threading.local()
+        self._socket = None
+        self._io_loop = None
+
+    def publish(self, channel, message, meta=None):
+        """ returns False if no server process is listening """
+        # one socket for each publishing thread
+        sock = getattr(self._local, 'socket', None)
+        if sock is None:
+            sock = self._local.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.setblocking(0)
+        data = self.encode(channel, message, meta)
+        delivered = False
+        for path in glob.glob('%s.*' % self.path):
+            try:
+                sock.sendto(data, path)
+            except socket.error as e:
+                # socket file left by a server process which was killed
+                if e.args[0] == errno.ECONNREFUSED and os.path.exists(path):
+                    os.unlink(path)
+                continue
+            delivered = True
+        return delivered
+
+    def subscribe(self, callback, io_loop):
+        self._path = '%s.%d' % (self.path, os.getpid())
+        # remove the socket file left by a previous server with the same pid
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self._path)
+        self._socket.setblocking(0)
+        self._io_loop = io_loop
+
+        def on_readable(fd, events):
+            # read every pending datagram
+            while True:
+                try:
+                    data = self._socket.recv(MAX_MESSAGE_SIZE)
+                except socket.error as e:
+                    if e.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
+                        return
+                    raise
+                callback(*self.decode(data))
+
+        io_loop.add_handler(self._socket.fileno(), on_readable, io_loop.READ)
+
+    def close(self):
+        if self._socket is None:
+            return
+        self._io_loop.remove_handler(self._socket.fileno())
+        self._socket.close()
+        self._socket = None
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+
+
+class InProcessBroker(BaseBroker):
+    """
+    delivers messages to the subscribers of the current process,
+    useful when publishers and websocket server run in the same process (eg: tests)
+    """
+    subscribers = []
+
+    def publish(self, channel, message, meta=None):
+        # add_callback is thread safe
+        for callback, io_loop in InProcessBroker.subscribers:
+            io_loop.add_callback(callback, channel, message, meta)
+        return True
+
+    def subscribe(self, callback, io_loop):
+        InProcessBroker.subscribers.append((callback, io_loop))
+        self._subscription = (callback, io_loop)
+
+    def close(self):
+        subscription = getattr(self, '_subscription', None)
+        if subscription in InProcessBroker.subscribers:
+            InProcessBroker.subscribers.remove(subscription)
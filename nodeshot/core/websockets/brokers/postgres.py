@@ -0,0 +1,93 @@
+"""
+PostgreSQL LISTEN/NOTIFY broker
+
+Doesn't require any additional service: publishers send notifications
+through the database used by django, the websocket server listens on a dedicated connection
+whose socket is registered in the IOLoop. Payloads of notifications can't exceed 8000 bytes.
+"""
+
+import re
+import threading
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from django.core.exceptions import ImproperlyConfigured
+from django.conf import settings
+
+from .base import BaseBroker
+
+
+__all__ = ['PostgresBroker']
+
+
+class PostgresBroker(BaseBroker):
+    """
+    Notifications are sent with an autocommit connection,
+    so they are delivered immediately rather than when the transaction of the publisher commits.
+
+    :param database: alias of the database in settings.DATABASES (defaults to "default")
+    :param channel: name of the notification channel (defaults to nodeshot_websockets)
+    """
+
+    # payloads of notifications can't exceed 8000 bytes, leaves room for the envelope
+    max_message_size = 7500
+
+    def __init__(self, database='default', channel='nodeshot_websockets', **options):
+        super(PostgresBroker, self).__init__(**options)
+        # channel is used as an identifier in the LISTEN statement
+        if not re.match(r'^[a-z_][a-z0-9_]*$', channel):
+            raise ImproperlyConfigured('channel of PostgresBroker must be a valid lowercase identifier')
+        self.database = database
+        self.channel = channel
+        self._connection = None
+        self._listener = None
+        self._io_loop = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        """ returns a new autocommit connection to the database """
+        config = settings.DATABASES[self.database]
+        params = {
+            'database': config['NAME'],
+            'user': config.get('USER'),
+            'password': config.get('PASSWORD'),
+            'host': config.get('HOST'),
+            'port': config.get('PORT')
+        }
+        # empty values mean libpq defaults
+        connection = psycopg2.connect(**dict([(key, value) for key, value in params.items() if value]))
+        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        return connection
+
+    def publish(self, channel, message, meta=None):
+        with self._lock:
+            if self._connection is None or self._connection.closed:
+                self._connection = self.connect()
+            try:
+                self._connection.cursor().execute('SELECT pg_notify(%s, %s)', [self.channel, self.encode(channel, message, meta)])
+            # connection lost, retry once with a new one
+            except psycopg2.OperationalError:
+                self._connection = self.connect()
+                self._connection.cursor().execute('SELECT pg_notify(%s, %s)', [self.channel, self.encode(channel, message, meta)])
+        return True
+
+    def subscribe(self, callback, io_loop):
+        self._listener = self.connect()
+        self._listener.cursor().execute('LISTEN %s' % self.channel)
+        self._io_loop = io_loop
+
+        def on_readable(fd, events):
+            self._listener.poll()
+            while self._listener.notifies:
+                notify = self._listener.notifies.pop(0)
+                callback(*self.decode(notify.payload))
+
+        io_loop.add_handler(self._listener.fileno(), on_readable, io_loop.READ)
+
+    def close(self):
+        if self._listener is None:
+            return
+        self._io_loop.remove_handler(self._listener.fileno())
+        self._listener.close()
+        self._listener = None
@@ -0,0 +1,61 @@
+"""
+Redis pub/sub broker, requires the redis package
+
+Suitable when publishers and websocket server run on different machines.
+"""
+
+from threading import Thread
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import BaseBroker
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+__all__ = ['RedisBroker']
+
+
+class RedisBroker(BaseBroker):
+    """
+    Messages are published on a redis channel; the websocket server listens
+    in a thread blocked on the redis connection (no polling) which hands
+    each message over to the IOLoop.
+
+    :param url: redis url (defaults to redis://localhost:6379/0)
+    :param channel: name of the redis channel (defaults to nodeshot.websockets)
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', channel='nodeshot.websockets', **options):
+        if redis is None:
+            raise ImproperlyConfigured('RedisBroker requires the redis package: pip install redis')
+        super(RedisBroker, self).__init__(**options)
+        self.channel = channel
+        self.client = redis.StrictRedis.from_url(url)
+        self.pubsub = None
+
+    def publish(self, channel, message, meta=None):
+        self.client.publish(self.channel, self.encode(channel, message, meta))
+        return True
+
+    def subscribe(self, callback, io_loop):
+        self.pubsub = self.client.pubsub()
+        self.pubsub.subscribe(self.channel)
+
+        def listen():
+            for item in self.pubsub.listen():
+                if item['type'] == 'message':
+                    # add_callback is the only thread safe method of IOLoop
+                    io_loop.add_callback(callback, *self.decode(item['data']))
+
+        thread = Thread(target=listen)
+        thread.daemon = True
+        thread.start()
+
+    def close(self):
+        if self.pubsub is not None:
+            self.pubsub.unsubscribe()
+            self.pubsub = None
@@ -0,0 +1,374 @@
+"""
+versioned JSON events describing the changes of nodes, links and other objects
+
+Registrars publish one event for each change of a tracked object, eg:
+
+    {
+        "version": 1,
+        "type": "node.updated",
+        "id": 5,
+        "slug": "fusolab",
+        "changes": { "status": "active", "geometry": { "type": "Point", "coordinates": [12.58, 41.87] } },
+        "previous": { "status": "potential" }
+    }
+
+ * type is "<model>.<action>" where action is one of created, updated, status_changed, deleted
+ * created events carry every public field in changes, updated events only the changed ones
+   and their previous values (except geometry), deleted events only the identity of the object
+ * status_changed events are updated events whose changes include the status
+ * geometries are GeoJSON geometries
+ * objects which become hidden to the public (eg: unpublished) are notified as deleted,
+   objects which become visible as created
+
+Events which don't refer to a single object don't have id and changes, eg: "node.bulk_saved"
+summarizes the changes done by bulk operations or while signals were paused (see EventSummary).
+
+The websocket server coalesces the events of the same object published within
+WEBSOCKETS['COALESCE_WINDOW'] seconds (see EventBuffer), eg: created + updated becomes
+a single created event, created + deleted is dropped.
+"""
+
+from collections import OrderedDict
+
+import simplejson as json
+from tornado.ioloop import IOLoop
+
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.contrib.gis.geos import GEOSGeometry
+from django.conf import settings
+
+from nodeshot.core.base.previous import track_previous_values, get_previous_values
+
+
+__all__ = [
+    'VERSION',
+    'make_event',
+    'merge',
+    'merge_meta',
+    'EventTracker',
+    'EventSummary',
+    'EventBuffer',
+]
+
+
+VERSION = 1
+# seconds during which the events of the same object are coalesced by the server, 0 disables coalescing
+COALESCE_WINDOW = settings.NODESHOT['WEBSOCKETS'].get('COALESCE_WINDOW', 0.5)
+# stronger actions prevail when events are coalesced
+ACTIONS = ['updated', 'status_changed', 'created']
+
+
+def geojson(geometry):
+    """ returns geometry (GEOSGeometry, WKT or HEXEWKB) as a GeoJSON dictionary """
+    if geometry is None:
+        return None
+    if not isinstance(geometry, GEOSGeometry):
+        geometry = GEOSGeometry(geometry)
+    return json.loads(geometry.geojson)
+
+
+def extent(geometry):
+    """ returns the extent of a GeoJSON geometry as [minx, miny, maxx, maxy] """
+    if geometry is None:
+        return None
+    return list(GEOSGeometry(json.dumps(geometry)).extent)
+
+
+def make_event(model, action, pk, changes=None, previous=None, **identity):
+    """
+    returns a new event
+
+    :param model: name of the model (eg: "node")
+    :param action: created, updated, status_changed or deleted
+    :param identity: additional keys which identify the object for clients (eg: slug)
+    """
+    event = {
+        'version': VERSION,
+        'type': '%s.%s' % (model, action),
+        'id': pk,
+        'changes': changes or {}
+    }
+    if previous is not None:
+        event['previous'] = previous
+    event.update(identity)
+    return event
+
+
+def merge(previous, event):
+    """
+    returns the event equivalent to previous followed by event (same object),
+    None if the two events cancel each other (eg: created and then deleted)
+    """
+    model, previous_action = previous['type'].split('.')
+    action = event['type'].split('.')[1]
+
+    if action == 'deleted':
+        # clients never knew the object
+        if previous_action == 'created':
+            return None
+        return event
+
+    # object deleted and created again (eg: unpublished and published)
+    if previous_action == 'deleted' or action == 'created':
+        return event
+
+    merged = make_event(model, max(previous_action, action, key=ACTIONS.index), event['id'])
+    for key, value in event.items():
+        if key not in merged and key not in ['changes', 'previous']:
+            merged[key] = value
+    merged['changes'] = dict(previous['changes'].items() + event['changes'].items())
+
+    if previous_action == 'created':
+        return merged
+
+    # previous values are the ones known to clients before the first event
+    old = dict(event.get('previous', {}).items() + previous.get('previous', {}).items())
+    for name, value in old.items():
+        # changed and then restored
+        if merged['changes'].get(name) == value:
+            del merged['changes'][name]
+            del old[name]
+    merged['previous'] = old
+
+    if not merged['changes']:
+        return None
+    if 'status' not in merged['changes']:
+        merged['type'] = '%s.updated' % model
+    return merged
+
+
+def merge_meta(previous, meta):
+    """
+    returns the meta which routes the coalesced event to the clients interested in any of the two events
+    """
+    if previous is None or meta is None:
+        return None
+    merged = {}
+    for key in ['layer', 'status', 'bbox']:
+        values = []
+        for value in [previous.get(key), meta.get(key)]:
+            if value is None:
+                continue
+            # single value or list of values (bbox: single extent or list of extents)
+            if not isinstance(value, list) or (key == 'bbox' and value and not isinstance(value[0], list)):
+                value = [value]
+            values += [item for item in value if item not in values]
+        if values:
+            merged[key] = values
+    return merged
+
+
+class EventTracker(object):
+    """
+    publishes an event for each change of the instances of a model
+
+    :param model: model class
+    :param name: name of the model in event types (eg: "node")
+    :param fields: names of the model fields which are read by serialize
+    :param serialize: function which receives a dictionary of the values of fields and returns
+                      the dictionary of the public attributes of the object (geometry as GeoJSON),
+                      or None if the object is not visible to the public
+    :param get_meta: function which receives the serialized object and returns the metadata
+                     used to deliver the event to the subscribed clients (layer, status, bbox)
+    :param identity: names of serialized attributes which are always included in events (eg: slug)
+    """
+
+    def __init__(self, model, name, fields, serialize, get_meta=None, identity=()):
+        self.model = model
+        self.name = name
+        self.fields = fields
+        self.serialize = serialize
+        self.get_meta = get_meta or (lambda obj: None)
+        self.identity = identity
+        self.attnames = dict([(field, model._meta.get_field(field).attname) for field in fields])
+        self.uid = 'websockets_%s_%s' % (model._meta.app_label, model._meta.object_name.lower())
+        track_previous_values(model, fields)
+        # changes done while paused are summarized (see pause)
+        self.summary = None
+        self.connect()
+
+    def connect(self):
+        pre_save.connect(self.pre_save, sender=self.model, weak=False, dispatch_uid=self.uid)
+        post_save.connect(self.post_save, sender=self.model, weak=False, dispatch_uid=self.uid)
+        post_delete.connect(self.post_delete, sender=self.model, weak=False, dispatch_uid=self.uid)
+
+    def disconnect(self):
+        pre_save.disconnect(sender=self.model, dispatch_uid=self.uid)
+        post_save.disconnect(sender=self.model, dispatch_uid=self.uid)
+        post_delete.disconnect(sender=self.model, dispatch_uid=self.uid)
+
+    def pause(self):
+        """
+        changes are not published one by one until resume is called,
+        which publishes a summary of them instead (eg: imports, see pause_disconnectable_signals)
+        """
+        if self.summary is None:
+            self.summary = EventSummary(self.name)
+
+    def resume(self):
+        summary = self.summary
+        self.summary = None
+        if summary:
+            from .publisher import publish
+            event, meta = summary.get_event()
+            publish(event, meta=meta)
+
+    def get_values(self, instance):
+        return dict([(field, getattr(instance, attname)) for field, attname in self.attnames.items()])
+
+    def pre_save(self, sender, instance, **kwargs):
+        """ stores the public attributes of the instance before the change """
+        instance._websockets_previous = None
+        # summaries don't need the previous values
+        if self.summary is None:
+            previous = get_previous_values(instance)
+            if previous is not None:
+                instance._websockets_previous = self.serialize(previous)
+
+    def post_save(self, sender, instance, created=False, **kwargs):
+        current = self.serialize(self.get_values(instance))
+        summary = self.summary
+        if summary is not None:
+            if current is not None:
+                summary.add('created' if created else 'updated', self.get_meta(current))
+            return
+        previous = getattr(instance, '_websockets_previous', None)
+        instance._websockets_previous = current
+        self.publish(instance.pk, previous, current)
+
+    def post_delete(self, sender, instance, **kwargs):
+        previous = self.serialize(self.get_values(instance))
+        summary = self.summary
+        if summary is not None:
+            if previous is not None:
+                summary.add('deleted', self.get_meta(previous))
+            return
+        self.publish(instance.pk, previous, None)
+
+    def diff(self, pk, previous, current):
+        """ returns the event which describes the change from previous to current, None if nothing changed """
+        if previous is None and current is None:
+            return None
+
+        obj = current or previous
+        identity = dict([(key, obj[key]) for key in self.identity])
+
+        if previous is None:
+            return make_event(self.name, 'created', pk, changes=current, **identity)
+        if current is None:
+            return make_event(self.name, 'deleted', pk, **identity)
+
+        changes = dict([(key, value) for key, value in current.items() if previous.get(key) != value])
+        if not changes:
+            return None
+        old = dict([(key, previous.get(key)) for key in changes if key != 'geometry'])
+        action = 'status_changed' if 'status' in changes else 'updated'
+        return make_event(self.name, action, pk, changes=changes, previous=old, **identity)
+
+    def publish(self, pk, previous, current):
+        event = self.diff(pk, previous, current)
+        if event is None:
+            return
+        # clients subscribed to the old or to the new position, layer and status are notified
+        meta = self.get_meta(current or previous)
+        if previous is not None and current is not None:
+            meta = merge_meta(self.get_meta(previous), meta)
+        # imported here because the publisher coalesces events with merge
+        from .publisher import publish
+        publish(event, meta=meta)
+
+
+class EventSummary(object):
+    """
+    summary of the changes of many objects, published as a single "<model>.bulk_saved" event
+    with the number of created, updated and deleted objects and the layers, statuses and
+    extent affected, which clients use to reload only what is needed
+
+    :param name: name of the model in event types (eg: "node")
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = { 'created': 0, 'updated': 0, 'deleted': 0 }
+        self.layers = []
+        self.statuses = []
+        self.bbox = None
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def add(self, action, meta=None):
+        """
+        :param action: created, updated or deleted
+        :param meta: layer, status and bbox of the object (see subscriptions.py)
+        """
+        self.counts[action] += 1
+        meta = meta or {}
+        for values, key in [(self.layers, 'layer'), (self.statuses, 'status')]:
+            if meta.get(key) is not None and meta[key] not in values:
+                values.append(meta[key])
+        extent = meta.get('bbox')
+        if extent is not None:
+            if self.bbox is None:
+                self.bbox = list(extent)
+            else:
+                self.bbox = [min(self.bbox[0], extent[0]), min(self.bbox[1], extent[1]),
+                             max(self.bbox[2], extent[2]), max(self.bbox[3], extent[3])]
+
+    def get_event(self):
+        """ returns the summary event and its meta """
+        event = {
+            'version': VERSION,
+            'type': '%s.bulk_saved' % self.name,
+            'layers': self.layers,
+            'statuses': self.statuses,
+            'bbox': self.bbox
+        }
+        event.update(self.counts)
+        # delivered to everybody if the affected area is unknown
+        meta = None
+        if self.bbox is not None:
+            meta = { 'layer': self.layers, 'status': self.statuses, 'bbox': self.bbox }
+        return event, meta
+
+
+class EventBuffer(object):
+    """
+    used by the websocket server to coalesce the events of the same object
+    received within window seconds, callback(event, meta) is called once for each object
+    when the window expires
+    """
+
+    def __init__(self, callback, window=COALESCE_WINDOW):
+        self.callback = callback
+        self.window = window
+        # (model, id) -> (event, meta), event is None if the events cancelled each other
+        self.pending = OrderedDict()
+        self._timeout = None
+
+    def add(self, event, meta=None):
+        # events which don't refer to a single object (eg: node.bulk_saved) are not delayed
+        if not self.window or 'id' not in event:
+            self.callback(event, meta)
+            return
+
+        key = (event['type'].split('.')[0], event['id'])
+        if key in self.pending and self.pending[key][0] is not None:
+            previous, previous_meta = self.pending[key]
+            self.pending[key] = (merge(previous, event), merge_meta(previous_meta, meta))
+        else:
+            self.pending[key] = (event, meta)
+
+        if self._timeout is None:
+            io_loop = IOLoop.current()
+            self._timeout = io_loop.add_timeout(io_loop.time() + self.window, self.flush)
+
+    def flush(self):
+        """ delivers the pending events """
+        pending = self.pending
+        self.pending = OrderedDict()
+        self._timeout = None
+        pending = [(event, meta) for event, meta in pending.values() if event is not None]
+        # in order of sequence number (see replay.py), the last one is the one known by clients
+        for event, meta in sorted(pending, key=lambda item: item[0].get('seq')):
+            self.callback(event, meta)
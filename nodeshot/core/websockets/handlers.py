@@ -1,7 +1,9 @@
 import uuid
+import simplejson as json
 import tornado.websocket
 
-from . import PUBLIC_PIPE  # contained in __init__.py
+from .subscriptions import SubscriptionIndex, parse_subscription
+from .events import VERSION
 
 
 class WebSocketHandler(tornado.websocket.WebSocketHandler):
@@ -9,13 +11,21 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
     simple websocket server for bidirectional communication between client and server
     """
     
-    # public means non authenticated
-    # private means authenticated
+    # public means non authenticated: client id -> client
+    # private means authenticated: user id -> set of clients (a user might have several tabs open)
     channels = {
         'public': {},
         'private': {}
     }
     
+    # all connected clients indexed by subscription
+    subscriptions = SubscriptionIndex()
+    
+    # recent events, set by server.start (see replay.py)
+    replay_buffer = None
+    # sequence number of the last event broadcasted by this process
+    delivered_seq = 0
+    
     def send_message(self, *args):
         """ alias to write_message """
         self.write_message(*args)
@@ -29,48 +39,100 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
         if user_id is None:
             # generate a random uuid if it's an unauthenticated client
             self.channel = 'public'
-            user_id = uuid.uuid1().hex
+            self.id = uuid.uuid1().hex
+            WebSocketHandler.channels['public'][self.id] = self
         else:
             self.channel = 'private'
+            self.id = user_id
+            WebSocketHandler.channels['private'].setdefault(self.id, set()).add(self)
         
-        self.id = user_id
-        WebSocketHandler.channels[self.channel][self.id] = self
+        WebSocketHandler.subscriptions.add(self)
         print 'Client connected to the %s channel.' % self.channel
     
     def remove_client(self):
         """ removes a client """
-        del WebSocketHandler.channels[self.channel][self.id]
+        if self.channel == 'public':
+            del WebSocketHandler.channels['public'][self.id]
+        else:
+            clients = WebSocketHandler.channels['private'][self.id]
+            clients.discard(self)
+            # last socket of the user
+            if not clients:
+                del WebSocketHandler.channels['private'][self.id]
+        WebSocketHandler.subscriptions.remove(self)
     
     @classmethod
-    def broadcast(cls, message):
-        """ broadcast message to all connected clients """
-        clients = cls.get_clients()
-        # loop over every client and send message
-        for id, client in clients.iteritems():
+    def broadcast(cls, message, meta=None):
+        """
+        send message to the connected clients interested in it
+        (to all connected clients if meta is None)
+        
+        :param meta: dictionary which might contain layer, status and bbox of the event
+        """
+        for client in cls.subscriptions.recipients(meta):
             client.send_message(message)
     
     @classmethod
-    def send_private_message(self, user_id, message):
+    def broadcast_event(cls, event, meta=None):
+        """ broadcasts an event (see events.py), encoded once for all the recipients """
+        cls.broadcast(json.dumps(event), meta)
+        cls.delivered_seq = max(cls.delivered_seq, event.get('seq', 0))
+    
+    def replay(self, since, epoch=None):
         """
-        Send a message to a specific client.
-        Returns True if successful, False otherwise
+        sends the events missed by a reconnecting client, which knows the events up to since,
+        or a resync event if they are not available anymore
         """
+        events = None
         try:
-            client = self.channels['private'][user_id]
-        except KeyError:
-            print 'client with id %s not found' % user_id
+            since = int(since)
+        except ValueError:
+            pass
+        else:
+            if epoch in [None, self.replay_buffer.epoch]:
+                events = self.replay_buffer.get_since(since, self.delivered_seq)
+        
+        if events is None:
+            self.send_message(json.dumps({
+                'version': VERSION,
+                'type': 'resync',
+                'epoch': self.replay_buffer.epoch,
+                'seq': self.delivered_seq
+            }))
+            return
+        
+        for event in events:
+            self.send_message(json.dumps(event))
+    
+    @classmethod
+    def send_private_message(self, user_id, message):
+        """
+        Send a message to every socket of a specific user.
+        Returns True if the user is connected to this process, False otherwise
+        (when running several server processes each one receives every private message
+        and only the processes which hold sockets of the user deliver it).
+        """
+        clients = self.channels['private'].get(user_id)
+        if not clients:
             return False
         
-        client.send_message(message)
-        print 'message sent to client #%s' % user_id
+        for client in list(clients):
+            client.send_message(message)
+        print 'message sent to %d sockets of client #%s' % (len(clients), user_id)
         return True
     
     @classmethod
     def get_clients(self):
-        """ return a merge of public and private clients """
-        public = self.channels['public']
-        private = self.channels['private']
-        return dict(public.items() + private.items())
+        """ return the list of public and private clients """
+        clients = self.channels['public'].values()
+        for user_clients in self.channels['private'].values():
+            clients += list(user_clients)
+        return clients
+    
+    @classmethod
+    def count_clients(self):
+        """ return the number of clients connected to this process """
+        return len(self.subscriptions)
     
     def open(self):
         """ method which is called every time a new client connects """
@@ -82,25 +144,64 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
         self.add_client(user_id)
         # welcome message
         self.send_message("Welcome to nodeshot websocket server.")
+        
+        # reconnecting clients receive the events they missed (see replay.py)
+        since = self.get_argument("since", None)
+        if since is not None:
+            self.replay(since, self.get_argument("epoch", None))
+        else:
+            # sequence of the events which will follow
+            self.send_message(json.dumps({
+                'version': VERSION,
+                'type': 'connected',
+                'epoch': self.replay_buffer.epoch,
+                'seq': self.delivered_seq
+            }))
         # new client connected message
-        client_count = len(self.get_clients().keys())
+        client_count = self.count_clients()
         new_client_message = 'New client connected, now we have %d %s!' % (client_count, 'client' if client_count <= 1 else 'clients')
         # broadcast new client connected message to all connected clients
         self.broadcast(new_client_message)
-        
-        print WebSocketHandler.channels['private']
 
     def on_message(self, message):
         """ method which is called every time the server gets a message from a client """
         if message == "help":
             self.send_message("Need help, huh?")
         print 'Message received: \'%s\'' % message
+        
+        try:
+            data = json.loads(message)
+        except ValueError:
+            return
+        
+        if isinstance(data, dict) and data.get('action') == 'subscribe':
+            self.subscribe(data)
+        elif isinstance(data, dict) and data.get('action') == 'unsubscribe':
+            WebSocketHandler.subscriptions.unsubscribe(self)
+            self.send_message({ 'unsubscribed': True })
+    
+    def subscribe(self, data):
+        """ subscribes the client to layers, statuses and/or a bbox (see subscriptions.py) """
+        try:
+            layers, statuses, bbox = parse_subscription(data)
+        except ValueError as e:
+            self.send_message({ 'error': str(e) })
+            return
+        
+        WebSocketHandler.subscriptions.subscribe(self, layers=layers, statuses=statuses, bbox=bbox)
+        self.send_message({
+            'subscribed': {
+                'layers': layers,
+                'statuses': statuses,
+                'bbox': bbox
+            }
+        })
 
     def on_close(self):
         """ method which is called every time a client disconnects """
         print 'Connection closed.'
         self.remove_client()
         
-        client_count = len(self.get_clients().keys())
+        client_count = self.count_clients()
         new_client_message = '1 client disconnected, now we have %d %s!' % (client_count, 'client' if client_count <= 1 else 'clients')
         self.broadcast(new_client_message)
\ No newline at end of file
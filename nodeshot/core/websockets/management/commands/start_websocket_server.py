@@ -1,12 +1,27 @@
+from optparse import make_option
+
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 
 from nodeshot.core.websockets.server import start as start_server
+from nodeshot.core.websockets import PROCESSES
 
 
 class Command(BaseCommand):
     help = "Start Tornado WebSocket Server"
+    
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--processes',
+            dest='processes',
+            type='int',
+            default=PROCESSES,
+            help='Number of server processes, 0 means one per CPU core'
+        ),
+    )
 
     def handle(self, *args, **options):
         """ Go baby go! """
-        start_server()
\ No newline at end of file
+        if options['processes'] < 0:
+            raise CommandError('--processes must be a positive number or 0')
+        start_server(processes=options['processes'])
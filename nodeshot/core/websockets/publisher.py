@@ -0,0 +1,190 @@
+"""
+direct publisher of websocket messages
+
+Registrars publish through the broker directly (no celery task, publishing doesn't wait
+for the websocket server). Events published inside a batch are buffered and published
+on exit, coalesced by object (see events.merge) and packed in as few broker messages as possible:
+
+    {"version": 1, "type": "batch", "events": [{"event": {...}, "meta": {...}}, ...]}
+
+A batch is opened for the duration of each request (unless WEBSOCKETS['BATCH_REQUESTS'] is False),
+its events are discarded if the request raises an exception. Batches can also be opened
+explicitly around transactions, the batch must be the outer block so that events are published
+after the commit and discarded on rollback (eg: bulk_upsert):
+
+    with batch():
+        with transaction.commit_on_success():
+            ...
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+
+import simplejson as json
+
+from django.core.signals import request_started, request_finished, got_request_exception
+from django.dispatch import receiver
+from django.conf import settings
+
+from .brokers import get_broker
+from .replay import get_replay_buffer
+from .events import VERSION, merge, merge_meta
+
+
+__all__ = [
+    'publish',
+    'send',
+    'EventBatch',
+    'batch',
+]
+
+
+BATCH_REQUESTS = settings.NODESHOT['WEBSOCKETS'].get('BATCH_REQUESTS', True)
+# maximum number of events in a broker message
+BATCH_SIZE = settings.NODESHOT['WEBSOCKETS'].get('BATCH_SIZE', 100)
+
+_state = threading.local()
+
+logger = logging.getLogger(__name__)
+
+
+def send(message, pipe='public', meta=None):
+    """ publishes message immediately """
+    _send(pipe, [(message, meta)])
+
+
+def _send(pipe, items):
+    """
+    publishes a list of (message, meta) tuples,
+    errors are logged and not raised: saving objects must not fail because of websockets
+    """
+    try:
+        broker = get_broker()
+        replay_buffer = get_replay_buffer()
+    except Exception:
+        logger.exception('websocket messages could not be published')
+        return
+
+    # events are numbered by publishers when the replay buffer is shared by the server processes
+    if pipe == 'public' and replay_buffer.shared:
+        try:
+            for message, meta in items:
+                if isinstance(message, dict):
+                    replay_buffer.append(message)
+        # events are published anyway, clients resync if they miss them
+        except Exception:
+            logger.exception('websocket events could not be stored in the replay buffer')
+
+    try:
+        if len(items) == 1:
+            message, meta = items[0]
+            broker.publish(pipe, message, meta)
+            return
+
+        for chunk in _chunks([{ 'event': message, 'meta': meta } for message, meta in items], broker.max_message_size):
+            broker.publish(pipe, { 'version': VERSION, 'type': 'batch', 'events': chunk })
+    except Exception:
+        logger.exception('websocket messages could not be published')
+
+
+def _chunks(items, max_size=None):
+    """ splits items in lists of at most BATCH_SIZE items whose encoded size doesn't exceed max_size """
+    chunk = []
+    size = 0
+    for item in items:
+        length = len(json.dumps(item))
+        if chunk and (len(chunk) >= BATCH_SIZE or (max_size and size + length > max_size)):
+            yield chunk
+            chunk = []
+            size = 0
+        chunk.append(item)
+        size += length
+    if chunk:
+        yield chunk
+
+
+def publish(message, pipe='public', meta=None):
+    """
+    publishes message, events (dictionaries) on the public channel
+    are buffered until the end of the current batch, if any
+    """
+    current = getattr(_state, 'batch', None)
+    if current is not None and pipe == 'public' and isinstance(message, dict):
+        current.add(message, meta)
+    else:
+        send(message, pipe, meta)
+
+
+class EventBatch(object):
+    """
+    context manager which buffers the events published inside its block
+    and publishes them on exit (unless an exception is raised)
+    """
+
+    def __init__(self):
+        # (model, id) -> (event, meta), events without id are never merged
+        self.events = OrderedDict()
+
+    def add(self, event, meta=None):
+        if 'id' not in event:
+            self.events[len(self.events), None] = (event, meta)
+            return
+        key = (event['type'].split('.')[0], event['id'])
+        if key in self.events and self.events[key][0] is not None:
+            previous, previous_meta = self.events[key]
+            self.events[key] = (merge(previous, event), merge_meta(previous_meta, meta))
+        else:
+            self.events[key] = (event, meta)
+
+    def commit(self):
+        """ publishes the buffered events """
+        items = [(event, meta) for event, meta in self.events.values() if event is not None]
+        self.events = OrderedDict()
+        if items:
+            _send('public', items)
+
+    def __enter__(self):
+        # nested blocks are part of the outer batch
+        if getattr(_state, 'batch', None) is None:
+            _state.batch = self
+        return _state.batch
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if _state.batch is not self:
+            return
+        _state.batch = None
+        if exc_type is None:
+            self.commit()
+
+
+def batch():
+    """ returns a context manager which publishes the events of its block in a single batch """
+    return EventBatch()
+
+
+# ------ Signals ------ #
+
+
+@receiver(request_started)
+def start_request_batch(sender, **kwargs):
+    if BATCH_REQUESTS:
+        # a batch left open by a previous request of the same thread is discarded
+        _state.batch = None
+        _state.request_batch = EventBatch().__enter__()
+
+
+@receiver(request_finished)
+def commit_request_batch(sender, **kwargs):
+    request_batch = getattr(_state, 'request_batch', None)
+    if request_batch is not None:
+        _state.request_batch = None
+        request_batch.__exit__(None, None, None)
+
+
+@receiver(got_request_exception)
+def discard_request_batch(sender, **kwargs):
+    # the changes of the request might have been rolled back
+    if getattr(_state, 'request_batch', None) is not None:
+        _state.request_batch = None
+        _state.batch = None
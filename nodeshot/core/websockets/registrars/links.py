@@ -0,0 +1,59 @@
+from django.conf import settings
+
+from nodeshot.core.base.choices import ACCESS_LEVELS
+from nodeshot.networking.links.models import Link
+from nodeshot.networking.links.models.choices import LINK_STATUS, LINK_TYPES
+
+from ..events import EventTracker, geojson, extent
+
+
+LINK_FIELDS = ['type', 'status', 'metric_type', 'metric_value', 'node_a', 'node_b', 'line', 'access_level']
+
+STATUS_NAMES = dict([(value, key) for key, value in LINK_STATUS.items()])
+TYPE_NAMES = dict([(value, key) for key, value in LINK_TYPES.items()])
+
+
+def serialize_link(values):
+    """ public attributes of a link, None if the link is not visible to anonymous users """
+    if values['access_level'] != ACCESS_LEVELS.get('public'):
+        return None
+
+    return {
+        'type': TYPE_NAMES.get(values['type']),
+        'status': STATUS_NAMES.get(values['status']),
+        'metric_type': values['metric_type'],
+        'metric_value': values['metric_value'],
+        'node_a': values['node_a'],
+        'node_b': values['node_b'],
+        'geometry': geojson(values['line'])
+    }
+
+
+def get_meta(obj):
+    """ link events are delivered to the clients subscribed to their area """
+    return { 'bbox': extent(obj['geometry']) }
+
+
+# ------ LINK CREATED, UPDATED, STATUS CHANGED, DELETED ------ #
+
+tracker = EventTracker(Link, 'link', LINK_FIELDS, serialize_link, get_meta=get_meta)
+
+
+# ------ DISCONNECT UTILITY ------ #
+
+def disconnect():
+    """ changes are summarized in a single event until reconnect is called """
+    tracker.pause()
+
+
+def reconnect():
+    """ publishes the summary of the changes done while disconnected """
+    tracker.resume()
+
+
+settings.NODESHOT['DISCONNECTABLE_SIGNALS'].append(
+    {
+        'disconnect': disconnect,
+        'reconnect': reconnect
+    }
+)
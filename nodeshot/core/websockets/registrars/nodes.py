@@ -1,56 +1,89 @@
-from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver
 from django.conf import settings
 
-from nodeshot.core.nodes.signals import node_status_changed
-from nodeshot.core.nodes.models import Node
+from nodeshot.core.base.choices import ACCESS_LEVELS
+from nodeshot.core.nodes.signals import nodes_bulk_saved
+from nodeshot.core.nodes.models import Node, Status
 
-from ..tasks import send_message
+from ..events import EventTracker, EventSummary, geojson, extent
+from ..publisher import publish
 
 
-# ------ NODE CREATED ------ #
+LAYERS_ENABLED = 'nodeshot.core.layers' in settings.INSTALLED_APPS
 
-@receiver(post_save, sender=Node)
-def node_created_handler(sender, **kwargs):
-    if kwargs['created']:
-        obj = kwargs['instance']
-        message = 'node "%s" has been added' % obj.name
-        send_message.delay(message)
+NODE_FIELDS = ['name', 'slug', 'status', 'address', 'elev', 'description',
+               'geometry', 'is_published', 'access_level']
+if LAYERS_ENABLED:
+    NODE_FIELDS.append('layer')
 
-# ------ NODE STATUS CHANGED ------ #
 
-@receiver(node_status_changed)
-def node_status_changed_handler(**kwargs):
-    obj = kwargs['instance']
-    obj.old_status = kwargs['old_status'].name
-    obj.new_status = kwargs['new_status'].name
-    message = 'node "%s" changed its status from "%s" to "%s"' % (obj.name, obj.old_status, obj.new_status)
-    send_message.delay(message)
+def serialize_node(values):
+    """ public attributes of a node, None if the node is not visible to anonymous users """
+    if not values['is_published'] or values['access_level'] != ACCESS_LEVELS.get('public'):
+        return None
 
+    obj = dict([(field, values[field]) for field in ['name', 'slug', 'address', 'elev', 'description']])
+    obj['status'] = Status.reference_cache.get(pk=values['status']).slug if values['status'] else None
+    obj['geometry'] = geojson(values['geometry'])
 
-# ------ NODE DELETED ------ #
+    if LAYERS_ENABLED:
+        from nodeshot.core.layers.models import Layer
+        obj['layer'] = Layer.reference_cache.get(pk=values['layer']).slug
 
-@receiver(pre_delete, sender=Node)
-def node_deleted_handler(sender, **kwargs):
-    obj = kwargs['instance']
-    message = 'node "%s" has been deleted' % obj.name
-    send_message.delay(message)
+    return obj
+
+
+def get_meta(obj):
+    """ layer, status and bbox of a serialized node, used to deliver events only to the subscribed clients """
+    return {
+        'layer': obj.get('layer'),
+        'status': obj['status'],
+        'bbox': extent(obj['geometry'])
+    }
+
+
+# ------ NODE CREATED, UPDATED, DELETED ------ #
+
+tracker = EventTracker(Node, 'node', NODE_FIELDS, serialize_node, get_meta=get_meta, identity=['slug'])
+
+# ------ NODES SAVED IN BULK ------ #
+
+@receiver(nodes_bulk_saved)
+def nodes_bulk_saved_handler(sender, **kwargs):
+    # bulk operations don't send post_save, clients reload the affected area instead
+    # (while paused the nodes are added to the summary of the tracker)
+    summary = tracker.summary if tracker.summary is not None else EventSummary('node')
+    for action in ['created', 'updated']:
+        for node in kwargs[action]:
+            if node.is_published and node.access_level == ACCESS_LEVELS.get('public'):
+                summary.add(action, get_node_meta(node))
+    if summary and summary is not tracker.summary:
+        event, meta = summary.get_event()
+        publish(event, meta=meta)
+
+
+def get_node_meta(node):
+    """ like get_meta, reads the node instance without serializing it """
+    meta = {
+        'status': Status.reference_cache.get(pk=node.status_id).slug if node.status_id else None,
+        'bbox': list(node.geometry.extent) if node.geometry else None
+    }
+    if LAYERS_ENABLED:
+        from nodeshot.core.layers.models import Layer
+        meta['layer'] = Layer.reference_cache.get(pk=node.layer_id).slug
+    return meta
 
 
 # ------ DISCONNECT UTILITY ------ #
 
 def disconnect():
-    """ disconnect signals """
-    post_save.disconnect(node_created_handler, sender=Node)
-    node_status_changed.disconnect(node_status_changed_handler)
-    pre_delete.disconnect(node_deleted_handler, sender=Node)
+    """ changes are summarized in a single event until reconnect is called """
+    tracker.pause()
 
 
 def reconnect():
-    """ reconnect signals """
-    post_save.connect(node_created_handler, sender=Node)
-    node_status_changed.connect(node_status_changed_handler)
-    pre_delete.connect(node_deleted_handler, sender=Node)
+    """ publishes the summary of the changes done while disconnected """
+    tracker.resume()
 
 
 settings.NODESHOT['DISCONNECTABLE_SIGNALS'].append(
@@ -58,4 +91,4 @@ settings.NODESHOT['DISCONNECTABLE_SIGNALS'].append(
         'disconnect': disconnect,
         'reconnect': reconnect
     }
-)
\ No newline at end of file
+)
@@ -0,0 +1,197 @@
+"""
+replay buffers of websocket events
+
+Every event (see events.py) published through the websocket server receives a monotonic
+sequence number ("seq") and is stored in a bounded buffer of recent events, so that a client
+which reconnects with ?since=<seq>&epoch=<epoch> receives exactly the events it missed.
+
+The epoch identifies the sequence: it changes when the sequence restarts (eg: the server
+process using the memory buffer is restarted), clients receive it when they connect.
+If the epoch is different or the missed events are no longer in the buffer the client
+receives a "resync" event and has to reload the data.
+
+The buffer is configured in settings.NODESHOT['WEBSOCKETS']['REPLAY'], eg:
+
+    'REPLAY': {
+        'BACKEND': 'nodeshot.core.websockets.replay.RedisReplayBuffer',
+        'OPTIONS': { 'url': 'redis://localhost:6379/1', 'size': 5000 }
+    }
+
+Available backends:
+
+ * MemoryReplayBuffer (default): events are numbered and stored by the websocket server process,
+   each process has its own epoch, so with several server processes reconnecting clients
+   which land on a different process have to resync
+ * RedisReplayBuffer: events are numbered and stored by publishers, the sequence
+   is shared by every server process (requires the redis package)
+"""
+
+import uuid
+from collections import deque
+from importlib import import_module
+
+import simplejson as json
+
+from django.core.exceptions import ImproperlyConfigured
+from django.conf import settings
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+__all__ = [
+    'BaseReplayBuffer',
+    'MemoryReplayBuffer',
+    'RedisReplayBuffer',
+    'load_replay_buffer',
+    'get_replay_buffer',
+]
+
+
+# number of events kept by default
+REPLAY_SIZE = 1000
+DEFAULT_REPLAY = {
+    'BACKEND': 'nodeshot.core.websockets.replay.MemoryReplayBuffer',
+    'OPTIONS': {}
+}
+
+
+class BaseReplayBuffer(object):
+    """
+    Interface of replay buffers:
+
+     * append assigns the next sequence number to an event and stores it
+     * get_events returns the stored events ordered by sequence number
+
+    Shared buffers are written by publishers (tasks.send_message) and read by every
+    server process, the other ones are written and read by the server process.
+    """
+    shared = False
+
+    def __init__(self, size=REPLAY_SIZE, **options):
+        self.size = size
+        self.options = options
+
+    @property
+    def epoch(self):
+        raise NotImplementedError('replay buffers must implement epoch')
+
+    def append(self, event):
+        """ sets the seq key of event and stores it, returns event """
+        raise NotImplementedError('replay buffers must implement append')
+
+    def get_events(self):
+        raise NotImplementedError('replay buffers must implement get_events')
+
+    def last_seq(self):
+        """ sequence number of the last event, 0 if no event has been published yet """
+        raise NotImplementedError('replay buffers must implement last_seq')
+
+    def get_since(self, since, until):
+        """
+        returns the list of events whose sequence number is greater than since
+        and lower or equal to until, None if some of them are no longer available
+        (or if since is greater than until: the sequence restarted)
+        """
+        if since > until:
+            return None
+        if since == until:
+            return []
+        events = self.get_events()
+        if not events or events[0]['seq'] > since + 1:
+            return None
+        return [event for event in events if since < event['seq'] <= until]
+
+
+class MemoryReplayBuffer(BaseReplayBuffer):
+    """ ring buffer in the memory of the websocket server process """
+
+    def __init__(self, **options):
+        super(MemoryReplayBuffer, self).__init__(**options)
+        self._epoch = uuid.uuid4().hex
+        self._seq = 0
+        self._events = deque(maxlen=self.size)
+
+    @property
+    def epoch(self):
+        return self._epoch
+
+    def append(self, event):
+        self._seq += 1
+        event['seq'] = self._seq
+        self._events.append(event)
+        return event
+
+    def get_events(self):
+        return list(self._events)
+
+    def last_seq(self):
+        return self._seq
+
+
+class RedisReplayBuffer(BaseReplayBuffer):
+    """
+    sequence number and events stored in redis (INCR and a capped list)
+
+    :param url: redis url (defaults to redis://localhost:6379/0)
+    :param prefix: prefix of the redis keys (defaults to nodeshot.websockets.replay)
+    """
+    shared = True
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='nodeshot.websockets.replay', **options):
+        if redis is None:
+            raise ImproperlyConfigured('RedisReplayBuffer requires the redis package: pip install redis')
+        super(RedisReplayBuffer, self).__init__(**options)
+        self.client = redis.StrictRedis.from_url(url)
+        self.keys = dict([(key, '%s:%s' % (prefix, key)) for key in ['epoch', 'seq', 'events']])
+
+    @property
+    def epoch(self):
+        # the first process sets the epoch, a new one is generated if redis loses its data
+        self.client.setnx(self.keys['epoch'], uuid.uuid4().hex)
+        return self.client.get(self.keys['epoch'])
+
+    def append(self, event):
+        event['seq'] = self.client.incr(self.keys['seq'])
+        pipe = self.client.pipeline()
+        pipe.rpush(self.keys['events'], json.dumps(event))
+        pipe.ltrim(self.keys['events'], -self.size, -1)
+        pipe.execute()
+        return event
+
+    def get_events(self):
+        events = [json.loads(data) for data in self.client.lrange(self.keys['events'], 0, -1)]
+        # concurrent publishers might push events out of order
+        return sorted(events, key=lambda event: event['seq'])
+
+    def last_seq(self):
+        return int(self.client.get(self.keys['seq']) or 0)
+
+
+def load_replay_buffer(config):
+    """
+    returns a new instance of the replay buffer described by config
+
+    :param config: dictionary with BACKEND (python path of the class) and OPTIONS keys
+    """
+    module_path, class_name = config['BACKEND'].rsplit('.', 1)
+
+    try:
+        buffer_class = getattr(import_module(module_path), class_name)
+    except (ImportError, AttributeError):
+        raise ImproperlyConfigured('websocket replay buffer %s could not be imported' % config['BACKEND'])
+
+    return buffer_class(**config.get('OPTIONS', {}))
+
+
+_replay_buffer = None
+
+
+def get_replay_buffer():
+    """ returns the replay buffer of the current process, configured in settings """
+    global _replay_buffer
+    if _replay_buffer is None:
+        _replay_buffer = load_replay_buffer(settings.NODESHOT['WEBSOCKETS'].get('REPLAY', DEFAULT_REPLAY))
+    return _replay_buffer
@@ -1,13 +1,18 @@
-import os
-import time
 import simplejson as json
-from threading import Thread
 
 import tornado.web
 import tornado.ioloop
+import tornado.netutil
+import tornado.process
+import tornado.httpserver
+
+from django.db import connection
 
 from .handlers import WebSocketHandler
-from . import DOMAIN, ADDRESS, PORT, PUBLIC_PIPE, PRIVATE_PIPE  # contained in __init__.py
+from .brokers import get_broker
+from .events import EventBuffer
+from .replay import get_replay_buffer
+from . import DOMAIN, ADDRESS, PORT, PROCESSES  # contained in __init__.py
 
 
 application = tornado.web.Application([
@@ -15,77 +20,75 @@ application = tornado.web.Application([
 ])
 
 
-def public_broadcaster():
-    """
-    Thread which runs in parallel and constantly checks for new messages
-    in the public pipe and broadcasts them publicly to all connected clients.
-    """
-    while __websocket_server_running__:
-        pipein = open(PUBLIC_PIPE, 'r')
-        line = pipein.readline().replace('\n', '').replace('\r', '')
-        if line != '':
-            WebSocketHandler.broadcast(line)
-            print line
-            
-            remaining_lines = pipein.read()
-            pipein.close()
-            pipeout = open(PUBLIC_PIPE, 'w')
-            pipeout.write(remaining_lines)
-            pipeout.close()
-        else:
-            pipein.close()
-        
-        time.sleep(0.05)
+# coalesces the events of the same object (see events.py)
+event_buffer = EventBuffer(WebSocketHandler.broadcast_event)
+
 
-public_broadcaster_thread = Thread(target=public_broadcaster, args=[])
-public_broadcaster_thread.deamon = True
+def dispatch_event(event, meta=None):
+    # numbered here unless the publisher already did (see replay.py)
+    if 'seq' not in event:
+        WebSocketHandler.replay_buffer.append(event)
+    event_buffer.add(event, meta)
 
 
-def private_messenger():
+def dispatch(channel, message, meta=None):
     """
-    Thread which runs in parallel and constantly checks for new messages
-    in the private pipe and sends them to the specific client.
-    If client is not connected the message is discarded.
+    Called in the IOLoop for each message published through the broker:
+    public messages are broadcasted to the clients subscribed to them (see subscriptions.py),
+    events (dictionaries, see events.py), also when published in batches (see publisher.py),
+    are coalesced before being broadcasted,
+    private messages are sent to the specific client (discarded if not connected).
     """
-    while __websocket_server_running__:
-        pipein = open(PRIVATE_PIPE, 'r')
-        line = pipein.readline().replace('\n', '').replace('\r', '')
-        if line != '':
-            message = json.loads(line)
-            WebSocketHandler.send_private_message(user_id=message['user_id'],
-                                                  message=message)
-            print line
-            
-            remaining_lines = pipein.read()
-            pipein.close()
-            pipeout = open(PRIVATE_PIPE, 'w')
-            pipeout.write(remaining_lines)
-            pipeout.close()
-        else:
-            pipein.close()
-        
-        time.sleep(0.05)
+    if channel == 'private':
+        message = json.loads(message)
+        WebSocketHandler.send_private_message(user_id=message['user_id'],
+                                              message=message)
+    elif isinstance(message, dict) and message.get('type') == 'batch':
+        # events published together (see publisher.py)
+        for item in message['events']:
+            dispatch_event(item['event'], item['meta'])
+    elif isinstance(message, dict):
+        dispatch_event(message, meta)
+    else:
+        WebSocketHandler.broadcast(message, meta)
 
-private_messenger_thread = Thread(target=private_messenger, args=[])
-private_messenger_thread.deamon = True
 
+def start(processes=PROCESSES):
+    """
+    starts the websocket server
 
-def start():    
-    global __websocket_server_running__
-    __websocket_server_running__ = True
+    :param processes: number of server processes, 0 means one per CPU core;
+                      processes share the listening socket and each one subscribes to the broker,
+                      so every process receives every message and delivers it to its own clients
+    """
+    # bind before forking so that every process accepts connections on the same socket
+    sockets = tornado.netutil.bind_sockets(PORT, address=ADDRESS)
+    
+    if processes != 1:
+        # database connections and the IOLoop must not be shared with the child processes
+        connection.close()
+        print "\nStarting %s websocket server processes\n" % (processes or tornado.process.cpu_count())
+        # returns only in the child processes
+        tornado.process.fork_processes(processes)
     
-    application.listen(PORT, address=ADDRESS)
+    server = tornado.httpserver.HTTPServer(application)
+    server.add_sockets(sockets)
+    
+    # created after forking, each process has its own memory buffer
+    WebSocketHandler.replay_buffer = get_replay_buffer()
+    WebSocketHandler.delivered_seq = WebSocketHandler.replay_buffer.last_seq()
     websocktserver = tornado.ioloop.IOLoop.instance()
     
+    # messages are pushed into the IOLoop by the broker
+    broker = get_broker()
+    broker.subscribe(dispatch, websocktserver)
+    
     try:
         print "\nStarted Tornado Wesocket Server at ws://%s:%s\n" % (ADDRESS, PORT)
-        
-        public_broadcaster_thread.start()
-        private_messenger_thread.start()
         websocktserver.start()
     # on exit
     except (KeyboardInterrupt, SystemExit):
-        __websocket_server_running__ = False
         websocktserver.stop()
+        broker.close()
         
-        print "\nStopped Tornado Wesocket Server\n"
\ No newline at end of file
+        print "\nStopped Tornado Wesocket Server\n"
@@ -0,0 +1,174 @@
+"""
+topic subscriptions of websocket clients
+
+Clients can subscribe to layers, statuses and a bounding box by sending:
+
+    {"action": "subscribe", "layers": ["rome"], "statuses": ["active"], "bbox": [12.4, 41.8, 12.6, 42.0]}
+
+and receive only the events which match at least one of their topics
+(layer OR status OR bbox); {"action": "unsubscribe"} restores the delivery of every event.
+Clients which didn't subscribe receive every event, events without metadata are sent to every client.
+
+Subscribers are indexed by topic and bbox subscribers by the cells of a grid,
+so delivering an event costs a few dictionary lookups plus one operation per recipient.
+"""
+
+import math
+
+from django.conf import settings
+
+
+__all__ = [
+    'SubscriptionIndex',
+    'parse_subscription',
+]
+
+
+# size of the cells (degrees) of the grid which indexes bbox subscribers
+GRID_CELL_SIZE = settings.NODESHOT['WEBSOCKETS'].get('GRID_CELL_SIZE', 0.5)
+# bounding boxes covering more cells are checked for every event instead
+MAX_BBOX_CELLS = 256
+
+
+def _intersects(box, other):
+    return box[0] <= other[2] and other[0] <= box[2] and box[1] <= other[3] and other[1] <= box[3]
+
+
+def parse_subscription(data):
+    """
+    validates a subscribe message, returns a (layers, statuses, bbox) tuple
+
+    :raises ValueError: if data is not valid
+    """
+    layers = data.get('layers', [])
+    statuses = data.get('statuses', [])
+    bbox = data.get('bbox', None)
+
+    for value in [layers, statuses]:
+        if not isinstance(value, list) or not all(isinstance(item, basestring) for item in value):
+            raise ValueError('layers and statuses must be lists of slugs')
+
+    if bbox is not None:
+        try:
+            bbox = [float(coord) for coord in bbox]
+        except (TypeError, ValueError):
+            raise ValueError('bbox must be a list of numbers: [minx, miny, maxx, maxy]')
+        if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            raise ValueError('bbox must be a list of numbers: [minx, miny, maxx, maxy]')
+
+    if not layers and not statuses and bbox is None:
+        raise ValueError('subscribe requires at least one of layers, statuses or bbox')
+
+    return layers, statuses, bbox
+
+
+class SubscriptionIndex(object):
+    """ finds the clients interested in an event """
+
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        # clients which receive every event
+        self.unfiltered = set()
+        # client -> (topics, bbox, cells)
+        self.subscriptions = {}
+        # ('layer', slug) or ('status', slug) -> set of clients
+        self.topics = {}
+        # (column, row) -> set of clients
+        self.grid = {}
+        # clients whose bbox covers too many cells
+        self.large_bboxes = set()
+
+    def __len__(self):
+        return len(self.unfiltered) + len(self.subscriptions)
+
+    def _cells(self, box):
+        """ returns the list of cells which intersect box """
+        size = self.cell_size
+        columns = range(int(math.floor(box[0] / size)), int(math.floor(box[2] / size)) + 1)
+        rows = range(int(math.floor(box[1] / size)), int(math.floor(box[3] / size)) + 1)
+        if len(columns) * len(rows) > MAX_BBOX_CELLS:
+            return None
+        return [(column, row) for column in columns for row in rows]
+
+    def add(self, client):
+        """ new clients receive every event """
+        self.unfiltered.add(client)
+
+    def remove(self, client):
+        self.unsubscribe(client)
+        self.unfiltered.discard(client)
+
+    def subscribe(self, client, layers=(), statuses=(), bbox=None):
+        """ replaces the subscription of client """
+        self.unsubscribe(client)
+        self.unfiltered.discard(client)
+
+        topics = [('layer', slug) for slug in layers] + [('status', slug) for slug in statuses]
+        for topic in topics:
+            self.topics.setdefault(topic, set()).add(client)
+
+        cells = None
+        if bbox is not None:
+            cells = self._cells(bbox)
+            if cells is None:
+                self.large_bboxes.add(client)
+            else:
+                for cell in cells:
+                    self.grid.setdefault(cell, set()).add(client)
+
+        self.subscriptions[client] = (topics, bbox, cells)
+
+    def unsubscribe(self, client):
+        """ removes the subscription of client, which will receive every event """
+        if client not in self.subscriptions:
+            return
+
+        topics, bbox, cells = self.subscriptions.pop(client)
+
+        for topic in topics:
+            self.topics[topic].discard(client)
+            if not self.topics[topic]:
+                del self.topics[topic]
+
+        for cell in cells or []:
+            self.grid[cell].discard(client)
+            if not self.grid[cell]:
+                del self.grid[cell]
+
+        self.large_bboxes.discard(client)
+        self.unfiltered.add(client)
+
+    def all(self):
+        return self.unfiltered | set(self.subscriptions.keys())
+
+    def recipients(self, meta=None):
+        """
+        returns the set of clients interested in an event
+
+        :param meta: dictionary which might contain the "layer" and "status" slugs
+                     and the "bbox" (extent) of the event, None for global events;
+                     changes involving more positions, layers or statuses (eg: a node moved
+                     to another layer) specify lists of slugs and a list of extents
+        """
+        if not meta:
+            return self.all()
+
+        recipients = set(self.unfiltered)
+
+        for kind in ['layer', 'status']:
+            slugs = meta.get(kind)
+            for slug in slugs if isinstance(slugs, list) else [slugs]:
+                recipients |= self.topics.get((kind, slug), set())
+
+        extents = meta.get('bbox')
+        if extents and not isinstance(extents[0], list):
+            extents = [extents]
+        for extent in extents or []:
+            candidates = set(self.large_bboxes)
+            for cell in self._cells(extent) or self.grid.keys():
+                candidates |= self.grid.get(cell, set())
+            for client in candidates - recipients:
+                if _intersects(self.subscriptions[client][1], extent):
+                    recipients.add(client)
+
+        return recipients
@@ -1,22 +1,15 @@
-import os
-from django.conf import settings
 from celery import task
 
+from .publisher import send
+
 
 @task
-def send_message(message, pipe='public'):
+def send_message(message, pipe='public', meta=None):
     """
-    writes message to pipe
+    publishes message on the public or private channel of the websocket server,
+    meta (layer, status and bbox of the event) restricts public messages to the subscribed clients
     """
     if pipe not in ['public', 'private']:
-        raise ArgumentError('pipe argument can be only "public" or "private"')
-    else:
-        pipe = pipe.upper()
-    
-    pipe_path = settings.NODESHOT['WEBSOCKETS']['%s_PIPE' % pipe]
-    
-    # create file if it doesn't exist, append contents
-    pipeout = open(pipe_path, 'a')
+        raise ValueError('pipe argument can be only "public" or "private"')
     
-    pipeout.write('%s\n' % message)
-    pipeout.close()
\ No newline at end of file
+    send(message, pipe, meta)
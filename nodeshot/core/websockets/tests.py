@@ -1,9 +1,27 @@
+import os
+import time
+import simplejson as json
+import tempfile
+
 from django.conf import settings
 
 from nodeshot.core.base.tests import user_fixtures, BaseTestCase
-from nodeshot.core.nodes.models import Node
+from nodeshot.core.nodes.models import Node, Status
 
 from django.core import management
+from django.core.signals import request_started, request_finished, got_request_exception
+
+from tornado.ioloop import IOLoop
+
+from . import brokers
+from .brokers import load_broker
+from .brokers.local import UnixSocketBroker, InProcessBroker
+from .subscriptions import SubscriptionIndex, parse_subscription
+from .handlers import WebSocketHandler
+from .events import make_event, EventBuffer
+from .registrars.nodes import tracker, serialize_node
+from .replay import MemoryReplayBuffer
+from .publisher import publish, batch, _chunks
 
 
 class TestWebsockets(BaseTestCase):
@@ -16,7 +34,311 @@ class TestWebsockets(BaseTestCase):
         user_fixtures,
         'test_layers.json',
         'test_status.json',
+        'test_nodes.json',
     ]
     
     def test_start_websocket_server(self):
-        self.assertTrue(False, 'TODO')
\ No newline at end of file
+        self.assertTrue(False, 'TODO')
+    
+    def receive(self, broker, publish, count=1):
+        """ subscribes broker in a new IOLoop, calls publish and returns the received messages """
+        io_loop = IOLoop()
+        received = []
+        
+        def callback(channel, message, meta=None):
+            received.append((channel, message))
+            if len(received) == count:
+                io_loop.stop()
+        
+        broker.subscribe(callback, io_loop)
+        io_loop.add_callback(publish)
+        # don't hang if messages are lost
+        io_loop.add_timeout(time.time() + 2, io_loop.stop)
+        io_loop.start()
+        broker.close()
+        io_loop.close()
+        return received
+    
+    def test_unix_socket_broker(self):
+        path = os.path.join(tempfile.gettempdir(), 'nodeshot.websockets.test.sock')
+        broker = UnixSocketBroker(path=path)
+        
+        # no server listening: message is discarded
+        self.assertFalse(UnixSocketBroker(path=path).publish('public', 'lost'))
+        
+        def publish():
+            publisher = UnixSocketBroker(path=path)
+            for i in range(0, 50):
+                publisher.publish('public', 'message %d' % i)
+            publisher.publish('private', '{"user_id": "1"}')
+        
+        received = self.receive(broker, publish, count=51)
+        # nothing is lost and order is preserved
+        self.assertEqual(received[:50], [('public', 'message %d' % i) for i in range(0, 50)])
+        self.assertEqual(received[50], ('private', '{"user_id": "1"}'))
+        self.assertFalse(os.path.exists('%s.%d' % (path, os.getpid())))
+    
+    def test_in_process_broker(self):
+        broker = load_broker({ 'BACKEND': 'nodeshot.core.websockets.brokers.local.InProcessBroker' })
+        self.assertTrue(isinstance(broker, InProcessBroker))
+        
+        received = self.receive(broker, lambda: InProcessBroker().publish('public', 'hello'))
+        self.assertEqual(received, [('public', 'hello')])
+        self.assertEqual(InProcessBroker.subscribers, [])
+    
+    def test_subscription_index(self):
+        index = SubscriptionIndex(cell_size=1.0)
+        everything, rome, active, bbox, world = [object() for i in range(0, 5)]
+        
+        for client in [everything, rome, active, bbox, world]:
+            index.add(client)
+        index.subscribe(rome, layers=['rome'])
+        index.subscribe(active, statuses=['active'])
+        index.subscribe(bbox, bbox=[12.4, 41.8, 12.6, 42.0])
+        # covers too many cells to be indexed in the grid
+        index.subscribe(world, bbox=[-180, -90, 180, 90])
+        
+        self.assertEqual(len(index), 5)
+        # events without metadata are sent to everybody
+        self.assertEqual(index.recipients(), set([everything, rome, active, bbox, world]))
+        self.assertEqual(index.recipients({ 'layer': 'rome', 'status': 'potenziale', 'bbox': [12.58, 41.87, 12.58, 41.87] }),
+                         set([everything, rome, bbox, world]))
+        self.assertEqual(index.recipients({ 'layer': 'pisa', 'status': 'active', 'bbox': [10.4, 43.7, 10.4, 43.7] }),
+                         set([everything, active, world]))
+        # same cell, outside the bbox
+        self.assertEqual(index.recipients({ 'layer': 'pisa', 'bbox': [12.9, 41.9, 12.9, 41.9] }),
+                         set([everything, world]))
+        
+        index.unsubscribe(rome)
+        index.remove(bbox)
+        self.assertEqual(index.recipients({ 'layer': 'pisa', 'bbox': [12.5, 41.9, 12.5, 41.9] }),
+                         set([everything, rome, world]))
+        self.assertEqual(index.grid, {})
+        self.assertEqual(index.topics, { ('status', 'active'): set([active]) })
+        
+        self.assertEqual(parse_subscription({ 'layers': ['rome'], 'bbox': ['1', 2, 3, 4] }),
+                         (['rome'], [], [1.0, 2.0, 3.0, 4.0]))
+        for data in [{}, { 'layers': 'rome' }, { 'bbox': [3, 2, 1, 4] }, { 'bbox': 'a' }]:
+            with self.assertRaises(ValueError):
+                parse_subscription(data)
+    
+    def test_private_channel_multiple_sockets(self):
+        received = []
+        
+        def connect(user_id=None):
+            # handler which is not bound to a real connection
+            client = WebSocketHandler.__new__(WebSocketHandler)
+            client.send_message = lambda message: received.append((client, message))
+            client.add_client(user_id)
+            return client
+        
+        first_tab = connect('1')
+        second_tab = connect('1')
+        anonymous = connect()
+        self.assertEqual(WebSocketHandler.channels['private']['1'], set([first_tab, second_tab]))
+        self.assertEqual(WebSocketHandler.count_clients(), 3)
+        self.assertEqual(len(WebSocketHandler.get_clients()), 3)
+        
+        # message is delivered to both tabs
+        self.assertTrue(WebSocketHandler.send_private_message('1', 'hello'))
+        self.assertEqual(set(received), set([(first_tab, 'hello'), (second_tab, 'hello')]))
+        # user connected to another server process
+        self.assertFalse(WebSocketHandler.send_private_message('2', 'hello'))
+        
+        first_tab.remove_client()
+        self.assertEqual(WebSocketHandler.channels['private']['1'], set([second_tab]))
+        second_tab.remove_client()
+        anonymous.remove_client()
+        self.assertEqual(WebSocketHandler.channels, { 'public': {}, 'private': {} })
+        self.assertEqual(WebSocketHandler.count_clients(), 0)
+    
+    def test_node_events(self):
+        node = Node.objects.get(slug='fusolab')
+        obj = serialize_node(tracker.get_values(node))
+        self.assertEqual(obj['status'], 'attivo')
+        self.assertEqual(obj['layer'], 'rome')
+        self.assertEqual(obj['geometry']['type'], 'Point')
+        # not visible to anonymous users
+        self.assertIsNone(serialize_node(tracker.get_values(Node.objects.get(slug='hidden-rome'))))
+        
+        self.assertIsNone(tracker.diff(node.pk, obj, serialize_node(tracker.get_values(node))))
+        
+        node.status = Status.objects.get(slug='potenziale')
+        node.elev = 10
+        event = tracker.diff(node.pk, obj, serialize_node(tracker.get_values(node)))
+        self.assertEqual(event['version'], 1)
+        self.assertEqual(event['type'], 'node.status_changed')
+        self.assertEqual(event['id'], node.pk)
+        self.assertEqual(event['slug'], 'fusolab')
+        self.assertEqual(event['changes'], { 'status': 'potenziale', 'elev': 10 })
+        self.assertEqual(event['previous'], { 'status': 'attivo', 'elev': obj['elev'] })
+        
+        node.is_published = False
+        event = tracker.diff(node.pk, obj, serialize_node(tracker.get_values(node)))
+        self.assertEqual(event['type'], 'node.deleted')
+        self.assertEqual(event['changes'], {})
+        
+        event = tracker.diff(node.pk, None, obj)
+        self.assertEqual(event['type'], 'node.created')
+        self.assertEqual(event['changes'], obj)
+    
+    def test_event_coalescing(self):
+        io_loop = IOLoop()
+        delivered = []
+        buffer = EventBuffer(lambda event, meta: delivered.append((event, meta)), window=0.1)
+        
+        def publish():
+            # created and then changed
+            buffer.add(make_event('node', 'created', 1, changes={ 'name': 'a', 'status': 'potenziale' }, slug='a'),
+                       { 'status': 'potenziale' })
+            buffer.add(make_event('node', 'status_changed', 1, changes={ 'status': 'attivo' }, previous={ 'status': 'potenziale' }, slug='a'),
+                       { 'status': 'attivo' })
+            # changed and then restored
+            buffer.add(make_event('node', 'updated', 2, changes={ 'name': 'c' }, previous={ 'name': 'b' }, slug='b'))
+            buffer.add(make_event('node', 'updated', 2, changes={ 'name': 'b' }, previous={ 'name': 'c' }, slug='b'))
+            # changed twice
+            buffer.add(make_event('node', 'updated', 3, changes={ 'elev': 2 }, previous={ 'elev': 1 }, slug='d'),
+                       { 'layer': 'rome', 'bbox': [1, 1, 1, 1] })
+            buffer.add(make_event('node', 'status_changed', 3, changes={ 'elev': 3, 'status': 'attivo' }, previous={ 'elev': 2, 'status': 'potenziale' }, slug='d'),
+                       { 'layer': 'rome', 'bbox': [2, 2, 2, 2] })
+            # created and then deleted
+            buffer.add(make_event('link', 'created', 1, changes={ 'status': 'active' }))
+            buffer.add(make_event('link', 'deleted', 1))
+            # not coalesced
+            buffer.add({ 'version': 1, 'type': 'node.bulk_saved', 'created': 1, 'updated': 0 })
+        
+        io_loop.add_callback(publish)
+        io_loop.add_timeout(time.time() + 1, io_loop.stop)
+        io_loop.start()
+        io_loop.close()
+        
+        self.assertEqual(len(delivered), 3)
+        self.assertEqual(delivered[0], ({ 'version': 1, 'type': 'node.bulk_saved', 'created': 1, 'updated': 0 }, None))
+        
+        event, meta = delivered[1]
+        self.assertEqual(event['type'], 'node.created')
+        self.assertEqual(event['changes'], { 'name': 'a', 'status': 'attivo' })
+        self.assertEqual(meta, { 'status': ['potenziale', 'attivo'] })
+        
+        event, meta = delivered[2]
+        self.assertEqual(event['type'], 'node.status_changed')
+        self.assertEqual(event['slug'], 'd')
+        self.assertEqual(event['changes'], { 'elev': 3, 'status': 'attivo' })
+        self.assertEqual(event['previous'], { 'elev': 1, 'status': 'potenziale' })
+        self.assertEqual(meta, { 'layer': ['rome'], 'bbox': [[1, 1, 1, 1], [2, 2, 2, 2]] })
+    
+    def test_replay(self):
+        replay_buffer = MemoryReplayBuffer(size=5)
+        for i in range(0, 8):
+            event = replay_buffer.append(make_event('node', 'updated', i))
+        self.assertEqual(event['seq'], 8)
+        self.assertEqual(replay_buffer.last_seq(), 8)
+        self.assertEqual([event['seq'] for event in replay_buffer.get_since(5, 8)], [6, 7, 8])
+        # events not delivered yet are excluded
+        self.assertEqual([event['seq'] for event in replay_buffer.get_since(3, 7)], [4, 5, 6, 7])
+        self.assertEqual(replay_buffer.get_since(8, 8), [])
+        # too old
+        self.assertIsNone(replay_buffer.get_since(2, 8))
+        # sequence restarted
+        self.assertIsNone(replay_buffer.get_since(10, 8))
+        
+        WebSocketHandler.replay_buffer = replay_buffer
+        WebSocketHandler.delivered_seq = 8
+        received = []
+        client = WebSocketHandler.__new__(WebSocketHandler)
+        client.send_message = lambda message: received.append(json.loads(message))
+        
+        client.replay('6', replay_buffer.epoch)
+        self.assertEqual([event['seq'] for event in received], [7, 8])
+        
+        for since, epoch in [('1', None), ('7', 'previous'), ('a', None)]:
+            received = []
+            client.replay(since, epoch)
+            self.assertEqual(received, [{ 'version': 1, 'type': 'resync', 'epoch': replay_buffer.epoch, 'seq': 8 }])
+        
+        WebSocketHandler.replay_buffer = None
+        WebSocketHandler.delivered_seq = 0
+    
+    def test_batch_publisher(self):
+        previous_broker = brokers._broker
+        brokers._broker = InProcessBroker()
+        
+        def publish_batch():
+            with batch():
+                publish(make_event('node', 'created', 1, changes={ 'name': 'a' }), meta={ 'layer': 'rome' })
+                # nested blocks are part of the outer batch
+                with batch():
+                    publish(make_event('node', 'updated', 1, changes={ 'name': 'b' }, previous={ 'name': 'a' }), meta={ 'layer': 'rome' })
+                publish(make_event('node', 'created', 2, changes={ 'name': 'c' }))
+                # not buffered
+                publish('{"user_id": "1"}', pipe='private')
+            # discarded
+            try:
+                with batch():
+                    publish(make_event('node', 'created', 3))
+                    raise ValueError()
+            except ValueError:
+                pass
+        
+        received = self.receive(InProcessBroker(), publish_batch, count=2)
+        self.assertEqual(received[0], ('private', '{"user_id": "1"}'))
+        channel, message = received[1]
+        self.assertEqual(message['type'], 'batch')
+        self.assertEqual([item['event']['changes'] for item in message['events']], [{ 'name': 'b' }, { 'name': 'c' }])
+        self.assertEqual(message['events'][0]['event']['type'], 'node.created')
+        self.assertEqual(message['events'][0]['meta'], { 'layer': ['rome'] })
+        
+        # events are summarized while signals are paused
+        node = Node.objects.get(slug='fusolab')
+        
+        def paused():
+            tracker.pause()
+            node.elev = 20
+            node.save()
+            node.name = 'fusolab2'
+            node.save()
+            tracker.resume()
+        
+        received = self.receive(InProcessBroker(), paused)
+        event = received[0][1]
+        self.assertEqual(event['type'], 'node.bulk_saved')
+        self.assertEqual((event['created'], event['updated'], event['deleted']), (0, 2, 0))
+        self.assertEqual(event['layers'], ['rome'])
+        self.assertEqual(event['statuses'], ['attivo'])
+        self.assertEqual(event['bbox'], list(node.geometry.extent))
+        
+        # events of requests which raise an exception are discarded
+        def failed_request():
+            request_started.send(sender=None)
+            publish(make_event('node', 'created', 4))
+            got_request_exception.send(sender=None, request=None)
+            request_finished.send(sender=None)
+            publish(make_event('node', 'created', 5))
+        
+        received = self.receive(InProcessBroker(), failed_request)
+        brokers._broker = previous_broker
+        self.assertEqual([message['id'] for channel, message in received], [5])
+        
+        items = [{ 'event': make_event('node', 'created', i) } for i in range(0, 5)]
+        self.assertEqual([len(chunk) for chunk in _chunks(items)], [5])
+        size = len(json.dumps(items[0]))
+        self.assertEqual([len(chunk) for chunk in _chunks(items, max_size=size * 2)], [2, 2, 1])
+    
+    def test_publishing_errors(self):
+        """ broker errors are logged, saving objects doesn't fail """
+        class BrokenBroker(InProcessBroker):
+            def publish(self, *args, **kwargs):
+                raise IOError('broker unavailable')
+        
+        previous_broker = brokers._broker
+        brokers._broker = BrokenBroker()
+        try:
+            node = Node.objects.get(slug='fusolab')
+            node.name = 'fusolab2'
+            node.save()
+            with batch():
+                node.name = 'fusolab3'
+                node.save()
+        finally:
+            brokers._broker = previous_broker
+        self.assertEqual(Node.objects.get(slug='fusolab').name, 'fusolab3')
@@ -381,6 +381,15 @@ choose (enter the number of) one of the following layers:
         
         saved_nodes = []
         
+        if LAYER_APP_INSTALLED:
+            from nodeshot.core.layers.resolver import resolver
+            # layers which contain each old node, resolved in memory in a single pass
+            points = [Point(old_node.lng, old_node.lat) for old_node in self.old_nodes]
+            old_nodes_layers = dict(zip(
+                [old_node.id for old_node in self.old_nodes],
+                resolver.layers_containing_many(points)
+            ))
+        
         # loop over all old node and create new nodes
         for old_node in self.old_nodes:
             # if this old node is unconfirmed skip to next cycle
@@ -402,7 +411,7 @@ choose (enter the number of) one of the following layers:
             })
             
             if LAYER_APP_INSTALLED:
-                intersecting_layers = node.intersecting_layers
+                intersecting_layers = old_nodes_layers[old_node.id]
                 # if more than one intersecting layer
                 if len(intersecting_layers) > 1:
                     # prompt user
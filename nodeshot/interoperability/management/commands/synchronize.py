@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand, CommandError
+from django.core import management
 from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
 from django.db.models import Q
 
@@ -92,6 +93,9 @@ class Command(BaseCommand):
         else:
             self.verbose('going to process %d layers...' % len(layers))
         
+        # slugs of the layers which have been processed
+        processed = []
+        
         # loop over
         for layer in layers:
             # retrieve interop class if available
@@ -129,5 +133,11 @@ class Command(BaseCommand):
         
             for message in messages:
                 self.stdout.write('%s\n\r' % message)
+            
+            processed.append(layer.slug)
+        
+        # cache the updated GeoJSON of the processed layers
+        if processed:
+            management.call_command('warm_geojson_cache', *processed)
         
         self.stdout.write('\r\n')
\ No newline at end of file
@@ -18,7 +18,7 @@ __all__ = ['LayerExternal', 'NodeExternal']
 
 # ------ patch LayerNodesList view to support external layers ------ #
 
-from nodeshot.core.layers.views import LayerNodesList
+from nodeshot.core.layers.views import LayerNodesList, LayerNodesGeoJSONList
 
 def get_nodes(self, request, *args, **kwargs):
     if self.layer.is_external and hasattr(self.layer.external, 'get_nodes'):
@@ -26,4 +26,35 @@ def get_nodes(self, request, *args, **kwargs):
     else:
         return (self.list(request, *args, **kwargs)).data
 
-LayerNodesList.get_nodes = get_nodes
\ No newline at end of file
+LayerNodesList.get_nodes = get_nodes
+
+
+# nodes of external layers which are retrieved on the fly must not be cached, streamed nor validated
+_is_cacheable = LayerNodesGeoJSONList.is_cacheable
+_is_streamable = LayerNodesList.is_streamable
+_is_conditional = LayerNodesList.is_conditional
+
+def is_cacheable(self, request):
+    self.get_layer()
+    if self.layer.is_external and hasattr(self.layer.external, 'get_nodes'):
+        return False
+    else:
+        return _is_cacheable(self, request)
+
+def is_streamable(self, request):
+    self.get_layer()
+    if self.layer.is_external and hasattr(self.layer.external, 'get_nodes'):
+        return False
+    else:
+        return _is_streamable(self, request)
+
+def is_conditional(self, request):
+    self.get_layer()
+    if self.layer.is_external and hasattr(self.layer.external, 'get_nodes'):
+        return False
+    else:
+        return _is_conditional(self, request)
+
+LayerNodesGeoJSONList.is_cacheable = is_cacheable
+LayerNodesList.is_streamable = is_streamable
+LayerNodesList.is_conditional = is_conditional
\ No newline at end of file
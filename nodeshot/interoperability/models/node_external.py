@@ -44,6 +44,7 @@ class NodeExternal(models.Model):
 
 from django.dispatch import receiver
 from django.db.models.signals import pre_delete, post_save
+from nodeshot.core.nodes.signals import nodes_bulk_saved
 
 from ..tasks import push_changes_to_external_layers
 
@@ -61,6 +62,17 @@ def save_external_nodes(sender, **kwargs):
     push_changes_to_external_layers.delay(node=node, external_layer=node.layer.external, operation=operation)
 
 
+@receiver(nodes_bulk_saved)
+def save_bulk_external_nodes(sender, **kwargs):
+    """ same as save_external_nodes for nodes saved in bulk """
+    for operation, nodes in (('add', kwargs['created']), ('change', kwargs['updated'])):
+        for node in nodes:
+            if node.layer.is_external is False or not hasattr(node.layer, 'external') or node.layer.external.interoperability is None:
+                continue
+            
+            push_changes_to_external_layers.delay(node=node, external_layer=node.layer.external, operation=operation)
+
+
 @receiver(pre_delete, sender=Node)
 def delete_external_nodes(sender, **kwargs):
     """ sync by deleting nodes from external layers when needed """
@@ -26,4 +26,46 @@ ExtensibleNodeSerializer.add_relationship(**{
     'name': 'links',
     'view_name': 'api_node_links',
     'lookup_field': 'slug'
-})
\ No newline at end of file
+})
+
+
+# ------ Conditional GET ------ #
+
+from nodeshot.core.base.conditional import track_changes
+
+track_changes(Link)
+
+
+# ------ Invalidate cached vector tiles ------ #
+
+from django.conf import settings
+
+if 'nodeshot.core.layers' in settings.INSTALLED_APPS:
+    from django.dispatch import receiver
+    from django.db.models.signals import pre_save, post_save, pre_delete
+
+    from nodeshot.core.base.previous import track_previous_values, get_previous_values
+    from nodeshot.core.nodes.models import Node
+    from nodeshot.core.layers import tiles
+
+    def get_layer_id(node_id):
+        """ links belong to the layer of their first node """
+        layer_ids = Node.objects.filter(pk=node_id).values_list('layer_id', flat=True)
+        return layer_ids[0] if node_id and layer_ids else None
+
+    track_previous_values(Link, ['line', 'node_a'])
+
+    @receiver(pre_save, sender=Link)
+    def invalidate_previous_link_tiles(sender, **kwargs):
+        """ the tiles of the previous position of a moved link must be invalidated """
+        link = kwargs['instance']
+        previous = get_previous_values(link)
+        if previous is not None and (previous['line'] != link.line or previous['node_a'] != link.node_a_id):
+            tiles.invalidate_geometry(previous['line'], get_layer_id(previous['node_a']))
+
+    @receiver(post_save, sender=Link)
+    @receiver(pre_delete, sender=Link)
+    def invalidate_link_tiles(sender, **kwargs):
+        link = kwargs['instance']
+        if link.line is not None:
+            tiles.invalidate_geometry(link.line, get_layer_id(link.node_a_id))
@@ -71,6 +71,8 @@ class Link(BaseAccessLevel):
     
     class Meta:
         app_label = 'links'
+        # used by cursor pagination
+        index_together = (('updated', 'id'),)
     
     def __unicode__(self):
         return _(u'%s <> %s') % (self.node_a_name, self.node_b_name)
@@ -2,10 +2,9 @@ from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
 
 from rest_framework import pagination, serializers
-from rest_framework.reverse import reverse
 from rest_framework_gis import serializers as gis_serializers
 
-from nodeshot.core.base.serializers import DynamicRelationshipsMixin
+from nodeshot.core.base.serializers import DynamicRelationshipsMixin, HyperlinkedIdentityField
 
 from .models import *
 
@@ -23,7 +22,7 @@ class LinkListSerializer(gis_serializers.GeoModelSerializer):
     """ location serializer  """
     
     quality = serializers.Field(source='quality')
-    details = serializers.HyperlinkedIdentityField(view_name='api_link_details')
+    details = HyperlinkedIdentityField(view_name='api_link_details')
     
     class Meta:
         model = Link
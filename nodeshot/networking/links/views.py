@@ -5,21 +5,22 @@ from django.conf import settings
 
 from rest_framework import permissions, authentication, generics
 
-from nodeshot.core.base.mixins import ACLMixin, CustomDataMixin
+from nodeshot.core.base.mixins import ACLMixin, CustomDataMixin, StreamingListMixin, CursorPaginationMixin, ConditionalGetMixin
 from nodeshot.core.nodes.models import Node
 
 from .serializers import *
 from .models import *
 
 
-class LinkList(ACLMixin, generics.ListAPIView):
+class LinkList(ConditionalGetMixin, ACLMixin, StreamingListMixin, CursorPaginationMixin, generics.ListAPIView):
     """
     Retrieve link list according to user access level
     
     Parameters:
     
      * `limit=<n>`: specify number of items per page (defaults to 40)
-     * `limit=0`: turns off pagination
+     * `limit=0`: turns off pagination (the list is streamed)
+     * `cursor`: turns on cursor pagination (see the `next` link), empty for the first page, no count is returned
     """
     authentication_classes = (authentication.SessionAuthentication,)
     queryset = Link.objects.all()
@@ -31,7 +32,7 @@ class LinkList(ACLMixin, generics.ListAPIView):
 link_list = LinkList.as_view()
 
 
-class LinkGeoJSONList(ACLMixin, generics.ListAPIView):
+class LinkGeoJSONList(ACLMixin, StreamingListMixin, generics.ListAPIView):
     """
     Retrieve link list in GeoJSON format
     """
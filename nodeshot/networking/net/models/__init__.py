@@ -33,6 +33,23 @@ __all__ = [
 ]
 
 
+# ------ Search ------ #
+
+from nodeshot.core.base.search import SearchBackend
+
+Device.search_backend = SearchBackend(Device,
+    fields=[('name', 'A'), ('description', 'C')],
+    trigram_fields=['name']
+)
+
+
+# ------ Conditional GET ------ #
+
+from nodeshot.core.base.conditional import track_changes
+
+track_changes(Device)
+
+
 # ------ Add relationship to ExtensibleNodeSerializer ------ #
 
 from nodeshot.core.nodes.base import ExtensibleNodeSerializer
@@ -60,6 +60,8 @@ class Device(BaseAccessLevel):
     
     class Meta:
         app_label = 'net'
+        # used by cursor pagination
+        index_together = (('updated', 'id'),)
         
     def __unicode__(self):
         return '%s' % self.name
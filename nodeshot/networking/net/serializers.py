@@ -3,9 +3,11 @@ from django.utils.translation import ugettext_lazy as _
 from django.core.exceptions import ValidationError
 
 from rest_framework import pagination, serializers
-from rest_framework.reverse import reverse
 from rest_framework_gis import serializers as gis_serializers
 
+from nodeshot.core.base.reverse import reverse
+from nodeshot.core.base.serializers import HyperlinkedIdentityField
+
 from .models import *
 from .models.choices import INTERFACE_TYPES
 from .fields import MacAddressField, IPAddressField, IPNetworkField
@@ -61,7 +63,7 @@ class DeviceListSerializer(gis_serializers.GeoModelSerializer):
     node = serializers.Field(source='node.slug')
     type = serializers.WritableField(source='get_type_display', label=_('type'))
     status = serializers.Field(source='get_status_display')
-    details = serializers.HyperlinkedIdentityField(view_name='api_device_details')
+    details = HyperlinkedIdentityField(view_name='api_device_details')
     
     class Meta:
         model = Device
@@ -85,19 +87,19 @@ class DeviceDetailSerializer(DeviceListSerializer):
     routing_protocols_named = serializers.RelatedField(source='routing_protocols', many=True)
     
     ethernet = serializers.SerializerMethodField('get_ethernet_interfaces')
-    ethernet_url = serializers.HyperlinkedIdentityField(view_name='api_device_ethernet')
+    ethernet_url = HyperlinkedIdentityField(view_name='api_device_ethernet')
     
     wireless = serializers.SerializerMethodField('get_wireless_interfaces')
-    wireless_url = serializers.HyperlinkedIdentityField(view_name='api_device_wireless')
+    wireless_url = HyperlinkedIdentityField(view_name='api_device_wireless')
     
     bridge = serializers.SerializerMethodField('get_bridge_interfaces')
-    bridge_url = serializers.HyperlinkedIdentityField(view_name='api_device_bridge')
+    bridge_url = HyperlinkedIdentityField(view_name='api_device_bridge')
     
     tunnel = serializers.SerializerMethodField('get_tunnel_interfaces')
-    tunnel_url = serializers.HyperlinkedIdentityField(view_name='api_device_tunnel')
+    tunnel_url = HyperlinkedIdentityField(view_name='api_device_tunnel')
     
     vlan = serializers.SerializerMethodField('get_vlan_interfaces')
-    vlan_url = serializers.HyperlinkedIdentityField(view_name='api_device_vlan')
+    vlan_url = HyperlinkedIdentityField(view_name='api_device_vlan')
     
     if HSTORE_ENABLED:
         data = HStoreDictionaryField(
@@ -171,7 +173,7 @@ class DeviceAddSerializer(NodeDeviceListSerializer):
     """ Serializer for Device Creation """
     node = serializers.WritableField(source='node_id')
     type = serializers.WritableField(source='type')
-    details = serializers.HyperlinkedIdentityField(view_name='api_device_details') 
+    details = HyperlinkedIdentityField(view_name='api_device_details') 
 
 
 class PaginatedDeviceSerializer(pagination.PaginationSerializer):
@@ -197,7 +199,7 @@ class InterfaceSerializer(serializers.ModelSerializer):
     rx_rate = serializers.Field()
     
     ip = serializers.SerializerMethodField('get_ip_addresses')
-    ip_url = serializers.HyperlinkedIdentityField(view_name='api_interface_ip')
+    ip_url = HyperlinkedIdentityField(view_name='api_interface_ip')
     
     if HSTORE_ENABLED:
         data = HStoreDictionaryField(
@@ -233,7 +235,7 @@ class EthernetSerializer(InterfaceSerializer):
 
 
 class EthernetDetailSerializer(EthernetSerializer):
-    details = serializers.HyperlinkedIdentityField(view_name='api_ethernet_details')
+    details = HyperlinkedIdentityField(view_name='api_ethernet_details')
     
     class Meta:
         model = Ethernet
@@ -266,7 +268,7 @@ class WirelessSerializer(InterfaceSerializer):
 
 
 class WirelessDetailSerializer(WirelessSerializer):
-    details = serializers.HyperlinkedIdentityField(view_name='api_wireless_details')
+    details = HyperlinkedIdentityField(view_name='api_wireless_details')
     
     class Meta:
         model = Wireless
@@ -358,7 +360,7 @@ class BridgeSerializer(InterfaceSerializer):
 
 
 class BridgeDetailSerializer(BridgeSerializer):
-    details = serializers.HyperlinkedIdentityField(view_name='api_bridge_details')
+    details = HyperlinkedIdentityField(view_name='api_bridge_details')
     
     class Meta:
         model = Bridge
@@ -382,7 +384,7 @@ class TunnelSerializer(InterfaceSerializer):
 
 
 class TunnelDetailSerializer(TunnelSerializer):
-    details = serializers.HyperlinkedIdentityField(view_name='api_tunnel_details')
+    details = HyperlinkedIdentityField(view_name='api_tunnel_details')
     
     class Meta:
         model = Tunnel
@@ -404,7 +406,7 @@ class VlanSerializer(InterfaceSerializer):
 
 
 class VlanDetailSerializer(VlanSerializer):
-    details = serializers.HyperlinkedIdentityField(view_name='api_vlan_details')
+    details = HyperlinkedIdentityField(view_name='api_vlan_details')
     
     class Meta:
         model = Vlan
@@ -439,7 +441,7 @@ class IpAddSerializer(IpSerializer):
 
 
 class IpDetailSerializer(IpSerializer):
-    details = serializers.HyperlinkedIdentityField(view_name='api_ip_details')
+    details = HyperlinkedIdentityField(view_name='api_ip_details')
     
     class Meta:
         model = Ip
@@ -3,12 +3,11 @@ from django.utils.translation import ugettext_lazy as _
 #from django.utils.decorators import method_decorator
 #from django.views.decorators.cache import cache_page
 from django.conf import settings
-from django.db.models import Q
 
 from rest_framework import permissions, authentication, generics
 from rest_framework.response import Response
 
-from nodeshot.core.base.mixins import ACLMixin, CustomDataMixin
+from nodeshot.core.base.mixins import ACLMixin, CustomDataMixin, StreamingListMixin, CursorPaginationMixin, ConditionalGetMixin
 from nodeshot.core.nodes.models import Node
 
 from .permissions import IsOwnerOrReadOnly
@@ -19,15 +18,16 @@ from .models import *
 # ------ DEVICES ------ #
 
 
-class DeviceList(ACLMixin, generics.ListAPIView):
+class DeviceList(ConditionalGetMixin, ACLMixin, StreamingListMixin, CursorPaginationMixin, generics.ListAPIView):
     """
     Retrieve device list according to user access level
     
     Parameters:
     
-     * `search=<word>`: search <word> in name, slug, description and address of nodes
+     * `search=<words>`: search <words> in name and description of devices (ordered by relevance)
      * `limit=<n>`: specify number of items per page (defaults to 40)
-     * `limit=0`: turns off pagination
+     * `limit=0`: turns off pagination (the list is streamed)
+     * `cursor`: turns on cursor pagination (see the `next` link), empty for the first page, no count is returned
     """
     authentication_classes = (authentication.SessionAuthentication,)
     queryset = Device.objects.all().select_related('node')
@@ -35,6 +35,8 @@ class DeviceList(ACLMixin, generics.ListAPIView):
     pagination_serializer_class = PaginatedDeviceSerializer
     paginate_by_param = 'limit'
     paginate_by = 40
+    # slug of the node is serialized with devices
+    conditional_models = (Node,)
     
     def get_queryset(self):
         """
@@ -49,12 +51,8 @@ class DeviceList(ACLMixin, generics.ListAPIView):
         search = self.request.QUERY_PARAMS.get('search', None)
         
         if search is not None:
-            search_query = (
-                Q(name__icontains=search) |
-                Q(description__icontains=search)
-            )
-            # add instructions for search to queryset
-            queryset = queryset.filter(search_query)
+            # full text search, results are ordered by relevance
+            queryset = Device.search_backend.search(queryset, search)
         
         return queryset
     
@@ -81,14 +79,14 @@ class DeviceDetails(ACLMixin, generics.RetrieveUpdateDestroyAPIView):
 device_details = DeviceDetails.as_view()
 
 
-class NodeDeviceList(CustomDataMixin, generics.ListCreateAPIView):
+class NodeDeviceList(CustomDataMixin, StreamingListMixin, generics.ListCreateAPIView):
     """
     Retrieve devices of specified node according to user access level.
     
     Parameters:
     
      * `limit=<n>`: specify number of items per page (defaults to 40)
-     * `limit=0`: turns off pagination
+     * `limit=0`: turns off pagination (the list is streamed)
     
     ### POST
     
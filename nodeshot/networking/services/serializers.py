@@ -2,6 +2,8 @@
 
 from rest_framework import pagination, serializers
 
+from nodeshot.core.base.serializers import HyperlinkedIdentityField
+
 from .models import *
 
 
@@ -22,7 +24,7 @@ class ServiceLoginSerializer(serializers.ModelSerializer):
 class ServiceListSerializer(serializers.ModelSerializer):
     """ Service List Serializer  """
     
-    details = serializers.HyperlinkedIdentityField(view_name='api_service_details')
+    details = HyperlinkedIdentityField(view_name='api_service_details')
     
     class Meta:
         model = Service
@@ -46,7 +48,7 @@ class PaginatedServiceSerializer(pagination.PaginationSerializer):
 
 class CategorySerializer(serializers.ModelSerializer):
     
-    details = serializers.HyperlinkedIdentityField(view_name='api_service_category_details')
+    details = HyperlinkedIdentityField(view_name='api_service_category_details')
     
     class Meta:
         model = Category
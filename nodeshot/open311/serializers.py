@@ -4,9 +4,10 @@ from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
 
 from rest_framework import serializers
-from rest_framework.reverse import reverse
 from rest_framework_gis import serializers as geoserializers
 
+from nodeshot.core.base.reverse import reverse
+
 from nodeshot.core.layers.models import Layer
 from nodeshot.core.nodes.models import Node
 from nodeshot.core.nodes.serializers import NodeListSerializer
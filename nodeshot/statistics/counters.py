@@ -0,0 +1,230 @@
+"""
+incrementally maintained network statistics
+
+Each aggregate shown by the dashboard (eg: number of nodes of a layer) is stored
+in a Counter row whose name identifies it (eg: "nodes.layer.3").
+A CounterTracker connected to the save and delete signals of a model computes
+the contribution of the instance to the counters before and after the change
+and applies the difference with an atomic UPDATE, so counters never require a full aggregation.
+
+Only objects visible to anonymous users (public access level) are counted,
+because statistics are public.
+
+The recount function rebuilds every counter with a full aggregation,
+it's run periodically (see tasks.py) to reconcile counters with changes done without signals
+(eg: queryset updates) and after bulk operations.
+"""
+
+from django.db import transaction
+from django.db.models import F, Count, Sum
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.core.cache import cache
+from django.conf import settings
+
+from nodeshot.core.base.choices import ACCESS_LEVELS
+from nodeshot.core.base.previous import track_previous_values, get_previous_values
+
+from .models import Counter
+
+
+__all__ = [
+    'CACHE_KEY',
+    'increment',
+    'CounterTracker',
+    'node_counters',
+    'device_counters',
+    'link_counters',
+    'count_all',
+    'recount',
+    'get_slugs',
+]
+
+
+# key of the cached statistics returned by the API
+CACHE_KEY = 'network_statistics'
+
+LAYERS_ENABLED = 'nodeshot.core.layers' in settings.INSTALLED_APPS
+DEVICES_ENABLED = 'nodeshot.networking.net' in settings.INSTALLED_APPS
+LINKS_ENABLED = 'nodeshot.networking.links' in settings.INSTALLED_APPS
+
+PUBLIC = ACCESS_LEVELS.get('public')
+
+
+def increment(deltas):
+    """
+    adds deltas to the counters
+
+    :param deltas: dictionary which maps counter names to the amount to add (might be negative)
+    """
+    deltas = dict([(name, delta) for name, delta in deltas.items() if delta])
+
+    if not deltas:
+        return
+
+    for name, delta in deltas.items():
+        if not Counter.objects.filter(name=name).update(value=F('value') + delta):
+            Counter.objects.get_or_create(name=name)
+            Counter.objects.filter(name=name).update(value=F('value') + delta)
+
+    cache.delete(CACHE_KEY)
+
+
+def _difference(previous, current):
+    deltas = dict([(name, -value) for name, value in previous.items()])
+    for name, value in current.items():
+        deltas[name] = deltas.get(name, 0) + value
+    return deltas
+
+
+class CounterTracker(object):
+    """
+    keeps the counters of a model updated
+
+    :param model: model class
+    :param fields: names of the fields read by counters
+    :param counters: function which receives a dictionary of the values of fields
+                     and returns the contribution of the instance to the counters
+    """
+
+    def __init__(self, model, fields, counters):
+        self.model = model
+        self.fields = fields
+        self.counters = counters
+        self.attnames = dict([(name, model._meta.get_field(name).attname) for name in fields])
+
+        track_previous_values(model, fields)
+        uid = 'statistics_%s_%s' % (model._meta.app_label, model._meta.object_name.lower())
+        pre_save.connect(self.pre_save, sender=model, weak=False, dispatch_uid=uid)
+        post_save.connect(self.post_save, sender=model, weak=False, dispatch_uid=uid)
+        post_delete.connect(self.post_delete, sender=model, weak=False, dispatch_uid=uid)
+
+    def get_values(self, instance):
+        return dict([(name, getattr(instance, attname)) for name, attname in self.attnames.items()])
+
+    def pre_save(self, sender, instance, **kwargs):
+        """ stores the contribution of the instance before the change """
+        previous = get_previous_values(instance)
+        instance._statistics_counters = self.counters(previous) if previous is not None else {}
+
+    def post_save(self, sender, instance, **kwargs):
+        previous = getattr(instance, '_statistics_counters', {})
+        current = self.counters(self.get_values(instance))
+        instance._statistics_counters = current
+        increment(_difference(previous, current))
+
+    def post_delete(self, sender, instance, **kwargs):
+        increment(_difference(self.counters(self.get_values(instance)), {}))
+
+
+# ------ contributions of instances ------ #
+
+
+def node_counters(values):
+    """ published public nodes are counted in total, by layer and by status """
+    if not values['is_published'] or values['access_level'] != PUBLIC:
+        return {}
+    counters = { 'nodes': 1 }
+    if values.get('layer') is not None:
+        counters['nodes.layer.%s' % values['layer']] = 1
+    if values['status'] is not None:
+        counters['nodes.status.%s' % values['status']] = 1
+    if values.get('layer') is not None and values['status'] is not None:
+        counters['nodes.layer.%s.status.%s' % (values['layer'], values['status'])] = 1
+    return counters
+
+
+def device_counters(values):
+    """ public devices are counted in total and by type """
+    if values['access_level'] != PUBLIC:
+        return {}
+    return {
+        'devices': 1,
+        'devices.type.%s' % values['type']: 1
+    }
+
+
+def link_counters(values):
+    """
+    public links are counted in total and by status,
+    the sum and count of metric values (by metric type) give the average metric
+    """
+    if values['access_level'] != PUBLIC:
+        return {}
+    counters = {
+        'links': 1,
+        'links.status.%s' % values['status']: 1
+    }
+    if values['metric_type'] and values['metric_value'] is not None:
+        counters['links.metric.%s.sum' % values['metric_type']] = values['metric_value']
+        counters['links.metric.%s.count' % values['metric_type']] = 1
+    return counters
+
+
+NODE_FIELDS = ['is_published', 'access_level', 'status'] + (['layer'] if LAYERS_ENABLED else [])
+DEVICE_FIELDS = ['access_level', 'type']
+LINK_FIELDS = ['access_level', 'status', 'metric_type', 'metric_value']
+
+
+# ------ full recount ------ #
+
+
+def _group_counters(queryset, field, prefix, total_name):
+    counters = {}
+    for row in queryset.values(field).annotate(count=Count('id')).order_by():
+        counters[total_name] = counters.get(total_name, 0) + row['count']
+        if row[field] is not None:
+            counters['%s.%s' % (prefix, row[field])] = row['count']
+    return counters
+
+
+def count_all():
+    """ computes every counter with a full aggregation, returns a dictionary """
+    from nodeshot.core.nodes.models import Node
+
+    nodes = Node.objects.filter(is_published=True, access_level=PUBLIC)
+    counters = { 'nodes': 0 }
+    counters.update(_group_counters(nodes, 'status', 'nodes.status', 'nodes'))
+    if LAYERS_ENABLED:
+        counters.update(_group_counters(nodes, 'layer', 'nodes.layer', 'nodes'))
+        layer_statuses = nodes.exclude(status__isnull=True).values('layer', 'status') \
+                              .annotate(count=Count('id')).order_by()
+        for row in layer_statuses:
+            counters['nodes.layer.%s.status.%s' % (row['layer'], row['status'])] = row['count']
+
+    if DEVICES_ENABLED:
+        from nodeshot.networking.net.models import Device
+        counters['devices'] = 0
+        counters.update(_group_counters(Device.objects.filter(access_level=PUBLIC), 'type', 'devices.type', 'devices'))
+
+    if LINKS_ENABLED:
+        from nodeshot.networking.links.models import Link
+        counters['links'] = 0
+        links = Link.objects.filter(access_level=PUBLIC)
+        counters.update(_group_counters(links, 'status', 'links.status', 'links'))
+        metrics = links.exclude(metric_type__isnull=True).exclude(metric_type='') \
+                              .exclude(metric_value__isnull=True).values('metric_type') \
+                              .annotate(sum=Sum('metric_value'), count=Count('id')).order_by()
+        for row in metrics:
+            counters['links.metric.%s.sum' % row['metric_type']] = row['sum']
+            counters['links.metric.%s.count' % row['metric_type']] = row['count']
+
+    return counters
+
+
+def get_slugs(model):
+    """
+    returns a dictionary which maps the ids (strings) of model to the slugs (from the reference data cache),
+    unpublished objects (eg: layers) are excluded so that their counters are not exposed
+    """
+    return dict([(str(obj.id), obj.slug) for obj in model.reference_cache.all() if getattr(obj, 'is_published', True)])
+
+
+def recount():
+    """ replaces every counter with the result of a full aggregation """
+    counters = count_all()
+
+    with transaction.commit_on_success():
+        Counter.objects.all().delete()
+        Counter.objects.bulk_create([Counter(name=name, value=value) for name, value in counters.items()])
+
+    cache.delete(CACHE_KEY)
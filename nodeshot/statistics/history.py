@@ -0,0 +1,181 @@
+"""
+historical statistics
+
+The snapshot_statistics command (run hourly by the take_snapshot task) stores the current value
+of each metric in an hourly bucket of the Snapshot table (one row per metric per bucket):
+values are read from the counters (see counters.py), only the devices seen in the last 24 hours
+are counted with a query. Metric names contain slugs (eg: "nodes.layer.rome.status.active")
+so that they can be used as labels of charts.
+
+Hourly buckets of completed days are averaged in daily buckets, then hourly buckets older than
+STATISTICS_HOURLY_RETENTION days are deleted (and daily buckets older than STATISTICS_DAILY_RETENTION
+days, if set). Buckets are aligned to UTC hours and days.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils.timezone import utc
+from django.conf import settings
+
+from nodeshot.core.base.utils import now
+from nodeshot.core.nodes.models import Status
+
+from .models import Counter, Snapshot
+from .counters import LAYERS_ENABLED, DEVICES_ENABLED, LINKS_ENABLED, get_slugs
+
+
+__all__ = [
+    'RESOLUTIONS',
+    'truncate',
+    'get_metrics',
+    'take_snapshot',
+    'downsample',
+    'get_series',
+]
+
+
+RESOLUTIONS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1)
+}
+HOURLY_RETENTION = settings.NODESHOT['SETTINGS'].get('STATISTICS_HOURLY_RETENTION', 14)
+DAILY_RETENTION = settings.NODESHOT['SETTINGS'].get('STATISTICS_DAILY_RETENTION', None)
+
+
+def truncate(date, resolution):
+    """ returns the start of the bucket of the specified resolution which contains date """
+    date = date.astimezone(utc).replace(minute=0, second=0, microsecond=0)
+    if resolution == 'day':
+        date = date.replace(hour=0)
+    return date
+
+
+def get_metrics(date=None):
+    """ returns the current value of each metric (dictionary keyed by metric name) """
+    date = date or now()
+    counters = dict(Counter.objects.values_list('name', 'value'))
+
+    # ids in counter names are replaced with slugs
+    translations = {
+        'nodes': { 'status': get_slugs(Status) },
+        'devices': {},
+        'links': {}
+    }
+    if LAYERS_ENABLED:
+        from nodeshot.core.layers.models import Layer
+        translations['nodes']['layer'] = get_slugs(Layer)
+    if LINKS_ENABLED:
+        from nodeshot.networking.links.models.choices import LINK_STATUS
+        translations['links']['status'] = dict([(str(value), key) for key, value in LINK_STATUS.items()])
+
+    metrics = {}
+
+    for name, value in counters.items():
+        parts = name.split('.')
+        # metric averages are computed below
+        if parts[0] not in translations or parts[-1] in ['sum', 'count']:
+            continue
+        for i in range(1, len(parts)):
+            names = translations[parts[0]].get(parts[i - 1])
+            if names is not None:
+                parts[i] = names.get(parts[i])
+        # deleted layer or status, will disappear with the next recount
+        if None in parts:
+            continue
+        metrics['.'.join(parts)] = value
+
+    for name, count in counters.items():
+        if name.startswith('links.metric.') and name.endswith('.count') and count:
+            metric_type = name[len('links.metric.'):-len('.count')]
+            metrics['links.metric.%s.average' % metric_type] = counters.get('links.metric.%s.sum' % metric_type, 0) / count
+
+    if DEVICES_ENABLED:
+        from nodeshot.networking.net.models import Device
+        metrics['devices.seen'] = Device.objects.filter(last_seen__gte=date - timedelta(days=1)).count()
+
+    return metrics
+
+
+def take_snapshot(date=None):
+    """ stores the current value of each metric in the hourly bucket which contains date """
+    date = date or now()
+    bucket = truncate(date, 'hour')
+    metrics = get_metrics(date)
+
+    with transaction.commit_on_success():
+        # a second snapshot in the same hour replaces the first one
+        Snapshot.objects.filter(resolution='hour', bucket=bucket).delete()
+        Snapshot.objects.bulk_create([
+            Snapshot(metric=metric, resolution='hour', bucket=bucket, value=value)
+            for metric, value in metrics.items()
+        ])
+
+    downsample(date)
+
+
+def downsample(date=None):
+    """
+    averages the hourly buckets of the completed days which have not been downsampled yet
+    in daily buckets and deletes buckets older than the retention periods
+    """
+    date = date or now()
+    today = truncate(date, 'day')
+    last_day = Snapshot.objects.filter(resolution='day').aggregate(last=Max('bucket'))['last']
+
+    hours = Snapshot.objects.filter(resolution='hour', bucket__lt=today)
+    if last_day is not None:
+        hours = hours.filter(bucket__gte=last_day + RESOLUTIONS['day'])
+
+    # (metric, day) -> (sum, count)
+    totals = {}
+    for metric, bucket, value in hours.values_list('metric', 'bucket', 'value').iterator():
+        key = (metric, truncate(bucket, 'day'))
+        total, count = totals.get(key, (0, 0))
+        totals[key] = (total + value, count + 1)
+
+    with transaction.commit_on_success():
+        Snapshot.objects.bulk_create([
+            Snapshot(metric=metric, resolution='day', bucket=day, value=total / count)
+            for (metric, day), (total, count) in totals.items()
+        ])
+        Snapshot.objects.filter(resolution='hour', bucket__lt=today - timedelta(days=HOURLY_RETENTION)).delete()
+        if DAILY_RETENTION:
+            Snapshot.objects.filter(resolution='day', bucket__lt=today - timedelta(days=DAILY_RETENTION)).delete()
+
+
+def get_series(metrics, resolution, start, end):
+    """
+    returns the list of buckets between start and end and a dictionary
+    which contains the list of values (None if missing) of each metric, aligned to buckets
+
+    :param metrics: list of metric names, names ending with "*" select every metric which starts with them
+    :param resolution: "hour" or "day"
+    """
+    start = truncate(start, resolution)
+    end = truncate(end, resolution)
+    step = RESOLUTIONS[resolution]
+
+    buckets = []
+    bucket = start
+    while bucket <= end:
+        buckets.append(bucket)
+        bucket += step
+    index = dict([(bucket, i) for i, bucket in enumerate(buckets)])
+
+    names = [metric for metric in metrics if not metric.endswith('*')]
+    prefixes = [metric[:-1] for metric in metrics if metric.endswith('*')]
+
+    series = dict([(name, [None] * len(buckets)) for name in names])
+    queryset = Snapshot.objects.filter(resolution=resolution, bucket__gte=start, bucket__lte=end)
+
+    for metric, bucket, value in queryset.filter(metric__in=names).values_list('metric', 'bucket', 'value'):
+        series[metric][index[bucket]] = value
+
+    for prefix in prefixes:
+        rows = queryset.filter(metric__startswith=prefix).values_list('metric', 'bucket', 'value')
+        for metric, bucket, value in rows:
+            series.setdefault(metric, [None] * len(buckets))[index[bucket]] = value
+
+    return buckets, series
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from nodeshot.statistics.history import take_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Store the current value of the metrics of the network in the history (hourly bucket)'
+
+    def handle(self, *args, **options):
+        """ take a snapshot and downsample old buckets """
+        take_snapshot()
+        self.stdout.write('snapshot stored\n\r')
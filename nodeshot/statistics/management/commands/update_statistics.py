@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from nodeshot.statistics.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Recount the statistics of the network (nodes, devices and links)'
+
+    def handle(self, *args, **options):
+        """ replace the counters with a full recount """
+        recount()
+        self.stdout.write('statistics updated\n\r')
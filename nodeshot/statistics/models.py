@@ -1,3 +1,93 @@
+"""
+Dependencies:
+    * nodeshot.core.nodes
+"""
+
 from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+from nodeshot.core.base.utils import check_dependencies
+
+check_dependencies(
+    dependencies='nodeshot.core.nodes',
+    module='nodeshot.statistics'
+)
+
+
+class Counter(models.Model):
+    """
+    Value of an aggregate of the network (eg: number of nodes of a layer),
+    updated incrementally when nodes, devices and links change
+    """
+    name = models.CharField(_('name'), max_length=64, unique=True)
+    value = models.FloatField(_('value'), default=0)
+    
+    class Meta:
+        app_label = 'statistics'
+    
+    def __unicode__(self):
+        return u'%s: %s' % (self.name, self.value)
+
+
+class Snapshot(models.Model):
+    """
+    Value of a metric of the network (eg: number of active links) in a time bucket,
+    hourly buckets are downsampled to daily buckets when they get old
+    """
+    metric = models.CharField(_('metric'), max_length=128)
+    resolution = models.CharField(_('resolution'), max_length=4, choices=(('hour', _('hour')), ('day', _('day'))))
+    bucket = models.DateTimeField(_('bucket'), help_text=_('start of the time bucket (UTC)'))
+    value = models.FloatField(_('value'))
+    
+    class Meta:
+        app_label = 'statistics'
+        # used by range queries of series
+        unique_together = (('metric', 'resolution', 'bucket'),)
+    
+    def __unicode__(self):
+        return u'%s %s: %s' % (self.metric, self.bucket, self.value)
+
+
+# ------ Signals ------ #
+
+
+from django.dispatch import receiver
+from django.conf import settings
+
+from nodeshot.core.nodes.models import Node
+from nodeshot.core.nodes.signals import nodes_bulk_saved
+
+from .counters import (CounterTracker, increment, node_counters, device_counters, link_counters,
+                       NODE_FIELDS, DEVICE_FIELDS, LINK_FIELDS)
+
+# seconds after which the counters are reconciled following a bulk update,
+# the full recount must run after the bulk transaction commits
+RECOUNT_DELAY = 60
+
+
+Node.statistics_tracker = CounterTracker(Node, NODE_FIELDS, node_counters)
+
+if 'nodeshot.networking.net' in settings.INSTALLED_APPS:
+    from nodeshot.networking.net.models import Device
+    Device.statistics_tracker = CounterTracker(Device, DEVICE_FIELDS, device_counters)
+
+if 'nodeshot.networking.links' in settings.INSTALLED_APPS:
+    from nodeshot.networking.links.models import Link
+    Link.statistics_tracker = CounterTracker(Link, LINK_FIELDS, link_counters)
+
+
+@receiver(nodes_bulk_saved)
+def count_bulk_saved_nodes(sender, created, updated, **kwargs):
+    """
+    nodes saved in bulk don't send signals: the contributions of created nodes are added,
+    the previous state of updated nodes is unknown, they are reconciled by a full recount
+    """
+    deltas = {}
+    for node in created:
+        for name, value in node_counters(Node.statistics_tracker.get_values(node)).items():
+            deltas[name] = deltas.get(name, 0) + value
+    increment(deltas)
 
-# Create your models here.
+    if updated:
+        from .tasks import update_statistics
+        update_statistics.apply_async(countdown=RECOUNT_DELAY)
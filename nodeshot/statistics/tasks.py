@@ -0,0 +1,19 @@
+from celery import task
+
+from django.core import management
+
+
+@task()
+def update_statistics():
+    """
+    reconciles the counters of the network statistics with a full recount
+    """
+    management.call_command('update_statistics')
+
+
+@task()
+def take_snapshot():
+    """
+    stores the current value of the metrics of the network in the history
+    """
+    management.call_command('snapshot_statistics')
@@ -1,11 +1,26 @@
 """
-This file demonstrates writing tests using the unittest module. These will pass
-when you run "manage.py test".
-
-Replace this with more appropriate tests for your application.
+nodeshot.statistics unit tests
 """
 
 from django.test import TestCase
+from django.core.urlresolvers import reverse
+
+from nodeshot.core.base.tests import BaseTestCase, user_fixtures
+from nodeshot.core.nodes.models import Node, Status
+from nodeshot.core.layers.models import Layer
+from nodeshot.networking.net.models import Device
+from nodeshot.networking.links.models import Link
+from nodeshot.networking.links.models.choices import LINK_STATUS
+
+from datetime import datetime, timedelta
+
+from django.utils.timezone import utc
+
+from nodeshot.core.nodes.bulk import bulk_upsert
+
+from .models import Counter, Snapshot
+from .counters import count_all, recount
+from .history import take_snapshot, get_series
 
 
 class SimpleTest(TestCase):
@@ -14,3 +29,163 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class StatisticsTest(BaseTestCase):
+    
+    fixtures = [
+        'initial_data.json',
+        user_fixtures,
+        'test_layers.json',
+        'test_status.json',
+        'test_nodes.json',
+        'test_routing_protocols.json',
+        'test_devices.json',
+        'test_interfaces.json',
+        'test_ip_addresses.json'
+    ]
+    
+    def setUp(self):
+        recount()
+    
+    def get_counters(self):
+        return dict([(name, value) for name, value in Counter.objects.values_list('name', 'value') if value])
+    
+    def assertCountersMatchRecount(self):
+        expected = dict([(name, value) for name, value in count_all().items() if value])
+        self.assertEqual(self.get_counters(), expected)
+    
+    def test_node_counters(self):
+        """ counters follow node changes """
+        node = Node.objects.get(slug='fusolab')
+        status = Status.objects.exclude(pk=node.status_id)[0]
+        total = Counter.objects.get(name='nodes').value
+        
+        node.status = status
+        node.save()
+        self.assertCountersMatchRecount()
+        
+        node.is_published = False
+        node.save()
+        self.assertEqual(Counter.objects.get(name='nodes').value, total - 1)
+        self.assertCountersMatchRecount()
+        
+        node.is_published = True
+        node.save()
+        Node.objects.get(slug='eigenlab').delete()
+        self.assertEqual(Counter.objects.get(name='nodes').value, total - 1)
+        self.assertCountersMatchRecount()
+        
+        # restricted nodes are not counted
+        node = Node.objects.get(slug='hidden-rome')
+        node.access_level = 0
+        node.save()
+        self.assertEqual(Counter.objects.get(name='nodes').value, total)
+        node.access_level = 2
+        node.save()
+        self.assertEqual(Counter.objects.get(name='nodes').value, total - 1)
+        self.assertCountersMatchRecount()
+    
+    def test_bulk_saved_node_counters(self):
+        """ nodes created in bulk are counted without a full recount """
+        total = Counter.objects.get(name='nodes').value
+        bulk_upsert([{
+            'type': 'Feature',
+            'geometry': { 'type': 'Point', 'coordinates': [12.51, 41.89] },
+            'properties': { 'slug': 'bulk-1', 'name': 'bulk 1', 'layer': 'rome' }
+        }], user=Node.objects.get(slug='fusolab').user)
+        self.assertEqual(Counter.objects.get(name='nodes').value, total + 1)
+        self.assertCountersMatchRecount()
+    
+    def test_device_and_link_counters(self):
+        """ counters follow device and link changes """
+        device = Device.objects.all()[0]
+        device.type = 'server'
+        device.save()
+        self.assertCountersMatchRecount()
+        
+        link = Link()
+        link.interface_a_id = 2
+        link.interface_b_id = 3
+        link.status = LINK_STATUS.get('active')
+        link.metric_type = 'etx'
+        link.metric_value = 1.5
+        link.save()
+        self.assertCountersMatchRecount()
+        
+        link.metric_value = 2.5
+        link.save()
+        self.assertEqual(Counter.objects.get(name='links.metric.etx.sum').value, 2.5)
+        
+        link.delete()
+        self.assertCountersMatchRecount()
+    
+    def test_statistics_api(self):
+        """ statistics endpoint """
+        url = reverse('api_statistics')
+        response = self.client.get(url)
+        self.assertEqual(200, response.status_code)
+        # restricted nodes (eg: hidden-rome) are not counted
+        public_nodes = Node.objects.published().access_level_up_to('public')
+        self.assertEqual(response.data['nodes']['total'], public_nodes.count())
+        self.assertEqual(response.data['nodes']['layers']['rome'], public_nodes.filter(layer__slug='rome').count())
+        self.assertEqual(response.data['devices']['total'], Device.objects.access_level_up_to('public').count())
+        
+        # cached response is invalidated when counters change
+        Node.objects.get(slug='fusolab').delete()
+        response = self.client.get(url)
+        self.assertEqual(response.data['nodes']['total'], public_nodes.count())
+        
+        # unpublished layers are not listed
+        Layer.objects.filter(slug='rome').update(is_published=False)
+        Layer.reference_cache.invalidate()
+        recount()
+        response = self.client.get(url)
+        self.assertNotIn('rome', response.data['nodes']['layers'])
+    
+    def test_snapshots(self):
+        """ hourly snapshots, downsampling and history endpoint """
+        day = datetime(2014, 3, 1, tzinfo=utc)
+        nodes = Node.objects.published().access_level_up_to('public').count()
+        
+        take_snapshot(day + timedelta(hours=10, minutes=30))
+        self.assertEqual(Snapshot.objects.get(metric='nodes', resolution='hour').value, nodes)
+        self.assertTrue(Snapshot.objects.filter(metric='nodes.layer.rome', resolution='hour').exists())
+        self.assertTrue(Snapshot.objects.filter(metric__startswith='nodes.layer.rome.status.').exists())
+        
+        Node.objects.get(slug='fusolab').delete()
+        take_snapshot(day + timedelta(hours=11))
+        
+        # next day: the previous one is averaged
+        take_snapshot(day + timedelta(days=1, hours=1))
+        daily = Snapshot.objects.get(metric='nodes', resolution='day', bucket=day)
+        self.assertEqual(daily.value, (nodes + nodes - 1) / 2.0)
+        
+        buckets, series = get_series(['nodes'], 'hour', day + timedelta(hours=9), day + timedelta(hours=12))
+        self.assertEqual(len(buckets), 4)
+        self.assertEqual(series['nodes'], [None, nodes, nodes - 1, None])
+        
+        # hourly buckets older than the retention period are deleted
+        take_snapshot(day + timedelta(days=30))
+        self.assertFalse(Snapshot.objects.filter(resolution='hour', bucket__lt=day + timedelta(days=2)).exists())
+        self.assertTrue(Snapshot.objects.filter(resolution='day', bucket=day).exists())
+        
+        url = reverse('api_statistics_history')
+        response = self.client.get(url, {
+            'metrics': 'nodes,nodes.layer.rome.status.*',
+            'resolution': 'day',
+            'start': '2014-02-28',
+            'end': '2014-03-02'
+        })
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(3, len(response.data['buckets']))
+        self.assertEqual(response.data['series']['nodes'], [None, daily.value, nodes - 1])
+        self.assertTrue(any(metric.startswith('nodes.layer.rome.status.') for metric in response.data['series']))
+        
+        # malformed parameters: 400
+        response = self.client.get(url)
+        self.assertEqual(400, response.status_code)
+        response = self.client.get(url, { 'metrics': 'nodes', 'resolution': 'week' })
+        self.assertEqual(400, response.status_code)
+        response = self.client.get(url, { 'metrics': 'nodes', 'start': 'yesterday' })
+        self.assertEqual(400, response.status_code)
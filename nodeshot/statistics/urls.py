@@ -0,0 +1,7 @@
+from django.conf.urls import patterns, url
+
+
+urlpatterns = patterns('nodeshot.statistics.views',
+    url(r'^statistics/$', 'statistics_detail', name='api_statistics'),
+    url(r'^statistics/history/$', 'statistics_history', name='api_statistics_history'),
+)
@@ -1 +1,181 @@
-# Create your views here.
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.utils.dateparse import parse_datetime, parse_date
+from django.utils.timezone import utc, is_naive, make_aware
+from django.utils.translation import ugettext_lazy as _
+from django.conf import settings
+
+from rest_framework import generics
+from rest_framework.response import Response
+from rest_framework.exceptions import ParseError
+
+from nodeshot.core.base.utils import now
+
+from nodeshot.core.nodes.models import Status
+
+from .models import Counter
+from .counters import CACHE_KEY, LAYERS_ENABLED, DEVICES_ENABLED, LINKS_ENABLED, get_slugs
+from .history import RESOLUTIONS, get_series
+
+if LINKS_ENABLED:
+    from nodeshot.networking.links.models.choices import LINK_STATUS
+
+
+STATISTICS_CACHE_TIMEOUT = settings.NODESHOT['SETTINGS'].get('STATISTICS_CACHE_TIMEOUT', 86400)
+
+
+def _group(counters, prefix, names=None):
+    """ returns the counters whose name starts with prefix keyed by the rest of the name """
+    group = {}
+    for name, value in counters.items():
+        if name.startswith(prefix):
+            key = name[len(prefix):]
+            if names is not None:
+                # deleted layer or status, will disappear with the next recount
+                if key not in names:
+                    continue
+                key = names[key]
+            group[key] = int(value)
+    return group
+
+
+def get_statistics():
+    """ builds the statistics of the network from the counters """
+    counters = dict(Counter.objects.values_list('name', 'value'))
+    
+    statistics = {
+        'nodes': {
+            'total': int(counters.get('nodes', 0)),
+            'statuses': _group(counters, 'nodes.status.', get_slugs(Status))
+        }
+    }
+    
+    if LAYERS_ENABLED:
+        from nodeshot.core.layers.models import Layer
+        statistics['nodes']['layers'] = _group(counters, 'nodes.layer.', get_slugs(Layer))
+    
+    if DEVICES_ENABLED:
+        statistics['devices'] = {
+            'total': int(counters.get('devices', 0)),
+            'types': _group(counters, 'devices.type.')
+        }
+    
+    if LINKS_ENABLED:
+        link_statuses = dict([(str(value), key) for key, value in LINK_STATUS.items()])
+        metrics = {}
+        
+        for name, count in _group(counters, 'links.metric.').items():
+            if not name.endswith('.count') or not count:
+                continue
+            metric_type = name[:-len('.count')]
+            metrics[metric_type] = {
+                'count': count,
+                'average': counters.get('links.metric.%s.sum' % metric_type, 0) / count
+            }
+        
+        statistics['links'] = {
+            'total': int(counters.get('links', 0)),
+            'statuses': _group(counters, 'links.status.', link_statuses),
+            'metrics': metrics
+        }
+    
+    return statistics
+
+
+class StatisticsDetail(generics.GenericAPIView):
+    """
+    Retrieve the statistics of the network:
+    
+     * number of published nodes, by layer (published layers only) and by status
+     * number of devices, by type
+     * number of links, by status, and average metric value of links (by metric type)
+    
+    Only nodes, devices and links visible to anonymous users are counted.
+    
+    Statistics are updated each time nodes, devices or links change.
+    """
+    
+    def get(self, request, *args, **kwargs):
+        statistics = cache.get(CACHE_KEY)
+        
+        if statistics is None:
+            statistics = get_statistics()
+            cache.set(CACHE_KEY, statistics, STATISTICS_CACHE_TIMEOUT)
+        
+        return Response(statistics)
+
+statistics_detail = StatisticsDetail.as_view()
+
+
+class StatisticsHistory(generics.GenericAPIView):
+    """
+    Retrieve the history of metrics of the network, ready to be charted:
+    `buckets` contains the start (UTC) of each hourly or daily bucket,
+    `series` contains the list of values of each metric aligned to buckets (`null` if missing).
+    
+    Metric names look like `nodes`, `nodes.layer.<slug>`, `nodes.status.<slug>`,
+    `nodes.layer.<slug>.status.<slug>`, `devices`, `devices.type.<type>`, `devices.seen` (last 24 hours),
+    `links`, `links.status.<status>` and `links.metric.<type>.average`.
+    
+    Parameters:
+    
+     * `metrics=<metric,metric,...>`: metrics to retrieve, a trailing `*` selects every metric starting with the name (eg: `nodes.layer.rome.status.*`) - **required**
+     * `resolution=<hour|day>`: size of buckets (defaults to day)
+     * `start=<date or datetime>`: start of the range (defaults to 30 days or 48 hours ago)
+     * `end=<date or datetime>`: end of the range (defaults to now)
+    """
+    max_buckets = 2000
+    default_ranges = {
+        'hour': timedelta(hours=48),
+        'day': timedelta(days=30)
+    }
+    
+    def parse_date(self, name, default):
+        """ validates start and end parameters """
+        value = self.request.QUERY_PARAMS.get(name, None)
+        
+        if value is None:
+            return default
+        
+        try:
+            date = parse_datetime(value)
+            if date is None:
+                date = parse_date(value)
+                date = datetime(date.year, date.month, date.day) if date else None
+        except ValueError:
+            date = None
+        
+        if date is None:
+            raise ParseError(_('%s must be a valid date or datetime') % name)
+        
+        return make_aware(date, utc) if is_naive(date) else date
+    
+    def get(self, request, *args, **kwargs):
+        metrics = [metric for metric in request.QUERY_PARAMS.get('metrics', '').split(',') if metric]
+        resolution = request.QUERY_PARAMS.get('resolution', 'day')
+        
+        if not metrics:
+            raise ParseError(_('metrics parameter is required'))
+        
+        if resolution not in RESOLUTIONS:
+            raise ParseError(_('resolution must be one of: %s') % ', '.join(RESOLUTIONS.keys()))
+        
+        end = self.parse_date('end', now())
+        start = self.parse_date('start', end - self.default_ranges[resolution])
+        
+        if start > end:
+            raise ParseError(_('start must precede end'))
+        
+        if (end - start).total_seconds() / RESOLUTIONS[resolution].total_seconds() > self.max_buckets:
+            raise ParseError(_('the range contains too many buckets, maximum is %d') % self.max_buckets)
+        
+        buckets, series = get_series(metrics, resolution, start, end)
+        
+        return Response({
+            'resolution': resolution,
+            'buckets': buckets,
+            'series': series
+        })
+
+statistics_history = StatisticsHistory.as_view()
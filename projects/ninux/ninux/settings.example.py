@@ -197,6 +197,7 @@ INSTALLED_APPS = [
     'nodeshot.networking.hardware',
     'nodeshot.networking.connectors',
     #'nodeshot.networking.monitor',
+    'nodeshot.statistics',
     'nodeshot.interface',
     'nodeshot.open311',
     
@@ -355,6 +356,11 @@ else:
     # in production emails are sent in the background
     EMAIL_BACKEND = 'djcelery_email.backends.CeleryEmailBackend'
 
+# modules containing tasks which are not in the tasks module of an installed app
+CELERY_IMPORTS = (
+    'nodeshot.core.base.revisions',  # save_revisions, used if REVERSION_DEFERRED is enabled
+)
+
 #from datetime import timedelta
 #
 #CELERYBEAT_SCHEDULE = {
@@ -377,6 +383,18 @@ else:
 #    'purge_notifications': {
 #        'task': 'nodeshot.community.notifications.tasks.purge_notifications',
 #        'schedule': timedelta(days=1),
+#    },
+#    'prune_revisions': {
+#        'task': 'nodeshot.core.nodes.tasks.prune_revisions',
+#        'schedule': timedelta(days=7),
+#    },
+#    'update_statistics': {
+#        'task': 'nodeshot.statistics.tasks.update_statistics',
+#        'schedule': timedelta(hours=6),
+#    },
+#    'take_snapshot': {
+#        'task': 'nodeshot.statistics.tasks.take_snapshot',
+#        'schedule': timedelta(hours=1),
 #    }
 #}
 
@@ -421,6 +439,35 @@ NODESHOT = {
         
         'REVERSION_LAYERS': True,  # activate django reversion for layers.Layer model
         'REVERSION_NODES': True,  # activate django reversion for nodes.Node model
+        'REVERSION_DEFERRED': False,  # write revisions of changes done through the API in background (celery)
+        'REVERSION_HISTORY_LIMIT': 50,  # versions kept for each node by the prune_revisions command
+        
+        'CLUSTER_RADIUS': 64,  # size in pixels of the cells used to cluster nodes on the map
+        'CLUSTER_MAX_ZOOM': 16,  # starting from this zoom level nodes are not clustered anymore
+        
+        'GEOJSON_CACHE': True,  # cache rendered GeoJSON of the nodes of each layer
+        'GEOJSON_CACHE_TIMEOUT': 86400,  # seconds, cache is invalidated anyway when nodes change
+        
+        'SEARCH_CONFIG': 'simple',  # postgresql text search configuration used to search nodes and devices
+        
+        'ACL_CACHE_TIMEOUT': 86400,  # seconds, access level of users is cached, invalidated when groups change
+        
+        'REFERENCE_CACHE_MAX_AGE': 300,  # seconds, statuses and layers cached in memory are reloaded anyway after this time
+        
+        'NODE_BULK_BATCH_SIZE': 500,  # number of nodes validated together by the bulk API
+        
+        'TILE_CACHE': True,  # cache rendered vector tiles
+        'TILE_CACHE_TIMEOUT': 86400,  # seconds, tiles are invalidated anyway when nodes or links inside them change
+        'TILE_MAX_ZOOM': 18,  # vector tiles are served up to this zoom level
+        'TILE_INVALIDATION_LIMIT': 64,  # changes affecting more tiles than this (on one zoom level) invalidate all tiles
+        
+        'SIMPLIFICATION_ZOOM_BANDS': (5, 8, 11, 14),  # highest zoom level of each band of simplified polygons and lines
+        
+        'CONDITIONAL_GET': True,  # send ETag and Last-Modified headers and answer conditional requests with 304 Not Modified
+        
+        'STATISTICS_CACHE_TIMEOUT': 86400,  # seconds, cached statistics are invalidated anyway when counters change
+        'STATISTICS_HOURLY_RETENTION': 14,  # days, older hourly snapshots are deleted (daily averages are kept)
+        'STATISTICS_DAILY_RETENTION': None,  # days, older daily snapshots are deleted, None keeps them forever
     },
     'CHOICES': {
         'AVAILABLE_CRONJOBS': (
@@ -465,6 +512,7 @@ NODESHOT = {
             'nodeshot.networking.net',
             'nodeshot.networking.links',
             'nodeshot.networking.services',
+            'nodeshot.statistics',
             'nodeshot.open311'
         ]
     },
@@ -502,13 +550,28 @@ NODESHOT = {
         )
     },
     'WEBSOCKETS': {
-        'PUBLIC_PIPE': '%s/nodeshot.websockets.public' % os.path.dirname(SITE_ROOT),
-        'PRIVATE_PIPE': '%s/nodeshot.websockets.private' % os.path.dirname(SITE_ROOT),
+        # delivers messages from django processes to the websocket server, see nodeshot.core.websockets.brokers
+        'BROKER': {
+            'BACKEND': 'nodeshot.core.websockets.brokers.local.UnixSocketBroker',
+            'OPTIONS': { 'path': '%s/nodeshot.websockets.sock' % os.path.dirname(SITE_ROOT) }
+        },
         'DOMAIN': DOMAIN,
         'LISTENING_ADDRESS': '0.0.0.0',  # set to 127.0.0.1 to accept only local calls (used for proxying to port 80 with nginx or apache mod_proxy)
         'LISTENING_PORT': 9090,
+        'PROCESSES': 1,  # number of server processes sharing the listening port, 0 means one per CPU core (public and private messages reach every process through the broker)
+        'GRID_CELL_SIZE': 0.5,  # size in degrees of the cells of the grid which indexes bbox subscriptions
+        # recent events replayed to reconnecting clients, see nodeshot.core.websockets.replay
+        # (use RedisReplayBuffer when running several server processes)
+        'REPLAY': {
+            'BACKEND': 'nodeshot.core.websockets.replay.MemoryReplayBuffer',
+            'OPTIONS': { 'size': 1000 }
+        },
+        'BATCH_REQUESTS': True,  # events of each request are published in batch at the end of the request
+        'BATCH_SIZE': 100,  # maximum number of events in a batch message
+        'COALESCE_WINDOW': 0.5,  # seconds during which the events of the same object are merged in a single event, 0 disables coalescing
         'REGISTRARS': (
-            'nodeshot.core.websockets.registrars.nodes',   
+            'nodeshot.core.websockets.registrars.nodes',
+            #'nodeshot.core.websockets.registrars.links',  # requires nodeshot.networking.links
         )
     },
     # list that will contain functions to disable and re-enable some signals